@@ -473,3 +473,130 @@ EXPORTIT u8 *f9(u8 *key, u32 count, u32 fresh, u32 dir, u8 *data, int length)
 /*-----------------------------------------------------------
  *			e n d    o f    f 9 . c
  *-----------------------------------------------------------*/
+
+/*-------------------------------------------------------------------
+ *				F8 / F9 - fused protection
+ *-------------------------------------------------------------------
+ *
+ *	This is an addition to the C reference code: as the KASUMI key 
+ *	schedule is global, the f8 keystream is generated first, then 
+ *	the data is read once, each byte being MAC'd and ciphered in the 
+ *	same pass, and written once into the output buffer.
+ *	Only byte-aligned data is supported.
+ *
+ *-------------------------------------------------------------------*/
+
+#include <stdlib.h>
+
+/*---------------------------------------------------------
+ * f8f9()
+ *		Given ck, ik, count, bearer, fresh, direction, data,
+ *		byte length and offset, compute f9 and f8 over data
+ *		into out, which must be length + 4 bytes long:
+ *		mode 0: out = data[:offset] || f8(data[offset:] || MAC)
+ *		mode 1: out = MAC || data[:offset] || f8(data[offset:]),
+ *		        MAC being computed over the ciphered output
+ *		Returns 0, or -1 on memory allocation failure
+ *---------------------------------------------------------*/
+EXPORTIT int f8f9(u8 *ck, u8 *ik, u32 count, u32 bearer, u32 fresh, u32 dir,
+                  u8 *data, u32 length, u32 offset, u32 mode, u8 *out)
+{
+	REGISTER64 A;		/* the f8 modifier, then the f9 CBC chained data */
+	REGISTER64 B;		/* the XOR of all f9 KASUMI outputs */
+	REGISTER64 temp;	/* the f8 working register */
+	u8  ModKey[16];
+	u8  *KS, *o, b, c;
+	u32 ks_len, i, j, n;
+	u16 blkcnt;
+
+	/* f8 keystream, for the ciphered bytes */
+	ks_len = (length - offset + (mode ? 0 : 4) + 7) & ~7;
+	KS = (u8 *)malloc(ks_len ? ks_len : 8);
+	if( KS == NULL )
+		return -1;
+
+	temp.b32[0]  = temp.b32[1]  = 0;
+	A.b32[0]     = A.b32[1]     = 0;
+	A.b8[0]  = (u8) (count>>24);
+	A.b8[1]  = (u8) (count>>16);
+	A.b8[2]  = (u8) (count>>8);
+	A.b8[3]  = (u8) (count);
+	A.b8[4]  = (u8) (bearer<<3);
+	A.b8[4] |= (u8) (dir<<2);
+
+	for( n=0; n<16; ++n )
+		ModKey[n] = (u8)(ck[n] ^ 0x55);
+	KeySchedule( ModKey );
+	Kasumi( A.b8 );
+
+	KeySchedule( ck );
+	for( j=0, blkcnt=0; j<ks_len; j+=8, ++blkcnt )
+	{
+		temp.b32[0] ^= A.b32[0];
+		temp.b32[1] ^= A.b32[1];
+		temp.b8[7] ^= (u8)  blkcnt;
+		temp.b8[6] ^= (u8) (blkcnt>>8);
+		Kasumi( temp.b8 );
+		for( i=0; i<8; ++i )
+			KS[j+i] = temp.b8[i];
+	}
+
+	/* f9 initialisation */
+	KeySchedule( ik );
+	for( n=0; n<4; ++n )
+	{
+		A.b8[n]   = (u8)(count>>(24-(n*8)));
+		A.b8[n+4] = (u8)(fresh>>(24-(n*8)));
+	}
+	Kasumi( A.b8 );
+	B.b32[0] = A.b32[0];
+	B.b32[1] = A.b32[1];
+
+	/* single pass over data */
+	o = mode ? out + 4 : out;
+	n = 0;
+	for( j=0; j<length; ++j )
+	{
+		b = data[j];
+		c = (j >= offset) ? b ^ KS[j-offset] : b;
+		o[j] = c;
+		A.b8[n++] ^= mode ? c : b;
+		if( n == 8 )
+		{
+			Kasumi( A.b8 );
+			B.b32[0] ^= A.b32[0];
+			B.b32[1] ^= A.b32[1];
+			n = 0;
+		}
+	}
+
+	/* direction bit and final '1' bit, in the same byte as data 
+	 * is byte-aligned */
+	A.b8[n] ^= (u8)((dir ? 0x80 : 0) | 0x40);
+	Kasumi( A.b8 );
+	B.b32[0] ^= A.b32[0];
+	B.b32[1] ^= A.b32[1];
+
+	for( n=0; n<16; ++n )
+		ModKey[n] = (u8)(ik[n] ^ 0xAA);
+	KeySchedule( ModKey );
+	Kasumi( B.b8 );
+
+	if( mode )
+	{
+		for( n=0; n<4; ++n )
+			out[n] = B.b8[n];
+	}
+	else
+	{
+		for( n=0; n<4; ++n )
+			out[length+n] = B.b8[n] ^ KS[length-offset+n];
+	}
+
+	free(KS);
+	return 0;
+}
+
+/*-----------------------------------------------------------
+ *			e n d    o f    f 8 f 9
+ *-----------------------------------------------------------*/
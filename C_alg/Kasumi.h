@@ -68,3 +68,12 @@ EXPORTIT void f8( u8 *key, u32 count, u32 bearer, u32 dir, \
 /* compute a 3GPP MAC on a message */
 EXPORTIT u8 * f9( u8 *key, u32 count, u32 fresh, u32 dir, \
                   u8 *data, int length );
+
+/* compute a 3GPP MAC and cipher a byte-aligned message in a single pass,
+ * length and offset being in bytes, out being length + 4 bytes long:
+ * mode 0: out = data[:offset] || f8(data[offset:] || f9(data))
+ * mode 1: out = MAC || data[:offset] || f8(data[offset:]),
+ *         MAC being f9 over the ciphered output
+ * returns 0, or -1 on memory allocation failure */
+EXPORTIT int f8f9( u8 *ck, u8 *ik, u32 count, u32 bearer, u32 fresh, u32 dir, \
+                   u8 *data, u32 length, u32 offset, u32 mode, u8 *out );
@@ -0,0 +1,196 @@
+/* -----------------------------------------------------------------------
+ * optimized 64-bit Keccak-p[1600] permutation, and runtime selection
+ * between it and the 3GPP TS 35.231 reference permutations
+ *
+ * Keccak_f_64_opt() keeps the whole state in local variables and has its
+ * 24 rounds fully unrolled; theta, rho and pi are merged into a single pass
+ * and the lane complementing transform (lanes 1, 2, 8, 12, 17 and 20 being
+ * stored inverted) reduces the chi step to a single NOT per plane
+ *-----------------------------------------------------------------------*/
+
+#include <string.h>
+#include "KeccakP-1600-3gpp.h"
+#include "KeccakP-1600-opt64.h"
+
+
+const uint64_t KeccakP1600_RC[24] = {
+    0x0000000000000001ULL, 0x0000000000008082ULL, 0x800000000000808AULL,
+    0x8000000080008000ULL, 0x000000000000808BULL, 0x0000000080000001ULL,
+    0x8000000080008081ULL, 0x8000000000008009ULL, 0x000000000000008AULL,
+    0x0000000000000088ULL, 0x0000000080008009ULL, 0x000000008000000AULL,
+    0x000000008000808BULL, 0x800000000000008BULL, 0x8000000000008089ULL,
+    0x8000000000008003ULL, 0x8000000000008002ULL, 0x8000000000000080ULL,
+    0x000000000000800AULL, 0x800000008000000AULL, 0x8000000080008081ULL,
+    0x8000000000008080ULL, 0x0000000080000001ULL, 0x8000000080008008ULL
+};
+
+#define ROL64(a, n) ((((uint64_t)(a)) << (n)) | (((uint64_t)(a)) >> (64-(n))))
+
+/* one round, from A00..A24 to A00..A24, with lanes 1, 2, 8, 12, 17 and 20
+   complemented in both the input and the output */
+#define KECCAK_ROUND(rc)              \
+    C0 = A00 ^ A05 ^ A10 ^ A15 ^ A20; \
+    C1 = A01 ^ A06 ^ A11 ^ A16 ^ A21; \
+    C2 = A02 ^ A07 ^ A12 ^ A17 ^ A22; \
+    C3 = A03 ^ A08 ^ A13 ^ A18 ^ A23; \
+    C4 = A04 ^ A09 ^ A14 ^ A19 ^ A24; \
+    D0 = C4 ^ ROL64(C1, 1);           \
+    D1 = C0 ^ ROL64(C2, 1);           \
+    D2 = C1 ^ ROL64(C3, 1);           \
+    D3 = C2 ^ ROL64(C4, 1);           \
+    D4 = C3 ^ ROL64(C0, 1);           \
+    B00 = A00 ^ D0;                   \
+    B01 = ROL64(A06 ^ D1, 44);        \
+    B02 = ROL64(A12 ^ D2, 43);        \
+    B03 = ROL64(A18 ^ D3, 21);        \
+    B04 = ROL64(A24 ^ D4, 14);        \
+    B05 = ROL64(A03 ^ D3, 28);        \
+    B06 = ROL64(A09 ^ D4, 20);        \
+    B07 = ROL64(A10 ^ D0, 3);         \
+    B08 = ROL64(A16 ^ D1, 45);        \
+    B09 = ROL64(A22 ^ D2, 61);        \
+    B10 = ROL64(A01 ^ D1, 1);         \
+    B11 = ROL64(A07 ^ D2, 6);         \
+    B12 = ROL64(A13 ^ D3, 25);        \
+    B13 = ROL64(A19 ^ D4, 8);         \
+    B14 = ROL64(A20 ^ D0, 18);        \
+    B15 = ROL64(A04 ^ D4, 27);        \
+    B16 = ROL64(A05 ^ D0, 36);        \
+    B17 = ROL64(A11 ^ D1, 10);        \
+    B18 = ROL64(A17 ^ D2, 15);        \
+    B19 = ROL64(A23 ^ D3, 56);        \
+    B20 = ROL64(A02 ^ D2, 62);        \
+    B21 = ROL64(A08 ^ D3, 55);        \
+    B22 = ROL64(A14 ^ D4, 39);        \
+    B23 = ROL64(A15 ^ D0, 41);        \
+    B24 = ROL64(A21 ^ D1, 2);         \
+    N = ~B02;                         \
+    A00 = B00 ^ (B01 | B02);          \
+    A01 = B01 ^ (N | B03);            \
+    A02 = B02 ^ (B03 & B04);          \
+    A03 = B03 ^ (B04 | B00);          \
+    A04 = B04 ^ (B00 & B01);          \
+    N = ~B09;                         \
+    A05 = B05 ^ (B06 | B07);          \
+    A06 = B06 ^ (B07 & B08);          \
+    A07 = B07 ^ (B08 | N);            \
+    A08 = B08 ^ (B09 | B05);          \
+    A09 = B09 ^ (B05 & B06);          \
+    N = ~B13;                         \
+    A10 = B10 ^ (B11 | B12);          \
+    A11 = B11 ^ (B12 & B13);          \
+    A12 = B12 ^ (N & B14);            \
+    A13 = N ^ (B14 | B10);            \
+    A14 = B14 ^ (B10 & B11);          \
+    N = ~B18;                         \
+    A15 = B15 ^ (B16 & B17);          \
+    A16 = B16 ^ (B17 | B18);          \
+    A17 = B17 ^ (N | B19);            \
+    A18 = N ^ (B19 & B15);            \
+    A19 = B19 ^ (B15 | B16);          \
+    N = ~B21;                         \
+    A20 = B20 ^ (N & B22);            \
+    A21 = N ^ (B22 | B23);            \
+    A22 = B22 ^ (B23 & B24);          \
+    A23 = B23 ^ (B24 | B20);          \
+    A24 = B24 ^ (B20 & B21);          \
+    A00 ^= (rc);
+
+
+/* ---------------------------------------------------------------------
+   optimized 64-bit version of Keccak_f(1600)
+   ---------------------------------------------------------------------
+*/
+void Keccak_f_64_opt(uint64_t s[25])
+{
+    uint64_t A00, A01, A02, A03, A04, A05, A06, A07, A08, A09, A10, A11, A12,
+             A13, A14, A15, A16, A17, A18, A19, A20, A21, A22, A23, A24;
+    uint64_t B00, B01, B02, B03, B04, B05, B06, B07, B08, B09, B10, B11, B12,
+             B13, B14, B15, B16, B17, B18, B19, B20, B21, B22, B23, B24;
+    uint64_t C0, C1, C2, C3, C4, D0, D1, D2, D3, D4, N;
+    
+    A00 = s[0];  A01 = ~s[1]; A02 = ~s[2]; A03 = s[3];  A04 = s[4];
+    A05 = s[5];  A06 = s[6];  A07 = s[7];  A08 = ~s[8]; A09 = s[9];
+    A10 = s[10]; A11 = s[11]; A12 = ~s[12]; A13 = s[13]; A14 = s[14];
+    A15 = s[15]; A16 = s[16]; A17 = ~s[17]; A18 = s[18]; A19 = s[19];
+    A20 = ~s[20]; A21 = s[21]; A22 = s[22]; A23 = s[23]; A24 = s[24];
+    
+    KECCAK_ROUND(KeccakP1600_RC[0]);
+    KECCAK_ROUND(KeccakP1600_RC[1]);
+    KECCAK_ROUND(KeccakP1600_RC[2]);
+    KECCAK_ROUND(KeccakP1600_RC[3]);
+    KECCAK_ROUND(KeccakP1600_RC[4]);
+    KECCAK_ROUND(KeccakP1600_RC[5]);
+    KECCAK_ROUND(KeccakP1600_RC[6]);
+    KECCAK_ROUND(KeccakP1600_RC[7]);
+    KECCAK_ROUND(KeccakP1600_RC[8]);
+    KECCAK_ROUND(KeccakP1600_RC[9]);
+    KECCAK_ROUND(KeccakP1600_RC[10]);
+    KECCAK_ROUND(KeccakP1600_RC[11]);
+    KECCAK_ROUND(KeccakP1600_RC[12]);
+    KECCAK_ROUND(KeccakP1600_RC[13]);
+    KECCAK_ROUND(KeccakP1600_RC[14]);
+    KECCAK_ROUND(KeccakP1600_RC[15]);
+    KECCAK_ROUND(KeccakP1600_RC[16]);
+    KECCAK_ROUND(KeccakP1600_RC[17]);
+    KECCAK_ROUND(KeccakP1600_RC[18]);
+    KECCAK_ROUND(KeccakP1600_RC[19]);
+    KECCAK_ROUND(KeccakP1600_RC[20]);
+    KECCAK_ROUND(KeccakP1600_RC[21]);
+    KECCAK_ROUND(KeccakP1600_RC[22]);
+    KECCAK_ROUND(KeccakP1600_RC[23]);
+    
+    s[0] = A00;  s[1] = ~A01; s[2] = ~A02; s[3] = A03;  s[4] = A04;
+    s[5] = A05;  s[6] = A06;  s[7] = A07;  s[8] = ~A08; s[9] = A09;
+    s[10] = A10; s[11] = A11; s[12] = ~A12; s[13] = A13; s[14] = A14;
+    s[15] = A15; s[16] = A16; s[17] = ~A17; s[18] = A18; s[19] = A19;
+    s[20] = ~A20; s[21] = A21; s[22] = A22; s[23] = A23; s[24] = A24;
+}
+
+
+/* ---------------------------------------------------------------------
+   runtime selection of the permutation
+   
+   the 32 and 8-bit reference versions work on the same 200 bytes,
+   which matches the 64-bit lanes layout on little-endian hosts only
+   ---------------------------------------------------------------------
+*/
+static void Keccak_f_32_lanes(uint64_t s[25])
+{
+    Keccak_f_32((uint32_t *)s);
+}
+
+static void Keccak_f_8_lanes(uint64_t s[25])
+{
+    Keccak_f_8((uint8_t *)s);
+}
+
+const char * const KeccakP1600_impls[] = {"opt64", "ref64", "ref32", "ref8", NULL};
+
+static void (* const KeccakP1600_funcs[])(uint64_t s[25]) = {
+    Keccak_f_64_opt, Keccak_f_64, Keccak_f_32_lanes, Keccak_f_8_lanes};
+
+static int KeccakP1600_impl = 0;
+
+void KeccakP1600(uint64_t s[25])
+{
+    KeccakP1600_funcs[KeccakP1600_impl](s);
+}
+
+int KeccakP1600_set_impl(const char * name)
+{
+    int i;
+    
+    for (i=0; KeccakP1600_impls[i] != NULL; i++)
+        if (strcmp(name, KeccakP1600_impls[i]) == 0)
+        {
+            KeccakP1600_impl = i;
+            return 0;
+        }
+    return -1;
+}
+
+const char * KeccakP1600_get_impl(void)
+{
+    return KeccakP1600_impls[KeccakP1600_impl];
+}
@@ -0,0 +1,41 @@
+/* -----------------------------------------------------------------------
+ * optimized 64-bit Keccak-p[1600] permutation, and runtime selection
+ * between it and the 3GPP TS 35.231 reference permutations
+ *-----------------------------------------------------------------------*/
+
+/* this is the trick to make the code cross-platform
+ * at least, Win32 / Linux */
+
+#if defined(_WIN32) || defined(__WIN32__)
+#	include <windows.h>
+#	define EXPORTIT __declspec(dllexport)
+#else
+#	define EXPORTIT
+#endif
+
+#include <stdint.h>
+
+/*------------------------------------------------------------------------
+ * KeccakP-1600-opt64.h
+ *------------------------------------------------------------------------*/
+
+/* round constants of the iota step */
+extern const uint64_t KeccakP1600_RC[24];
+
+/* fully unrolled permutation, with lane complementing */
+EXPORTIT void Keccak_f_64_opt(uint64_t s[25]);
+
+/* single state permutation, running the selected implementation among:
+   "opt64" (Keccak_f_64_opt(), default), "ref64" (Keccak_f_64()),
+   "ref32" (Keccak_f_32()) and "ref8" (Keccak_f_8()) */
+EXPORTIT void KeccakP1600(uint64_t s[25]);
+
+/* NULL-terminated list of the implementations names */
+extern const char * const KeccakP1600_impls[];
+
+/* select the implementation used by KeccakP1600(), returns 0 on success
+   and -1 if name is unknown */
+EXPORTIT int KeccakP1600_set_impl(const char * name);
+
+/* returns the name of the implementation used by KeccakP1600() */
+EXPORTIT const char * KeccakP1600_get_impl(void);
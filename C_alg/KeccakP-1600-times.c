@@ -0,0 +1,207 @@
+/* -----------------------------------------------------------------------
+ * multi-state Keccak-p[1600] permutation, with 2, 4 or 8 states processed
+ * together, one state per SIMD lane
+ *
+ * states are interleaved lane by lane into vector registers, so that each
+ * instruction of the permutation applies to all states at once:
+ * - 2 states with SSE2 (or the generic vector code on non-x86 GCC targets)
+ * - 4 states with AVX2
+ * - 8 states with AVX-512F
+ * the widest variant is selected at runtime according to the CPU features,
+ * and remaining states (or non-GCC compilers) fall back to KeccakP1600()
+ *-----------------------------------------------------------------------*/
+
+#include <string.h>
+#include "KeccakP-1600-opt64.h"
+#include "KeccakP-1600-times.h"
+
+
+/* ---------------------------------------------------------------------
+   scalar fallback, one state at a time
+   ---------------------------------------------------------------------
+*/
+static void KeccakP1600_times1(uint8_t * states, size_t n, unsigned int iterations)
+{
+    uint64_t s[25];
+    unsigned int it;
+    
+    for (; n; n--, states += 200)
+    {
+        memcpy(s, states, 200);
+        for (it = iterations; it; it--)
+            KeccakP1600(s);
+        memcpy(states, s, 200);
+    }
+}
+
+
+#if defined(__GNUC__)
+
+#define ROL64(a, n) (((a) << (n)) | ((a) >> (64-(n))))
+
+/* defines a function permuting n states (n being a multiple of W), W at a time,
+   each state being loaded into one lane of the V vector type */
+#define KECCAKP1600_TIMES(name, V, W, attr)                                   \
+static attr void name(uint8_t * states, size_t n, unsigned int iterations)    \
+{                                                                             \
+    V A[25], B[25], C0, C1, C2, C3, C4, D0, D1, D2, D3, D4;                   \
+    uint64_t lane;                                                            \
+    unsigned int i, j, it, round;                                             \
+                                                                              \
+    for (; n >= W; n -= W, states += 200*W)                                   \
+    {                                                                         \
+        for (i=0; i<25; i++)                                                  \
+            for (j=0; j<W; j++)                                               \
+            {                                                                 \
+                memcpy(&lane, states + 200*j + 8*i, 8);                       \
+                A[i][j] = lane;                                               \
+            }                                                                 \
+        for (it = iterations; it; it--)                                       \
+            for (round=0; round<24; round++)                                  \
+            {                                                                 \
+                /* theta */                                                   \
+                C0 = A[0] ^ A[5] ^ A[10] ^ A[15] ^ A[20];                     \
+                C1 = A[1] ^ A[6] ^ A[11] ^ A[16] ^ A[21];                     \
+                C2 = A[2] ^ A[7] ^ A[12] ^ A[17] ^ A[22];                     \
+                C3 = A[3] ^ A[8] ^ A[13] ^ A[18] ^ A[23];                     \
+                C4 = A[4] ^ A[9] ^ A[14] ^ A[19] ^ A[24];                     \
+                D0 = C4 ^ ROL64(C1, 1);                                       \
+                D1 = C0 ^ ROL64(C2, 1);                                       \
+                D2 = C1 ^ ROL64(C3, 1);                                       \
+                D3 = C2 ^ ROL64(C4, 1);                                       \
+                D4 = C3 ^ ROL64(C0, 1);                                       \
+                /* rho and pi */                                              \
+                B[0] = A[0] ^ D0;                                             \
+                B[1] = ROL64(A[6] ^ D1, 44);                                  \
+                B[2] = ROL64(A[12] ^ D2, 43);                                 \
+                B[3] = ROL64(A[18] ^ D3, 21);                                 \
+                B[4] = ROL64(A[24] ^ D4, 14);                                 \
+                B[5] = ROL64(A[3] ^ D3, 28);                                  \
+                B[6] = ROL64(A[9] ^ D4, 20);                                  \
+                B[7] = ROL64(A[10] ^ D0, 3);                                  \
+                B[8] = ROL64(A[16] ^ D1, 45);                                 \
+                B[9] = ROL64(A[22] ^ D2, 61);                                 \
+                B[10] = ROL64(A[1] ^ D1, 1);                                  \
+                B[11] = ROL64(A[7] ^ D2, 6);                                  \
+                B[12] = ROL64(A[13] ^ D3, 25);                                \
+                B[13] = ROL64(A[19] ^ D4, 8);                                 \
+                B[14] = ROL64(A[20] ^ D0, 18);                                \
+                B[15] = ROL64(A[4] ^ D4, 27);                                 \
+                B[16] = ROL64(A[5] ^ D0, 36);                                 \
+                B[17] = ROL64(A[11] ^ D1, 10);                                \
+                B[18] = ROL64(A[17] ^ D2, 15);                                \
+                B[19] = ROL64(A[23] ^ D3, 56);                                \
+                B[20] = ROL64(A[2] ^ D2, 62);                                 \
+                B[21] = ROL64(A[8] ^ D3, 55);                                 \
+                B[22] = ROL64(A[14] ^ D4, 39);                                \
+                B[23] = ROL64(A[15] ^ D0, 41);                                \
+                B[24] = ROL64(A[21] ^ D1, 2);                                 \
+                /* chi */                                                     \
+                A[0] = B[0] ^ (~B[1] & B[2]);                                 \
+                A[1] = B[1] ^ (~B[2] & B[3]);                                 \
+                A[2] = B[2] ^ (~B[3] & B[4]);                                 \
+                A[3] = B[3] ^ (~B[4] & B[0]);                                 \
+                A[4] = B[4] ^ (~B[0] & B[1]);                                 \
+                A[5] = B[5] ^ (~B[6] & B[7]);                                 \
+                A[6] = B[6] ^ (~B[7] & B[8]);                                 \
+                A[7] = B[7] ^ (~B[8] & B[9]);                                 \
+                A[8] = B[8] ^ (~B[9] & B[5]);                                 \
+                A[9] = B[9] ^ (~B[5] & B[6]);                                 \
+                A[10] = B[10] ^ (~B[11] & B[12]);                             \
+                A[11] = B[11] ^ (~B[12] & B[13]);                             \
+                A[12] = B[12] ^ (~B[13] & B[14]);                             \
+                A[13] = B[13] ^ (~B[14] & B[10]);                             \
+                A[14] = B[14] ^ (~B[10] & B[11]);                             \
+                A[15] = B[15] ^ (~B[16] & B[17]);                             \
+                A[16] = B[16] ^ (~B[17] & B[18]);                             \
+                A[17] = B[17] ^ (~B[18] & B[19]);                             \
+                A[18] = B[18] ^ (~B[19] & B[15]);                             \
+                A[19] = B[19] ^ (~B[15] & B[16]);                             \
+                A[20] = B[20] ^ (~B[21] & B[22]);                             \
+                A[21] = B[21] ^ (~B[22] & B[23]);                             \
+                A[22] = B[22] ^ (~B[23] & B[24]);                             \
+                A[23] = B[23] ^ (~B[24] & B[20]);                             \
+                A[24] = B[24] ^ (~B[20] & B[21]);                             \
+                /* iota */                                                    \
+                A[0] ^= KeccakP1600_RC[round];                                \
+            }                                                                 \
+        for (i=0; i<25; i++)                                                  \
+            for (j=0; j<W; j++)                                               \
+            {                                                                 \
+                lane = A[i][j];                                               \
+                memcpy(states + 200*j + 8*i, &lane, 8);                       \
+            }                                                                 \
+    }                                                                         \
+}
+
+typedef uint64_t V2 __attribute__((vector_size(16)));
+KECCAKP1600_TIMES(KeccakP1600_times2, V2, 2, )
+
+#if defined(__x86_64__) || defined(__i386__)
+
+#define KECCAKP1600_TIMES_X86
+
+typedef uint64_t V4 __attribute__((vector_size(32)));
+typedef uint64_t V8 __attribute__((vector_size(64)));
+KECCAKP1600_TIMES(KeccakP1600_times4, V4, 4, __attribute__((target("avx2"))))
+KECCAKP1600_TIMES(KeccakP1600_times8, V8, 8, __attribute__((target("avx512f"))))
+
+#endif
+
+#endif
+
+
+unsigned int KeccakP1600_times_lanes(void)
+{
+#if defined(KECCAKP1600_TIMES_X86)
+    __builtin_cpu_init();
+    if (__builtin_cpu_supports("avx512f"))
+        return 8;
+    if (__builtin_cpu_supports("avx2"))
+        return 4;
+    return 2;
+#elif defined(__GNUC__)
+    return 2;
+#else
+    return 1;
+#endif
+}
+
+
+void KeccakP1600_times(uint8_t * states, size_t n, unsigned int iterations,
+                       unsigned int lanes)
+{
+    unsigned int max_lanes = KeccakP1600_times_lanes();
+    size_t m;
+    
+    if (lanes == 0 || lanes > max_lanes)
+        lanes = max_lanes;
+    
+#if defined(KECCAKP1600_TIMES_X86)
+    if (lanes >= 8 && n >= 8)
+    {
+        m = n & ~(size_t)7;
+        KeccakP1600_times8(states, m, iterations);
+        states += 200*m;
+        n -= m;
+    }
+    if (lanes >= 4 && n >= 4)
+    {
+        m = n & ~(size_t)3;
+        KeccakP1600_times4(states, m, iterations);
+        states += 200*m;
+        n -= m;
+    }
+#endif
+#if defined(__GNUC__)
+    if (lanes >= 2 && n >= 2)
+    {
+        m = n & ~(size_t)1;
+        KeccakP1600_times2(states, m, iterations);
+        states += 200*m;
+        n -= m;
+    }
+#endif
+    (void)m;
+    KeccakP1600_times1(states, n, iterations);
+}
@@ -0,0 +1,30 @@
+/* -----------------------------------------------------------------------
+ * multi-state Keccak-p[1600] permutation, with 2, 4 or 8 states processed
+ * together, one state per SIMD lane
+ *-----------------------------------------------------------------------*/
+
+/* this is the trick to make the code cross-platform
+ * at least, Win32 / Linux */
+
+#if defined(_WIN32) || defined(__WIN32__)
+#	include <windows.h>
+#	define EXPORTIT __declspec(dllexport)
+#else
+#	define EXPORTIT
+#endif
+
+#include <stdint.h>
+#include <stddef.h>
+
+/*------------------------------------------------------------------------
+ * KeccakP-1600-times.h
+ *------------------------------------------------------------------------*/
+
+/* permutes n contiguous 200-byte states (in the KeccakP1600() lane layout),
+   each one iterations times, using up to lanes states per SIMD register
+   (1, 2, 4 or 8, 0 for the widest available on the running CPU) */
+EXPORTIT void KeccakP1600_times(uint8_t * states, size_t n, unsigned int iterations,
+                                unsigned int lanes);
+
+/* returns the widest number of lanes available on the running CPU */
+EXPORTIT unsigned int KeccakP1600_times_lanes(void);
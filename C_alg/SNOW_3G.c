@@ -603,3 +603,143 @@ u8* f9( u8* key, u32 count, u32 fresh, u32 dir, u8 *data, u64 length)
 
 /* End of f9.c */
 /*------------------------------------------------------------------------*/
+
+/*---------------------------------------------------------
+ *					f8 / f9 fused protection
+ *---------------------------------------------------------*/
+
+/* this is an addition to the C reference code: the f9 keystream words and
+ * the f8 keystream are generated first, then the data is read once, each
+ * byte being MAC'd and ciphered in the same pass, and written once into the
+ * output buffer; multiplications by P are done with the table of P.x^i
+ */
+
+/* MUL64tab.
+ * Input V: a 64-bit input.
+ * Input Ptab: the 64 values P.x^i, computed with MUL64x.
+ * Output : V.P, a 64-bit output.
+ */
+static u64 MUL64tab(u64 V, u64 *Ptab)
+{
+	u64 result = 0;
+	int i = 0;
+	
+	for ( ; V; V >>= 1, i++)
+	{
+		if (V & 0x1)
+			result ^= Ptab[i];
+	}
+	return result;
+}
+
+/* f8f9.
+ * Input ck: 128 bit Confidentiality Key.
+ * Input ik: 128 bit Integrity Key.
+ * Input count: 32-bit Count.
+ * Input bearer: 5-bit Bearer identity (in the LSB side), for f8.
+ * Input fresh: 32-bit Random number, for f9.
+ * Input dir: 1 bit, direction of transmission.
+ * Input data: length bytes, input byte stream.
+ * Input length: number of bytes of data.
+ * Input offset: number of leading bytes of data which are not ciphered.
+ * Input mode: 0 for f9 first, over data, the MAC being appended to data and 
+ * ciphered from offset: out = data[:offset] || f8(data[offset:] || MAC),
+ * 1 for f8 first, from offset, the MAC being computed over the output and 
+ * prepended to it: out = MAC || data[:offset] || f8(data[offset:]).
+ * Output out: length + 4 bytes, assumes memory is allocated already.
+ * Returns 0, or -1 on memory allocation failure.
+ */
+EXPORTIT int f8f9(u8 *ck, u8 *ik, u32 count, u32 bearer, u32 fresh, u32 dir,
+                  u8 *data, u32 length, u32 offset, u32 mode, u8 *out)
+{
+	u32 K[4], IV[4], z[5];
+	u32 *KS, n, i, j, k, mac;
+	u64 Ptab[64], EVAL, Q, R, blk;
+	u8 b, c, *o;
+	
+	/* f9 keystream words z_1 to z_5 */
+	for (i=0; i<4; i++)
+		K[3-i] = (ik[4*i] << 24) ^ (ik[4*i+1] << 16) ^
+				 (ik[4*i+2] << 8) ^ (ik[4*i+3]);
+	IV[3] = count;
+	IV[2] = fresh;
+	IV[1] = count ^ ( dir << 31 ) ;
+	IV[0] = fresh ^ (dir << 15);
+	Initialize(K, IV);
+	GenerateKeystream(5, z);
+	
+	Ptab[0] = (u64)z[0] << 32 | (u64)z[1];
+	for (i=1; i<64; i++)
+		Ptab[i] = MUL64x(Ptab[i-1], 0x1b);
+	Q = (u64)z[2] << 32 | (u64)z[3];
+	
+	/* f8 keystream, for the ciphered bytes */
+	n = (length - offset + (mode ? 0 : 4) + 3) / 4;
+	KS = (u32 *)malloc(4*(n ? n : 1));
+	if (KS == NULL)
+		return -1;
+	for (i=0; i<4; i++)
+		K[3-i] = (ck[4*i] << 24) ^ (ck[4*i+1] << 16) 
+			   ^ (ck[4*i+2] << 8) ^ (ck[4*i+3]);
+	IV[3] = count;
+	IV[2] = (bearer << 27) | ((dir & 0x1) << 26);
+	IV[1] = IV[3];
+	IV[0] = IV[2];
+	Initialize(K, IV);
+	GenerateKeystream(n, KS);
+	
+	/* single pass over data */
+	o = mode ? out + 4 : out;
+	EVAL = 0;
+	blk = 0;
+	for (j=0; j<length; j++)
+	{
+		b = data[j];
+		if (j >= offset)
+		{
+			k = j - offset;
+			c = b ^ (u8)(KS[k>>2] >> (24 - 8*(k&3)));
+		}
+		else
+			c = b;
+		o[j] = c;
+		blk = (blk << 8) | (mode ? c : b);
+		if ((j & 7) == 7)
+		{
+			EVAL = MUL64tab(EVAL ^ blk, Ptab);
+			blk = 0;
+		}
+	}
+	if (length & 7)
+		EVAL = MUL64tab(EVAL ^ (blk << (8*(8 - (length & 7)))), Ptab);
+	EVAL ^= (u64)length << 3;
+	
+	/* Multiply by Q */
+	R = 0;
+	for (i=0; i<64; i++, Q = MUL64x(Q, 0x1b))
+	{
+		if ((EVAL >> i) & 0x1)
+			R ^= Q;
+	}
+	mac = (u32)(R >> 32) ^ z[4];
+	
+	if (mode)
+	{
+		for (i=0; i<4; i++)
+			out[i] = (u8)(mac >> (24-8*i));
+	}
+	else
+	{
+		for (i=0; i<4; i++)
+		{
+			k = length - offset + i;
+			out[length+i] = (u8)(mac >> (24-8*i)) ^ (u8)(KS[k>>2] >> (24 - 8*(k&3)));
+		}
+	}
+	
+	free(KS);
+	return 0;
+}
+
+/* End of f8 / f9 fused protection */
+/*------------------------------------------------------------------------*/
@@ -82,3 +82,23 @@ EXPORTIT void f8( u8 *key, u32 count, u32 bearer, u32 dir, \
 
 EXPORTIT u8* f9( u8* key, u32 count, u32 fresh, u32 dir, \
                  u8 *data, u64 length);
+
+/* f8f9.
+ * Input ck: 128 bit Confidentiality Key.
+ * Input ik: 128 bit Integrity Key.
+ * Input count: 32-bit Count.
+ * Input bearer: 5-bit Bearer identity (in the LSB side), for f8.
+ * Input fresh: 32-bit Random number, for f9.
+ * Input dir: 1 bit, direction of transmission.
+ * Input data: length bytes, input byte stream.
+ * Input length: number of bytes of data.
+ * Input offset: number of leading bytes of data which are not ciphered.
+ * Input mode: 0 for f9 first, out = data[:offset] || f8(data[offset:] || MAC),
+ * 1 for f8 first, out = MAC || data[:offset] || f8(data[offset:]).
+ * Output out: length + 4 bytes, assumes memory is allocated already.
+ * Returns 0, or -1 on memory allocation failure.
+ * Computes f9 and f8 in a single pass over data.
+ */
+
+EXPORTIT int f8f9(u8 *ck, u8 *ik, u32 count, u32 bearer, u32 fresh, u32 dir,
+                  u8 *data, u32 length, u32 offset, u32 mode, u8 *out);
@@ -404,3 +404,109 @@ EXPORTIT void EIA3(u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION,
 	free(z);
 }
 /* end of EIA3.c */
+
+/*-----------------------------------------------------
+ * EEA3 / EIA3 fused protection
+ *---------------------------------------------------*/
+
+/*
+ * this is an addition to the C reference code: both keystreams are generated
+ * first, then the message is read once, each byte being MAC'd and ciphered
+ * in the same pass, and written once into the output buffer
+*/
+static void EEA3_IV(u32 COUNT, u32 BEARER, u32 DIRECTION, u8* IV)
+{
+	IV[0]	= (COUNT>>24) & 0xFF;
+	IV[1]	= (COUNT>>16) & 0xFF;
+	IV[2]	= (COUNT>>8)  & 0xFF;
+	IV[3]	=  COUNT      & 0xFF;
+	IV[4]	= ((BEARER << 3) | ((DIRECTION&1)<<2)) & 0xFC;
+	IV[5]	= IV[6] = IV[7] = 0;
+	IV[8]	= IV[0];
+	IV[9]	= IV[1];
+	IV[10]	= IV[2];
+	IV[11]	= IV[3];
+	IV[12]	= IV[4];
+	IV[13]	= IV[14] = IV[15] = 0;
+}
+
+static void EIA3_IV(u32 COUNT, u32 BEARER, u32 DIRECTION, u8* IV)
+{
+	IV[0]	= (COUNT>>24) & 0xFF;
+	IV[1]	= (COUNT>>16) & 0xFF;
+	IV[2]	= (COUNT>>8) & 0xFF;
+	IV[3]	= COUNT & 0xFF;
+	IV[4]	= (BEARER << 3) & 0xF8;
+	IV[5]	= IV[6] = IV[7] = 0;
+	IV[8]	= IV[0] ^ ((DIRECTION&1)<<7);
+	IV[9]	= IV[1];
+	IV[10]	= IV[2];
+	IV[11]	= IV[3];
+	IV[12]	= IV[4];
+	IV[13]	= 0;
+	IV[14]	= (DIRECTION&1)<<7;
+	IV[15]	= 0;
+}
+
+EXPORTIT int ZUC_protect(u8* CK, u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION,
+                         u32 LENGTH, u32 OFFSET, u32 MODE, u8* M, u8* C)
+{
+	u32 *ze, *zi, Le, Li, T, j, k, sh;
+	unsigned long long W;
+	u8 IV[16], b, c, *out;
+	
+	/* ciphered bytes: M[OFFSET:], with the MAC in MODE 0 */
+	Le	= (LENGTH - OFFSET + (MODE ? 0 : 4) + 3) / 4;
+	/* EIA3 keystream for the 8*LENGTH bits MAC'd */
+	Li	= (LENGTH + 3) / 4 + 2;
+	ze	= (u32 *) malloc((Le+Li)*sizeof(u32));
+	if (ze == NULL)
+		return -1;
+	zi	= ze + Le;
+	
+	EEA3_IV(COUNT, BEARER, DIRECTION, IV);
+	ZUC(CK, IV, ze, Le);
+	EIA3_IV(COUNT, BEARER, DIRECTION, IV);
+	ZUC(IK, IV, zi, Li);
+	
+	/* MODE 0: C = M[:OFFSET] || EEA3(M[OFFSET:] || EIA3(M))
+	 * MODE 1: C = EIA3(M[:OFFSET] || EEA3(M[OFFSET:])) || M[:OFFSET] || EEA3(M[OFFSET:]) */
+	out	= MODE ? C + 4 : C;
+	T	= 0;
+	for (j=0; j<LENGTH; j++) {
+		b = M[j];
+		if (j >= OFFSET) {
+			k = j - OFFSET;
+			c = b ^ (u8)(ze[k>>2] >> (24 - 8*(k&3)));
+		} else
+			c = b;
+		out[j] = c;
+		if (MODE)
+			b = c;
+		if (b) {
+			/* GET_WORD(zi, 8*j+i) for the 8 bits of the byte */
+			W	= ((unsigned long long)zi[j>>2] << 32) | zi[(j>>2)+1];
+			sh	= 8*(j&3);
+			for (k=0; k<8; k++) {
+				if (b & (0x80>>k))
+					T ^= (u32)((W << (sh+k)) >> 32);
+			}
+		}
+	}
+	T ^= GET_WORD(zi, 8*LENGTH);
+	T ^= zi[Li-1];
+	
+	if (MODE) {
+		for (j=0; j<4; j++)
+			C[j] = (u8)(T >> (24-8*j));
+	} else {
+		for (j=0; j<4; j++) {
+			k = LENGTH - OFFSET + j;
+			C[LENGTH+j] = (u8)(T >> (24-8*j)) ^ (u8)(ze[k>>2] >> (24 - 8*(k&3)));
+		}
+	}
+	
+	free(ze);
+	return 0;
+}
+/* end of EEA3 / EIA3 fused protection */
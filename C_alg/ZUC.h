@@ -66,3 +66,20 @@ EXPORTIT void EEA3(u8* CK, u32 COUNT, u32 BEARER, u32 DIRECTION,
  */
 EXPORTIT void EIA3(u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION,
 		           u32 LENGTH, u32* M, u32* MAC);
+
+/*
+ * CK: ciphering key
+ * IK: integrity key
+ * COUNT: frame counter
+ * BEARER: radio bearer
+ * DIRECTION
+ * LENGTH: length of the message in bytes
+ * OFFSET: number of leading bytes of the message which are not ciphered
+ * MODE: 0 for integrity protection first, the MAC being appended to the message and ciphered,
+ *       1 for ciphering first, the MAC being computed over the output and prepended to it
+ * M: original message (input)
+ * C: protected message (output, LENGTH + 4 bytes)
+ * returns 0, or -1 on memory allocation failure
+ */
+EXPORTIT int ZUC_protect(u8* CK, u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION,
+                         u32 LENGTH, u32 OFFSET, u32 MODE, u8* M, u8* C);
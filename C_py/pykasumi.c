@@ -42,6 +42,7 @@ static PyObject* pykasumi_keyschedule(PyObject* dummy, PyObject* args);
 static PyObject* pykasumi_kasumi(PyObject* dummy, PyObject* args);
 static PyObject* pykasumi_f8(PyObject* dummy, PyObject* args);
 static PyObject* pykasumi_f9(PyObject* dummy, PyObject* args);
+static PyObject* pykasumi_protect(PyObject* dummy, PyObject* args);
 
 static char pykasumi_keyschedule_doc[] =
     "kasumi_keyschedule(key [16 bytes]) -> None";
@@ -54,6 +55,14 @@ static char pykasumi_f9_doc[] =
     "kasumi_f9(ik [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
               "data_in [bytes], length [int, length in bits]) -> mac [4 bytes]";
 
+static char pykasumi_protect_doc[] =
+    "kasumi_protect(ck [16 bytes], ik [16 bytes], count [uint32], bearer [uint32], fresh [uint32], "\
+                   "dir [0 or 1], data_in [bytes], offset [uint32], mode [0 or 1]) -> data_out [bytes]\n\n"\
+    "f9 and f8 in a single pass over data_in, the offset first bytes being not ciphered:\n"\
+    "mode 0: data_in[:offset] || f8(data_in[offset:] || f9(data_in))\n"\
+    "mode 1: MAC || data_in[:offset] || f8(data_in[offset:]), "\
+            "MAC being f9(data_in[:offset] || f8(data_in[offset:]))";
+
 static PyMethodDef pykasumi_methods[] = 
 {
     //{exported name, function, args handling, doc string}
@@ -62,6 +71,7 @@ static PyMethodDef pykasumi_methods[] =
     {"kasumi_kasumi", pykasumi_kasumi, METH_VARARGS, pykasumi_kasumi_doc},
     {"kasumi_f8", pykasumi_f8, METH_VARARGS, pykasumi_f8_doc},
     {"kasumi_f9", pykasumi_f9, METH_VARARGS, pykasumi_f9_doc},
+    {"kasumi_protect", pykasumi_protect, METH_VARARGS, pykasumi_protect_doc},
     { NULL, NULL, 0, NULL }
 };
 
@@ -266,3 +276,49 @@ static PyObject* pykasumi_f9(PyObject* dummy, PyObject* args)
     ret = PyBytes_FromStringAndSize((char *)mac, 4);
     return ret;
 };
+
+
+static PyObject* pykasumi_protect(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: ck, ik (bytes buffer -> u8 *), count, bearer, fresh, dir (int -> u32),
+    //        data (bytes buffer -> u8 *), offset, mode (int -> u32)
+    Py_buffer ck;
+    Py_buffer ik;
+    Py_buffer data;
+    u32 count, bearer, fresh, dir, offset, mode;
+    
+    if (! PyArg_ParseTuple(args, "z*z*IIIIz*II", &ck, &ik, &count, &bearer, &fresh, &dir,
+                           &data, &offset, &mode))
+        return NULL;
+    
+    // the data length in bits must fit in an int
+    if ((ck.len != 16) || (ik.len != 16) || (dir > 1) || (mode > 1) || \
+        (data.len >= 0x10000000) || (offset > data.len))
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        goto end;
+    };
+    
+    // output: out (bytes buffer of size length + 4), written in place
+    ret = PyBytes_FromStringAndSize(NULL, data.len + 4);
+    if (ret == NULL)
+        goto end;
+    
+    //int f8f9(u8 *ck, u8 *ik, u32 count, u32 bearer, u32 fresh, u32 dir,
+    //         u8 *data, u32 length, u32 offset, u32 mode, u8 *out);
+    if (f8f9((u8 *)ck.buf, (u8 *)ik.buf, count, bearer, fresh, dir, (u8 *)data.buf,
+             (u32)data.len, offset, mode, (u8 *)PyBytes_AS_STRING(ret)) < 0)
+    {
+        Py_DECREF(ret);
+        ret = NULL;
+        PyErr_SetString(PyExc_RuntimeError, "malloc failed");
+    };
+    
+end:
+    PyBuffer_Release(&ck);
+    PyBuffer_Release(&ik);
+    PyBuffer_Release(&data);
+    return ret;
+};
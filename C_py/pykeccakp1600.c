@@ -12,6 +12,8 @@
 
 #include <Python.h>
 #include "../C_alg/KeccakP-1600-3gpp.h"
+#include "../C_alg/KeccakP-1600-opt64.h"
+#include "../C_alg/KeccakP-1600-times.h"
 
 
 /* Python 2 and 3 initialization mess */
@@ -39,15 +41,69 @@ static PyObject * error_out(PyObject *m) {
 }
 
 static PyObject* pykeccakp1600(PyObject* dummy, PyObject* args);
+static PyObject* pykeccakp1600_batch(PyObject* dummy, PyObject* args);
+static PyObject* pykeccakp1600_lanes(PyObject* dummy, PyObject* args);
+static PyObject* pykeccakp1600_inplace(PyObject* dummy, PyObject* args);
+static PyObject* pykeccakp1600_set_impl(PyObject* dummy, PyObject* args);
+static PyObject* pykeccakp1600_get_impl(PyObject* dummy, PyObject* args);
+static PyObject* pykeccakp1600_impls(PyObject* dummy, PyObject* args);
+static PyObject* pytuak_topc(PyObject* dummy, PyObject* args);
+static PyObject* pytuak_f1(PyObject* dummy, PyObject* args);
+static PyObject* pytuak_f2345(PyObject* dummy, PyObject* args);
+static PyObject* pytuak_f5star(PyObject* dummy, PyObject* args);
 //static PyObject* push_data(PyObject* dummy, PyObject* args);
 
 static char pykeccakp1600_doc[] =
     " pykeccakp1600(data_in [200 bytes]) -> data_out [200 bytes]";
+static char pykeccakp1600_batch_doc[] =
+    "keccakp1600_batch(data_in [N*200 bytes], iterations [uint32, default 1], "\
+                      "lanes [0, 1, 2, 4 or 8, default 0]) -> data_out [N*200 bytes]\n"\
+    "permutes N states together, interleaved over SIMD lanes "\
+    "(0 for the widest available)";
+static char pykeccakp1600_lanes_doc[] =
+    "keccakp1600_lanes() -> widest number of SIMD lanes used by keccakp1600_batch";
+static char pykeccakp1600_inplace_doc[] =
+    "keccakp1600_inplace(buf [writable, 200 or N*200 bytes], iterations [uint32, default 1]) -> None\n"\
+    "permutes the state(s) within buf iterations times, without any allocation, "\
+    "with the selected single state permutation (over SIMD lanes for the default one)";
+static char pykeccakp1600_set_impl_doc[] =
+    "keccakp1600_set_impl(name [str]) -> None\n"\
+    "selects the single state permutation, among keccakp1600_impls()";
+static char pykeccakp1600_get_impl_doc[] =
+    "keccakp1600_get_impl() -> name of the selected single state permutation";
+static char pykeccakp1600_impls_doc[] =
+    "keccakp1600_impls() -> tuple of the single state permutations names, "\
+    "\"opt64\" (default) being the optimized one and \"ref64\", \"ref32\", \"ref8\" "\
+    "the 3GPP TS 35.231 reference ones";
+static char pytuak_topc_doc[] =
+    "tuak_topc(top [32 bytes], instance [uint8], algoname [7 bytes], k [16 or 32 bytes], "\
+              "iterations [uint32]) -> topc [32 bytes]";
+static char pytuak_f1_doc[] =
+    "tuak_f1(topc [32 bytes], instance [uint8], algoname [7 bytes], rand [16 bytes], "\
+            "amf [2 bytes], sqn [6 bytes], k [16 or 32 bytes], iterations [uint32], "\
+            "maclen [8, 16 or 32]) -> mac [maclen bytes]";
+static char pytuak_f2345_doc[] =
+    "tuak_f2345(topc [32 bytes], instance [uint8], algoname [7 bytes], rand [16 bytes], "\
+               "k [16 or 32 bytes], iterations [uint32], reslen [4, 8, 16 or 32], "\
+               "cklen [16 or 32], iklen [16 or 32]) -> (res, ck, ik, ak [6 bytes])";
+static char pytuak_f5star_doc[] =
+    "tuak_f5star(topc [32 bytes], instance [uint8], algoname [7 bytes], rand [16 bytes], "\
+                "k [16 or 32 bytes], iterations [uint32]) -> ak [6 bytes]";
 
 static PyMethodDef pykeccakp1600_methods[] = 
 {
     {"error_out", (PyCFunction)error_out, METH_NOARGS, NULL},
     {"pykeccakp1600", pykeccakp1600, METH_VARARGS, pykeccakp1600_doc},
+    {"keccakp1600_batch", pykeccakp1600_batch, METH_VARARGS, pykeccakp1600_batch_doc},
+    {"keccakp1600_lanes", pykeccakp1600_lanes, METH_NOARGS, pykeccakp1600_lanes_doc},
+    {"keccakp1600_inplace", pykeccakp1600_inplace, METH_VARARGS, pykeccakp1600_inplace_doc},
+    {"keccakp1600_set_impl", pykeccakp1600_set_impl, METH_VARARGS, pykeccakp1600_set_impl_doc},
+    {"keccakp1600_get_impl", pykeccakp1600_get_impl, METH_NOARGS, pykeccakp1600_get_impl_doc},
+    {"keccakp1600_impls", pykeccakp1600_impls, METH_NOARGS, pykeccakp1600_impls_doc},
+    {"tuak_topc", pytuak_topc, METH_VARARGS, pytuak_topc_doc},
+    {"tuak_f1", pytuak_f1, METH_VARARGS, pytuak_f1_doc},
+    {"tuak_f2345", pytuak_f2345, METH_VARARGS, pytuak_f2345_doc},
+    {"tuak_f5star", pytuak_f5star, METH_VARARGS, pytuak_f5star_doc},
 //    {"push_data", push_data, METH_VARARGS, NULL},
     { NULL, NULL, 0, NULL }
 };
@@ -132,8 +188,8 @@ uint64_t swap_uint64( uint64_t val )
 }
 
 /* 
-   pykeccakp1600 binding to the Keccak_f_64() function 
-   as defined in KeccakP-1600-3gpp.h
+   pykeccakp1600 binding to the KeccakP1600() function, 
+   running the implementation selected in KeccakP-1600-opt64.h
 */
 
 static PyObject* pykeccakp1600(PyObject* dummy, PyObject* args)
@@ -161,8 +217,8 @@ static PyObject* pykeccakp1600(PyObject* dummy, PyObject* args)
     }
     */
     
-    //void Keccak_f_64(uint64 *s)
-    Keccak_f_64(state);
+    //void KeccakP1600(uint64 *s)
+    KeccakP1600(state);
     
     /*
     for (i=0; i < 25; i++) {
@@ -175,6 +231,339 @@ static PyObject* pykeccakp1600(PyObject* dummy, PyObject* args)
 };
 
 
+/* 
+   pykeccakp1600_batch binding to the KeccakP1600_times() function
+   as defined in KeccakP-1600-times.h
+*/
+
+static PyObject* pykeccakp1600_batch(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = NULL;
+    Py_buffer data_in;
+    unsigned int iterations = 1, lanes = 0;
+    uint8_t * states;
+    
+    if (! PyArg_ParseTuple(args, "z*|II", &data_in, &iterations, &lanes))
+        return NULL;
+    
+    if (data_in.len % 200 ||
+        (lanes != 0 && lanes != 1 && lanes != 2 && lanes != 4 && lanes != 8))
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        goto end;
+    };
+    
+    ret = PyBytes_FromStringAndSize((char *)data_in.buf, data_in.len);
+    if (ret == NULL)
+        goto end;
+    states = (uint8_t *)PyBytes_AS_STRING(ret);
+    
+    Py_BEGIN_ALLOW_THREADS
+    KeccakP1600_times(states, (size_t)(data_in.len / 200), iterations, lanes);
+    Py_END_ALLOW_THREADS
+    
+end:
+    PyBuffer_Release(&data_in);
+    return ret;
+};
+
+static PyObject* pykeccakp1600_lanes(PyObject* dummy, PyObject* args)
+{
+    return PyLong_FromUnsignedLong(KeccakP1600_times_lanes());
+};
+
+/* 
+   pykeccakp1600_inplace, permuting a writable buffer (e.g. bytearray or memoryview)
+   in place, over all its states and iterations, with the GIL released
+*/
+
+static PyObject* pykeccakp1600_inplace(PyObject* dummy, PyObject* args)
+{
+    Py_buffer buf;
+    unsigned int iterations = 1, lanes;
+    
+    if (! PyArg_ParseTuple(args, "w*|I", &buf, &iterations))
+        return NULL;
+    
+    if (buf.len == 0 || buf.len % 200)
+    {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_ValueError, "invalid arg, must be a multiple of 200 bytes");
+        return NULL;
+    };
+    
+    /* the SIMD multi-state permutations only implement the default "opt64" one,
+       another selected implementation permutes each state on its own */
+    lanes = strcmp(KeccakP1600_get_impl(), KeccakP1600_impls[0]) ? 1 : 0;
+    
+    Py_BEGIN_ALLOW_THREADS
+    KeccakP1600_times((uint8_t *)buf.buf, (size_t)(buf.len / 200), iterations, lanes);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&buf);
+    Py_RETURN_NONE;
+};
+
+
+/* 
+   selection of the single state permutation used by pykeccakp1600,
+   keccakp1600_inplace and the TUAK bindings
+*/
+
+#if PY_MAJOR_VERSION >= 3
+    #define PyStr_FromString PyUnicode_FromString
+#else
+    #define PyStr_FromString PyString_FromString
+#endif
+
+static PyObject* pykeccakp1600_set_impl(PyObject* dummy, PyObject* args)
+{
+    const char * name;
+    
+    if (! PyArg_ParseTuple(args, "s", &name))
+        return NULL;
+    
+    if (KeccakP1600_set_impl(name) != 0)
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid arg, unknown implementation");
+        return NULL;
+    };
+    Py_RETURN_NONE;
+};
+
+static PyObject* pykeccakp1600_get_impl(PyObject* dummy, PyObject* args)
+{
+    return PyStr_FromString(KeccakP1600_get_impl());
+};
+
+static PyObject* pykeccakp1600_impls(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret;
+    Py_ssize_t i, n = 0;
+    
+    while (KeccakP1600_impls[n] != NULL)
+        n++;
+    ret = PyTuple_New(n);
+    if (ret == NULL)
+        return NULL;
+    for (i=0; i<n; i++)
+    {
+        PyObject* name = PyStr_FromString(KeccakP1600_impls[i]);
+        if (name == NULL)
+        {
+            Py_DECREF(ret);
+            return NULL;
+        };
+        PyTuple_SET_ITEM(ret, i, name);
+    };
+    return ret;
+};
+
+
+/* 
+   TUAK bindings, building the 200 bytes INOUT state directly
+   as defined in 3GPP TS 35.231, section 6
+   
+   each input field is pushed byte-reversed at its location in the state,
+   and each output field is pulled byte-reversed from it
+*/
+
+static void push_rev(uint8_t * state, const uint8_t * data, Py_ssize_t n, int loc)
+{
+    while (n--)
+        state[loc++] = data[n];
+};
+
+static PyObject* pull_rev(const uint8_t * state, Py_ssize_t n, int loc)
+{
+    PyObject* ret;
+    char * buf;
+    
+    ret = PyBytes_FromStringAndSize(NULL, n);
+    if (ret == NULL)
+        return NULL;
+    buf = PyBytes_AS_STRING(ret);
+    while (n--)
+        *buf++ = (char)state[loc+n];
+    return ret;
+};
+
+/* set TOP or TOPc, INSTANCE, ALGONAME, K and the padding into the state,
+   the 24 bytes at location 40 are left zeroed */
+static void tuak_init_state(uint64_t state[25], Py_buffer * top, uint8_t instance,
+                            Py_buffer * algoname, Py_buffer * k)
+{
+    uint8_t * s = (uint8_t *)state;
+    
+    memset(state, 0, 200);
+    push_rev(s, (uint8_t *)top->buf, 32, 0);
+    s[32] = instance;
+    push_rev(s, (uint8_t *)algoname->buf, 7, 33);
+    push_rev(s, (uint8_t *)k->buf, k->len, 64);
+    // padding
+    s[96]  = 0x1f;
+    s[135] = 0x80;
+};
+
+static void tuak_permute(uint64_t state[25], unsigned int iterations)
+{
+    while (iterations--)
+        KeccakP1600(state);
+};
+
+static int tuak_check_args(Py_buffer * top, Py_buffer * algoname, Py_buffer * rand,
+                           Py_buffer * k)
+{
+    if ((top->len != 32) || (algoname->len != 7) || (rand != NULL && rand->len != 16) ||
+        (k->len != 16 && k->len != 32))
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return 0;
+    };
+    return 1;
+};
+
+
+static PyObject* pytuak_topc(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = NULL;
+    Py_buffer top, algoname, k;
+    unsigned char instance;
+    unsigned int iterations;
+    uint64_t state[25];
+    
+    if (! PyArg_ParseTuple(args, "z*bz*z*I", &top, &instance, &algoname, &k, &iterations))
+        return NULL;
+    
+    if (tuak_check_args(&top, &algoname, NULL, &k))
+    {
+        tuak_init_state(state, &top, instance, &algoname, &k);
+        tuak_permute(state, iterations);
+        ret = pull_rev((uint8_t *)state, 32, 0);
+    };
+    
+    PyBuffer_Release(&top);
+    PyBuffer_Release(&algoname);
+    PyBuffer_Release(&k);
+    return ret;
+};
+
+
+static PyObject* pytuak_f1(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = NULL;
+    Py_buffer topc, algoname, rand, amf, sqn, k;
+    unsigned char instance;
+    unsigned int iterations, maclen;
+    uint64_t state[25];
+    uint8_t * s = (uint8_t *)state;
+    
+    if (! PyArg_ParseTuple(args, "z*bz*z*z*z*z*II", &topc, &instance, &algoname, &rand,
+                           &amf, &sqn, &k, &iterations, &maclen))
+        return NULL;
+    
+    if (! tuak_check_args(&topc, &algoname, &rand, &k))
+        goto end;
+    if ((amf.len != 2) || (sqn.len != 6) || (maclen != 8 && maclen != 16 && maclen != 32))
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        goto end;
+    };
+    
+    tuak_init_state(state, &topc, instance, &algoname, &k);
+    push_rev(s, (uint8_t *)rand.buf, 16, 40);
+    push_rev(s, (uint8_t *)amf.buf, 2, 56);
+    push_rev(s, (uint8_t *)sqn.buf, 6, 58);
+    tuak_permute(state, iterations);
+    ret = pull_rev(s, maclen, 0);
+    
+end:
+    PyBuffer_Release(&topc);
+    PyBuffer_Release(&algoname);
+    PyBuffer_Release(&rand);
+    PyBuffer_Release(&amf);
+    PyBuffer_Release(&sqn);
+    PyBuffer_Release(&k);
+    return ret;
+};
+
+
+static PyObject* pytuak_f2345(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = NULL;
+    PyObject *res = NULL, *ck = NULL, *ik = NULL, *ak = NULL;
+    Py_buffer topc, algoname, rand, k;
+    unsigned char instance;
+    unsigned int iterations, reslen, cklen, iklen;
+    uint64_t state[25];
+    uint8_t * s = (uint8_t *)state;
+    
+    if (! PyArg_ParseTuple(args, "z*bz*z*z*IIII", &topc, &instance, &algoname, &rand,
+                           &k, &iterations, &reslen, &cklen, &iklen))
+        return NULL;
+    
+    if (! tuak_check_args(&topc, &algoname, &rand, &k))
+        goto end;
+    if ((reslen != 4 && reslen != 8 && reslen != 16 && reslen != 32) ||
+        (cklen != 16 && cklen != 32) || (iklen != 16 && iklen != 32))
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        goto end;
+    };
+    
+    tuak_init_state(state, &topc, instance, &algoname, &k);
+    push_rev(s, (uint8_t *)rand.buf, 16, 40);
+    tuak_permute(state, iterations);
+    
+    res = pull_rev(s, reslen, 0);
+    ck  = pull_rev(s, cklen, 32);
+    ik  = pull_rev(s, iklen, 64);
+    ak  = pull_rev(s, 6, 96);
+    if (res && ck && ik && ak)
+        ret = PyTuple_Pack(4, res, ck, ik, ak);
+    Py_XDECREF(res);
+    Py_XDECREF(ck);
+    Py_XDECREF(ik);
+    Py_XDECREF(ak);
+    
+end:
+    PyBuffer_Release(&topc);
+    PyBuffer_Release(&algoname);
+    PyBuffer_Release(&rand);
+    PyBuffer_Release(&k);
+    return ret;
+};
+
+
+static PyObject* pytuak_f5star(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = NULL;
+    Py_buffer topc, algoname, rand, k;
+    unsigned char instance;
+    unsigned int iterations;
+    uint64_t state[25];
+    uint8_t * s = (uint8_t *)state;
+    
+    if (! PyArg_ParseTuple(args, "z*bz*z*z*I", &topc, &instance, &algoname, &rand,
+                           &k, &iterations))
+        return NULL;
+    
+    if (tuak_check_args(&topc, &algoname, &rand, &k))
+    {
+        tuak_init_state(state, &topc, instance, &algoname, &k);
+        push_rev(s, (uint8_t *)rand.buf, 16, 40);
+        tuak_permute(state, iterations);
+        ret = pull_rev(s, 6, 96);
+    };
+    
+    PyBuffer_Release(&topc);
+    PyBuffer_Release(&algoname);
+    PyBuffer_Release(&rand);
+    PyBuffer_Release(&k);
+    return ret;
+};
+
+
 /*
 void PUSH_DATA_64(uint64_t * INOUT, uint8_t * data, uint8_t n, uint8_t location)
 {
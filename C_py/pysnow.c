@@ -42,6 +42,7 @@ static PyObject* pysnow_initialize(PyObject* dummy, PyObject* args);
 static PyObject* pysnow_generatekeystream(PyObject* dummy, PyObject* args);
 static PyObject* pysnow_f8(PyObject* dummy, PyObject* args);
 static PyObject* pysnow_f9(PyObject* dummy, PyObject* args);
+static PyObject* pysnow_protect(PyObject* dummy, PyObject* args);
 
 static char pysnow_initialize_doc[] =
     "snow_initialize(key [16 bytes], iv [16 bytes]) -> None";
@@ -53,6 +54,13 @@ static char pysnow_f8_doc[] =
 static char pysnow_f9_doc[] =
     "snow_f9(ik [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
             "data_in [bytes], length [uint32, length in bits]) -> mac [4 bytes]";
+static char pysnow_protect_doc[] =
+    "snow_protect(ck [16 bytes], ik [16 bytes], count [uint32], bearer [uint32], fresh [uint32], "\
+                 "dir [0 or 1], data_in [bytes], offset [uint32], mode [0 or 1]) -> data_out [bytes]\n\n"\
+    "f9 and f8 in a single pass over data_in, the offset first bytes being not ciphered:\n"\
+    "mode 0: data_in[:offset] || f8(data_in[offset:] || f9(data_in))\n"\
+    "mode 1: MAC || data_in[:offset] || f8(data_in[offset:]), "\
+            "MAC being f9(data_in[:offset] || f8(data_in[offset:]))";
 
 static PyMethodDef pysnow_methods[] = 
 {
@@ -62,6 +70,7 @@ static PyMethodDef pysnow_methods[] =
     {"snow_generatekeystream", pysnow_generatekeystream, METH_VARARGS, pysnow_generatekeystream_doc},
     {"snow_f8", pysnow_f8, METH_VARARGS, pysnow_f8_doc},
     {"snow_f9", pysnow_f9, METH_VARARGS, pysnow_f9_doc},
+    {"snow_protect", pysnow_protect, METH_VARARGS, pysnow_protect_doc},
     { NULL, NULL, 0, NULL }
 };
 
@@ -301,3 +310,49 @@ static PyObject* pysnow_f9(PyObject* dummy, PyObject* args)
     ret = PyBytes_FromStringAndSize((char *)mac, 4);
     return ret;
 };
+
+
+static PyObject* pysnow_protect(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: ck, ik (bytes buffer -> u8 *), count, bearer, fresh, dir (int -> u32),
+    //        data (bytes buffer -> u8 *), offset, mode (int -> u32)
+    Py_buffer ck;
+    Py_buffer ik;
+    Py_buffer data;
+    u32 count, bearer, fresh, dir, offset, mode;
+    
+    if (! PyArg_ParseTuple(args, "z*z*IIIIz*II", &ck, &ik, &count, &bearer, &fresh, &dir,
+                           &data, &offset, &mode))
+        return NULL;
+    
+    // the data length in bits must fit in an uint32
+    if ((ck.len != 16) || (ik.len != 16) || (dir > 1) || (mode > 1) || \
+        (data.len >= 0x10000000) || (offset > data.len))
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        goto end;
+    };
+    
+    // output: out (bytes buffer of size length + 4), written in place
+    ret = PyBytes_FromStringAndSize(NULL, data.len + 4);
+    if (ret == NULL)
+        goto end;
+    
+    //int f8f9(u8 *ck, u8 *ik, u32 count, u32 bearer, u32 fresh, u32 dir,
+    //         u8 *data, u32 length, u32 offset, u32 mode, u8 *out);
+    if (f8f9((u8 *)ck.buf, (u8 *)ik.buf, count, bearer, fresh, dir, (u8 *)data.buf,
+             (u32)data.len, offset, mode, (u8 *)PyBytes_AS_STRING(ret)) < 0)
+    {
+        Py_DECREF(ret);
+        ret = NULL;
+        PyErr_SetString(PyExc_RuntimeError, "malloc failed");
+    };
+    
+end:
+    PyBuffer_Release(&ck);
+    PyBuffer_Release(&ik);
+    PyBuffer_Release(&data);
+    return ret;
+};
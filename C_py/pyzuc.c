@@ -42,6 +42,7 @@ static PyObject* pyzuc_initialization(PyObject* dummy, PyObject* args);
 static PyObject* pyzuc_generatekeystream(PyObject* dummy, PyObject* args);
 static PyObject* pyzuc_eea3(PyObject* dummy, PyObject* args);
 static PyObject* pyzuc_eia3(PyObject* dummy, PyObject* args);
+static PyObject* pyzuc_protect(PyObject* dummy, PyObject* args);
 
 static char pyzuc_initialization_doc[] =
     "zuc_initialization(key [16 bytes], iv [16 bytes]) -> None";
@@ -53,6 +54,13 @@ static char pyzuc_eea3_doc[] =
 static char pyzuc_eia3_doc[] =
     "zuc_eia3(ik [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
              "length [uint32, length in bits], data_in [bytes]) -> mac [4 bytes]";
+static char pyzuc_protect_doc[] =
+    "zuc_protect(ck [16 bytes], ik [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
+                "data_in [bytes], offset [uint32], mode [0 or 1]) -> data_out [bytes]\n\n"\
+    "EIA3 and EEA3 in a single pass over data_in, the offset first bytes being not ciphered:\n"\
+    "mode 0: data_in[:offset] || EEA3(data_in[offset:] || EIA3(data_in))\n"\
+    "mode 1: MAC || data_in[:offset] || EEA3(data_in[offset:]), "\
+            "MAC being EIA3(data_in[:offset] || EEA3(data_in[offset:]))";
 
 static PyMethodDef pyzuc_methods[] = 
 {
@@ -61,6 +69,7 @@ static PyMethodDef pyzuc_methods[] =
     {"zuc_generatekeystream", pyzuc_generatekeystream, METH_VARARGS, pyzuc_generatekeystream_doc},
     {"zuc_eea3", pyzuc_eea3, METH_VARARGS, pyzuc_eea3_doc},
     {"zuc_eia3", pyzuc_eia3, METH_VARARGS, pyzuc_eia3_doc},
+    {"zuc_protect", pyzuc_protect, METH_VARARGS, pyzuc_protect_doc},
     { NULL, NULL, 0, NULL }
 };
 
@@ -333,3 +342,49 @@ static PyObject* pyzuc_eia3(PyObject* dummy, PyObject* args)
     ret = PyBytes_FromStringAndSize((char *)MAC, 4);
     return ret;
 };
+
+
+static PyObject* pyzuc_protect(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: CK, IK (bytes buffer -> u8 *), COUNT, BEARER, DIRECTION (int -> u32),
+    //        M (bytes buffer -> u8 *), OFFSET, MODE (int -> u32)
+    Py_buffer CK;
+    Py_buffer IK;
+    Py_buffer M_py;
+    u32 COUNT, BEARER, DIRECTION, OFFSET, MODE;
+    
+    if (! PyArg_ParseTuple(args, "z*z*IIIz*II", &CK, &IK, &COUNT, &BEARER, &DIRECTION, &M_py,
+                           &OFFSET, &MODE))
+        return NULL;
+    
+    // the message length in bits must fit in an uint32
+    if ((CK.len != 16) || (IK.len != 16) || (DIRECTION > 1) || (MODE > 1) || \
+        (M_py.len >= 0x10000000) || (OFFSET > M_py.len))
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        goto end;
+    };
+    
+    // output: C (bytes buffer of size LENGTH + 4), written in place
+    ret = PyBytes_FromStringAndSize(NULL, M_py.len + 4);
+    if (ret == NULL)
+        goto end;
+    
+    //int ZUC_protect(u8* CK, u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION,
+    //                u32 LENGTH, u32 OFFSET, u32 MODE, u8* M, u8* C);
+    if (ZUC_protect((u8 *)CK.buf, (u8 *)IK.buf, COUNT, BEARER, DIRECTION, (u32)M_py.len,
+                    OFFSET, MODE, (u8 *)M_py.buf, (u8 *)PyBytes_AS_STRING(ret)) < 0)
+    {
+        Py_DECREF(ret);
+        ret = NULL;
+        PyErr_SetString(PyExc_RuntimeError, "malloc failed");
+    };
+    
+end:
+    PyBuffer_Release(&CK);
+    PyBuffer_Release(&IK);
+    PyBuffer_Release(&M_py);
+    return ret;
+};
@@ -12,7 +12,7 @@
 # *--------------------------------------------------------
 #*/
 
-__all__ = ['AES_CTR', 'AES_ECB']
+__all__ = ['AES_CTR', 'AES_ECB', 'AES_CMAC']
 
 from struct import pack, unpack
 
@@ -37,6 +37,7 @@ else:
 # try to load pycryptodome
 try:
     from Cryptodome.Cipher import AES as AES_pycryptodome
+    from Cryptodome.Hash   import CMAC as CMAC_pycryptodome
 except ImportError:
     _with_pycryptodome = False
 else:
@@ -46,6 +47,7 @@ else:
 # try to load cryptography
 try:
     from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.cmac import CMAC as CMAC_cryptography
     from cryptography.hazmat.backends import default_backend
 except ImportError:
     _with_cryptography = False
@@ -134,6 +136,12 @@ class AES_CTR_pycrypto(object):
         return self.aes.encrypt(data)
     
     decrypt = encrypt
+    
+    @classmethod
+    def bind(cls, key):
+        """return the (nonce, data) -> data function of AES in CTR mode with the
+        given key, the counter starting at 0 for each nonce"""
+        return lambda nonce, data: cls(key, nonce).encrypt(data)
 
 
 class AES_CTR_pycryptodome(object):
@@ -161,6 +169,16 @@ class AES_CTR_pycryptodome(object):
         return self.aes.encrypt(data)
     
     decrypt = encrypt
+    
+    @classmethod
+    def bind(cls, key):
+        """return the (nonce, data) -> data function of AES in CTR mode with the
+        given key, the counter starting at 0 for each nonce"""
+        return lambda nonce, data: cls(key, nonce).encrypt(data)
+
+
+# initial value of the 8 least significant bytes of the counter
+_CNT_ZERO = 8*b'\0'
 
 
 class AES_CTR_cryptography(object):
@@ -187,6 +205,53 @@ class AES_CTR_cryptography(object):
         return self.aes.update(data)
     
     decrypt = encrypt
+    
+    @classmethod
+    def bind(cls, key):
+        """return the (nonce, data) -> data function of AES in CTR mode with the
+        given key, the counter starting at 0 for each nonce
+        
+        the AES key object is built once, only the CTR mode is set per nonce"""
+        aes = algorithms.AES(key)
+        return lambda nonce, data: Cipher(aes, modes.CTR(nonce + _CNT_ZERO),
+                                          backend=_backend).encryptor().update(data)
+
+
+#------------------------------------------------------------------------------#
+# AES CMAC mode (for EIA2)
+#------------------------------------------------------------------------------#
+# pycrypto has no CMAC mode, the pure Python CryptoMobile.CMAC is used instead
+
+class AES_CMAC_pycryptodome(object):
+    """AES in CMAC mode, for byte-aligned messages"""
+    
+    block_size = 16
+    
+    def __init__(self, key):
+        """initialize AES in CMAC mode with the given key"""
+        self.cmac = CMAC_pycryptodome.new(key, ciphermod=AES_pycryptodome)
+    
+    def mac(self, data):
+        """return the 16 bytes MAC of data with the key set at initialization"""
+        cmac = self.cmac.copy()
+        cmac.update(data)
+        return cmac.digest()
+
+
+class AES_CMAC_cryptography(object):
+    """AES in CMAC mode, for byte-aligned messages"""
+    
+    block_size = 16
+    
+    def __init__(self, key):
+        """initialize AES in CMAC mode with the given key"""
+        self.cmac = CMAC_cryptography(algorithms.AES(key), backend=_backend)
+    
+    def mac(self, data):
+        """return the 16 bytes MAC of data with the key set at initialization"""
+        cmac = self.cmac.copy()
+        cmac.update(data)
+        return cmac.finalize()
 
 
 #------------------------------------------------------------------------------#
@@ -195,15 +260,19 @@ class AES_CTR_cryptography(object):
 
 if _with_pycrypto:
     AES_ECB = AES_ECB_pycrypto
+    AES_CMAC = AES_CMAC_pycryptodome if _with_pycryptodome else \
+               AES_CMAC_cryptography if _with_cryptography else None
     AES_CTR = AES_CTR_pycrypto
 
 elif _with_pycryptodome:
     AES_CTR = AES_CTR_pycryptodome
     AES_ECB = AES_ECB_pycryptodome
+    AES_CMAC = AES_CMAC_pycryptodome
 
 elif _with_cryptography:
     AES_CTR = AES_CTR_cryptography
     AES_ECB = AES_ECB_cryptography
+    AES_CMAC = AES_CMAC_cryptography
 
 else:
     raise(ImportError('missing AES backend: requires cryptography, pycryptodome or pycrypto'))
@@ -21,11 +21,12 @@ from .utils   import *
 from .CMAC    import CMAC
 
 try:
-    from .AES import AES_CTR, AES_ECB
+    from .AES import AES_CTR, AES_ECB, AES_CMAC
     # filter * export
     __all__ = ['KASUMI', 'SNOW3G', 'ZUC', 'AES_3GPP',
                'UEA1', 'UIA1', 'UEA2', 'UIA2',
-               'EEA1', 'EIA1', 'EEA2', 'EIA2', 'EEA3', 'EIA3']
+               'EEA1', 'EIA1', 'EEA2', 'EIA2', 'EEA3', 'EIA3',
+               'UEA1_UIA1', 'UEA2_UIA2', 'EEA1_EIA1', 'EEA2_EIA2', 'EEA3_EIA3']
     _with_aes = True
 except ImportError as err:
     print(err)
@@ -33,7 +34,8 @@ except ImportError as err:
     # filter * export
     __all__ = ['KASUMI', 'SNOW3G', 'ZUC', 
                'UEA1', 'UIA1', 'UEA2', 'UIA2',
-               'EEA1', 'EIA1', 'EEA3', 'EIA3']
+               'EEA1', 'EIA1', 'EEA3', 'EIA3',
+               'UEA1_UIA1', 'UEA2_UIA2', 'EEA1_EIA1', 'EEA3_EIA3']
     _with_aes = False
 
 
@@ -66,6 +68,14 @@ class KASUMI(object):
         
         optional bitlen argument represents the length of data_in in bits
     
+    F8F9(ck [16 bytes], ik [16 bytes], count [uint32], bearer [uint32], fresh [uint32], dir [0 or 1],
+         data_in [bytes], offset [uint32], mode [0 or 1]) -> data_out [bytes]
+        
+        computes F9 with ik and F8 with ck in a single pass over a byte-aligned 
+        data_in, the offset first bytes being not ciphered:
+        mode 0: data_in[:offset] || F8(data_in[offset:] || F9(data_in))
+        mode 1: F9(out) || out, with out = data_in[:offset] || F8(data_in[offset:])
+    
     
     GSM / GPRS compatibility modes (A5/3, A5/4, GEA3, GEA4, GIA4) are not implemented
     """
@@ -116,6 +126,19 @@ class KASUMI(object):
         except ValueError as err:
             raise(CMException(err))
     
+    def F8F9(self, ck, ik, count, bearer, fresh, dir, data_in, offset=0, mode=0):
+        # avoid uint32 under/overflow
+        if not 0 <= count < MAX_UINT32 or \
+        not 0 <= bearer < MAX_UINT32 or \
+        not 0 <= fresh < MAX_UINT32 or \
+        not 0 <= offset < MAX_UINT32:
+            raise(CMException('invalid args'))
+        #
+        try:
+            return kasumi_protect(ck, ik, count, bearer, fresh, dir, data_in, offset, mode)
+        except ValueError as err:
+            raise(CMException(err))
+
 
 class SNOW3G(object):
     """UMTS secondary encryption / integrity protection algorithm
@@ -146,6 +169,14 @@ class SNOW3G(object):
         
         optional bitlen argument represents the length of data_in in bits
     
+    F8F9(ck [16 bytes], ik [16 bytes], count [uint32], bearer [uint32], fresh [uint32], dir [0 or 1],
+         data_in [bytes], offset [uint32], mode [0 or 1]) -> data_out [bytes]
+        
+        computes F9 with ik and F8 with ck in a single pass over a byte-aligned 
+        data_in, the offset first bytes being not ciphered:
+        mode 0: data_in[:offset] || F8(data_in[offset:] || F9(data_in))
+        mode 1: F9(out) || out, with out = data_in[:offset] || F8(data_in[offset:])
+    
     
     LTE modes of operation (EEA1, EIA1) is supported as well: the only difference 
     is for EIA1, `bearer' is replacing `fresh' and has a max value of 31.
@@ -155,6 +186,11 @@ class SNOW3G(object):
     
     EIA1(key [16 bytes], count [uint32], bearer [uint5], dir [0 or 1], data_in [bytes], bitlen [uint32])
         -> mac [4 bytes]
+    
+    EEA1_EIA1(ck [16 bytes], ik [16 bytes], count [uint32], bearer [uint5], dir [0 or 1],
+              data_in [bytes], offset [uint32], mode [0 or 1]) -> data_out [bytes]
+        
+        F8F9 with `bearer' replacing `fresh'
     """
     iv_size  = 16
     key_size = 16
@@ -212,6 +248,19 @@ class SNOW3G(object):
         except ValueError as err:
             raise(CMException(err))
     
+    def F8F9(self, ck, ik, count, bearer, fresh, dir, data_in, offset=0, mode=0):
+        # avoid uint32 under/overflow
+        if not 0 <= count < MAX_UINT32 or \
+        not 0 <= bearer < MAX_UINT32 or \
+        not 0 <= fresh < MAX_UINT32 or \
+        not 0 <= offset < MAX_UINT32:
+            raise(CMException('invalid args'))
+        #
+        try:
+            return snow_protect(ck, ik, count, bearer, fresh, dir, data_in, offset, mode)
+        except ValueError as err:
+            raise(CMException(err))
+    
     EEA1 = F8
     
     def EIA1(self, key, count, bearer, dir, data_in, bitlen=None):
@@ -222,6 +271,12 @@ class SNOW3G(object):
             return self.F9(key, count, bearer<<27, dir, data_in, bitlen)
         except (ValueError, CMException) as err:
             raise(CMException(err))
+    
+    def EEA1_EIA1(self, ck, ik, count, bearer, dir, data_in, offset=0, mode=0):
+        if not 0 <= bearer < 32:
+            raise(CMException('invalid args'))
+        #
+        return self.F8F9(ck, ik, count, bearer, bearer<<27, dir, data_in, offset, mode)
 
 
 class ZUC(object):
@@ -252,6 +307,14 @@ class ZUC(object):
         -> mac [4 bytes]
         
         optional bitlen argument represents the length of data_in in bits
+    
+    EEA3_EIA3(ck [16 bytes], ik [16 bytes], count [uint32], bearer [uint5], dir [0 or 1],
+              data_in [bytes], offset [uint32], mode [0 or 1]) -> data_out [bytes]
+        
+        computes EIA3 with ik and EEA3 with ck over a byte-aligned data_in, 
+        the offset first bytes being not ciphered:
+        mode 0: data_in[:offset] || EEA3(data_in[offset:] || EIA3(data_in))
+        mode 1: EIA3(out) || out, with out = data_in[:offset] || EEA3(data_in[offset:])
     """
     iv_size  = 16
     key_size = 16
@@ -308,6 +371,18 @@ class ZUC(object):
             return zuc_eia3(key, count, bearer, dir, bitlen, data_in)
         except ValueError as err:
             raise(CMException(err))
+    
+    def EEA3_EIA3(self, ck, ik, count, bearer, dir, data_in, offset=0, mode=0):
+        # avoid uint32 under/overflow
+        if not 0 <= count < MAX_UINT32 or \
+        not 0 <= bearer < 32 or \
+        not 0 <= offset < MAX_UINT32:
+            raise(CMException('invalid args'))
+        #
+        try:
+            return zuc_protect(ck, ik, count, bearer, dir, data_in, offset, mode)
+        except ValueError as err:
+            raise(CMException(err))
 
 
 class AES_3GPP(object):
@@ -328,6 +403,14 @@ class AES_3GPP(object):
         -> mac [4 bytes]
         
         optional bitlen argument represents the length of data_in in bits
+    
+    EEA2_EIA2(ck [16 bytes], ik [16 bytes], count [uint32], bearer [uint5], dir [0 or 1],
+              data_in [bytes], offset [uint32], mode [0 or 1]) -> data_out [bytes]
+        
+        computes EIA2 with ik and EEA2 with ck over a byte-aligned data_in, 
+        the offset first bytes being not ciphered:
+        mode 0: data_in[:offset] || EEA2(data_in[offset:] || EIA2(data_in))
+        mode 1: EIA2(out) || out, with out = data_in[:offset] || EEA2(data_in[offset:])
     """
     
     def EEA2(self, key, count, bearer, dir, data_in, bitlen=None):
@@ -376,8 +459,32 @@ class AES_3GPP(object):
                 data_in = data_in[:blen]
         #
         M = pack('>II', count, (bearer<<27)+(dir<<26)) + data_in
+        if AES_CMAC is not None and not bitlen % 8 and len(data_in) == bitlen >> 3:
+            return AES_CMAC(key).mac(M)[:4]
         cmac = CMAC(key, AES_ECB, Tlen=32)
         return cmac.cmac(M, 64+bitlen)
+    
+    def EEA2_EIA2(self, ck, ik, count, bearer, dir, data_in, offset=0, mode=0):
+        # avoid uint32 under/overflow
+        if not 0 <= count < MAX_UINT32 or \
+        not 0 <= bearer < 32 or \
+        not 0 <= offset <= len(data_in) or \
+        dir not in (0, 1):
+            raise(CMException('invalid args'))
+        #
+        iv = pack('>II', count, (bearer<<27)+(dir<<26))
+        # the CMAC key is set up once, outside of the MAC function
+        if AES_CMAC is not None:
+            cmac = AES_CMAC(ik).mac
+            mac  = lambda M: cmac(iv + M)[:4]
+        else:
+            cmac = CMAC(ik, AES_ECB, Tlen=32).cmac
+            mac  = lambda M: cmac(iv + M)
+        if mode:
+            out = data_in[:offset] + AES_CTR(ck, iv).encrypt(data_in[offset:])
+            return mac(out) + out
+        else:
+            return data_in[:offset] + AES_CTR(ck, iv).encrypt(data_in[offset:] + mac(data_in))
 
 
 ###################
@@ -404,3 +511,10 @@ EIA3 = _Z.EIA3
 if _with_aes:
     EEA2 = _A.EEA2
     EIA2 = _A.EIA2
+# Fused encryption / integrity protection
+UEA1_UIA1 = _K.F8F9
+UEA2_UIA2 = _S.F8F9
+EEA1_EIA1 = _S.EEA1_EIA1
+EEA3_EIA3 = _Z.EEA3_EIA3
+if _with_aes:
+    EEA2_EIA2 = _A.EEA2_EIA2
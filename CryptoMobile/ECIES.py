@@ -12,16 +12,19 @@
 # *--------------------------------------------------------
 #*/
 
-#__all__ = ['ECIES_UE', 'ECIES_HN']
+#__all__ = ['EphemeralKeyPool', 'ECIES_UE', 'ECIES_HN', 'ECIESKeyRegistry']
 
 
 import hashlib  # for SHA-256
 import hmac     # HMAC–SHA-256
 from struct     import unpack
-from binascii   import hexlify
+from time       import monotonic
+from threading  import local, Lock, Condition, Thread
+from collections import deque, OrderedDict
 
-from .AES import AES_CTR
-from .EC  import *
+from .utils import *
+from .AES   import AES_CTR
+from .EC    import *
 
 
 ########################################################
@@ -39,28 +42,117 @@ from .EC  import *
 #######################################################
 
 
+class EphemeralKeyPool(object):
+    """EphemeralKeyPool pre-generates UE ephemeral keypairs for a given ECIES profile
+    in a background thread, to be consumed by ECIES_UE
+    
+    the thread refills the pool up to high keypairs each time it gets below low 
+    keypairs; when the pool is empty, get() generates a keypair inline and counts it
+    in misses
+    """
+    
+    def __init__(self, profile='A', low=64, high=256, start=True):
+        if profile == 'A':
+            self._EC = X25519
+        elif profile == 'B':
+            self._EC = ECDH_SECP256R1
+        else:
+            raise(CMException('unknown ECIES profile %s' % profile))
+        if not 0 <= low < high:
+            raise(CMException('invalid watermarks %r / %r' % (low, high)))
+        self.profile, self.low, self.high = profile, low, high
+        self.misses = 0
+        # (EC instance, public key) pairs
+        self._keys = deque()
+        self._cond = Condition()
+        self._thread = None
+        if start:
+            self.start()
+    
+    def _generate(self):
+        ec = self._EC()
+        return ec, ec.get_pubkey()
+    
+    def _run(self):
+        keys, cond = self._keys, self._cond
+        while True:
+            with cond:
+                while self._thread is not None and len(keys) >= self.low:
+                    cond.wait()
+                if self._thread is None:
+                    return
+            # keypairs are generated outside of the lock
+            while self._thread is not None and len(keys) < self.high:
+                keys.append(self._generate())
+    
+    def start(self):
+        """starts the background thread filling the pool
+        """
+        with self._cond:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='EphemeralKeyPool')
+                self._thread.daemon = True
+                self._thread.start()
+    
+    def stop(self):
+        """stops the background thread, keypairs already generated being kept
+        """
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def get(self):
+        """returns an (EC instance, public key) pair for a fresh ephemeral keypair
+        """
+        try:
+            key = self._keys.popleft()
+        except IndexError:
+            with self._cond:
+                self.misses += 1
+            key = self._generate()
+        if len(self._keys) < self.low:
+            with self._cond:
+                self._cond.notify()
+        return key
+
+
 class ECIES_UE(object):
     """ECIES_UE handles the ECIES computation required on the UE side to
     protect its fixed identity SUPI into a SUCI
     """
     
-    def __init__(self, profile='A'):
+    def __init__(self, profile='A', keypool=None):
+        """keypool is an optional EphemeralKeyPool of the same profile, from which
+        fresh ephemeral keypairs are taken
+        """
         if profile == 'A':
             self.EC = X25519()
         elif profile == 'B':
             self.EC = ECDH_SECP256R1()
         else:
             raise(CMException('unknown ECIES profile %s' % profile))
+        if keypool is not None and keypool.profile != profile:
+            raise(CMException('invalid keypool profile %s' % keypool.profile))
+        self.keypool = keypool
     
     def generate_sharedkey(self, hn_pub_key, fresh=True):
-        """generates a shared keystream based on a UE ephemeral keypair (regenerated
-        if fresh is True) and the HN public key
-        """
-        if fresh:
-            # regenerate a new UE ephemeral keypair
-            self.EC.generate_keypair()
-        # get the UE ephemeral pubkey
-        self.EK = self.EC.get_pubkey()
+        """generates a shared keystream based on a UE ephemeral keypair (regenerated,
+        or taken from the keypool, if fresh is True) and the HN public key
+        """
+        if fresh and self.keypool is not None:
+            # take a pre-generated UE ephemeral keypair, with its pubkey
+            self.EC, self.EK = self.keypool.get()
+        else:
+            if fresh:
+                # regenerate a new UE ephemeral keypair
+                self.EC.generate_keypair()
+            # get the UE ephemeral pubkey
+            self.EK = self.EC.get_pubkey()
         # generate the shared keystream by mixing the UE ephemeral key with HN pubkey
         self.SK = KDF(self.EK, self.EC.generate_sharedkey(hn_pub_key))
     
@@ -83,6 +175,24 @@ class ECIES_UE(object):
         return self.EK, ciphertext, mac[0:8]
 
 
+# ECIES_HN instance of each worker of an unprotect_batch() / deconceal_suci_batch() pool,
+# set by the pool initializer
+_worker = local()
+
+
+def _worker_init(hn_priv_key, profile, sk_cache_cfg):
+    _worker.hn = ECIES_HN(hn_priv_key, profile)
+    _worker.hn.set_sk_cache(*sk_cache_cfg)
+
+
+def _worker_run(meth, items, *args):
+    # return the results, the failure counters and the SK cache counters of the chunk
+    hn = _worker.hn
+    hn.reset_stats()
+    hn._sk_cache_stats = {'hits': 0, 'misses': 0}
+    return getattr(hn, meth)(items, *args), hn.stats, hn._sk_cache_stats
+
+
 class ECIES_HN(object):
     """ECIES_HN handles the ECIES computation required on the Home Network side
     to unprotect a subscriber's SUCI into a fixed identity SUPI
@@ -95,31 +205,358 @@ class ECIES_HN(object):
             self.EC = ECDH_SECP256R1(loc_privkey=hn_priv_key)
         else:
             raise(CMException('unknown ECIES profile %s' % profile))
+        self.profile = profile
+        self._hn_priv_key = hn_priv_key
+        # UE ephemeral public key length in the SUCI scheme output
+        self._pk_len = 32 if profile == 'A' else 33
+        self.reset_stats()
+        # persistent pool of unprotect_batch(), with its (kind, workers) config
+        self._pool, self._pool_cfg = None, None
+        # optional cache of SK per UE ephemeral public key, disabled by default
+        self._sk_cache, self._sk_cache_cfg = None, (0, 0)
+        self._sk_cache_lock = Lock()
+        self._sk_cache_stats = {'hits': 0, 'misses': 0}
+    
+    def set_sk_cache(self, size=1024, ttl=30.0):
+        """enables (size > 0) or disables (size = 0) the cache of shared keys SK derived
+        in unprotect(), for UE ephemeral public keys of SUCI that were successfully 
+        deconcealed, so that retransmitted SUCI skip the ECDH and KDF; 
+        entries expire after ttl seconds, the least recently used ones being evicted
+        beyond size entries
+        
+        with unprotect_batch() workers, each worker has its own cache, whose hits and
+        misses are accounted in the caller's sk_cache_info()
+        """
+        if size < 0 or (size and ttl <= 0):
+            raise(CMException('invalid SK cache size %r / ttl %r' % (size, ttl)))
+        self._sk_cache = OrderedDict() if size > 0 else None
+        self._sk_cache_cfg = (size, ttl)
+        self._sk_cache_stats = {'hits': 0, 'misses': 0}
+        # workers need to be restarted with the new config
+        self.close()
+    
+    def sk_cache_info(self):
+        """returns a dict with the SK cache hits, misses, number of entries, size and ttl
+        """
+        info = dict(self._sk_cache_stats)
+        info['entries'] = len(self._sk_cache) if self._sk_cache is not None else 0
+        info['size'], info['ttl'] = self._sk_cache_cfg
+        return info
+    
+    def reset_stats(self):
+        """resets the unprotect() counters in stats:
+        ok (decrypted), mac (MAC verification failed), pubkey (invalid UE public key),
+        format (invalid scheme output or MSIN, in deconceal_suci())
+        """
+        self.stats = {'ok': 0, 'mac': 0, 'pubkey': 0, 'format': 0}
     
     def unprotect(self, ue_pubkey, ciphertext, mac):
         """unprotects the given ciphertext using associated MAC and UE ephemeral 
         public key
         
-        returns the decrypted cleartext bytes buffer or None if MAC verification 
-        failed
+        returns the decrypted cleartext bytes buffer or None if the UE public key
+        is invalid or MAC verification failed, the reason being counted in stats
+        
+        the MAC is verified first, only valid ciphertexts being decrypted
         """
-        SK = KDF(ue_pubkey, self.EC.generate_sharedkey(ue_pubkey))
-        aes_key, aes_nonce, aes_cnt, mac_key = (
-            SK[:16],
-            SK[16:24],
-            unpack('>Q', SK[24:32])[0],
-            SK[32:64]
-            )
+        cleartext = self._unprotect(ue_pubkey, ciphertext, mac)
+        if cleartext is not None:
+            self.stats['ok'] += 1
+        return cleartext
+    
+    @staticmethod
+    def _get_sk_ctx(SK):
+        # HMAC keyed with SK, to be copied for each MAC, and AES-CTR key, nonce
+        # and counter, AES-CTR contexts being stateful
+        return hmac.new(SK[32:64], None, hashlib.sha256), \
+               (SK[:16], SK[16:24], unpack('>Q', SK[24:32])[0])
+    
+    def _unprotect(self, ue_pubkey, ciphertext, mac):
+        # unprotect(), without counting successes
+        cache, ctx = self._sk_cache, None
+        if cache is not None:
+            ue_pubkey = bytes(ue_pubkey)
+            # lookups rely on the atomicity of OrderedDict methods, only updates are locked
+            ent = cache.get(ue_pubkey)
+            if ent is not None and ent[0] > monotonic():
+                ctx = ent[1]
+                self._sk_cache_stats['hits'] += 1
+            else:
+                self._sk_cache_stats['misses'] += 1
+        if ctx is None:
+            try:
+                ctx = self._get_sk_ctx(KDF(ue_pubkey, self.EC.generate_sharedkey(ue_pubkey)))
+            except ValueError:
+                self.stats['pubkey'] += 1
+                return None
         #
         # verify MAC
-        mac_hn = hmac.new(mac_key, ciphertext, hashlib.sha256).digest()
-        mac_verif = hmac.compare_digest(mac_hn[0:8], mac)
+        mac_hn = ctx[0].copy()
+        mac_hn.update(ciphertext)
+        if not hmac.compare_digest(mac_hn.digest()[0:8], mac):
+            self.stats['mac'] += 1
+            return None
+        if cache is not None:
+            # only SK contexts of valid SUCI are cached, or refreshed in the LRU order
+            size, ttl = self._sk_cache_cfg
+            with self._sk_cache_lock:
+                if ent is None or ent[1] is not ctx:
+                    cache[ue_pubkey] = (monotonic() + ttl, ctx)
+                else:
+                    try:
+                        cache.move_to_end(ue_pubkey)
+                    except KeyError:
+                        # evicted concurrently
+                        pass
+                while len(cache) > size:
+                    cache.popitem(last=False)
         # decrypt
-        aes = AES_CTR(aes_key, aes_nonce, aes_cnt)
-        cleartext = aes.decrypt(ciphertext)
-        #
-        if mac_verif:
-            return cleartext
-        else:
+        return AES_CTR(*ctx[1]).decrypt(ciphertext)
+    
+    def _unprotect_items(self, items):
+        unprotect = self.unprotect
+        return [unprotect(ue_pubkey, ciphertext, mac) for ue_pubkey, ciphertext, mac in items]
+    
+    def deconceal_suci(self, scheme_output, bcd=True):
+        """deconceals the ECIES scheme output of a SUCI, i.e. 
+        UE ephemeral public key || ciphertext || MAC [bytes buffer or memoryview]
+        
+        returns the MSIN digit-string of an IMSI-based SUPI when bcd is True, or the
+        decrypted cleartext bytes buffer otherwise, or None on failure (counted in stats)
+        
+        the scheme output is split with memoryview slices, without copying the
+        ciphertext and MAC
+        """
+        buf, pk_len = memoryview(scheme_output), self._pk_len
+        if len(buf) <= pk_len + 8:
+            self.stats['format'] += 1
+            return None
+        cleartext = self._unprotect(bytes(buf[:pk_len]), buf[pk_len:-8], buf[-8:])
+        if cleartext is None:
             return None
+        if bcd:
+            cleartext = decode_bcd(cleartext)
+            if cleartext is None:
+                # deconcealed, but not a BCD-encoded MSIN
+                self.stats['format'] += 1
+                return None
+        self.stats['ok'] += 1
+        return cleartext
+    
+    def _deconceal_items(self, scheme_outputs, bcd=True):
+        deconceal_suci = self.deconceal_suci
+        return [deconceal_suci(scheme_output, bcd) for scheme_output in scheme_outputs]
+    
+    def _run_batch(self, meth, items, args, workers, pool, chunk):
+        # run the given items method over the batch, by chunks in a pool of workers
+        if not workers or workers < 2 or len(items) <= chunk:
+            return getattr(self, meth)(items, *args)
+        chunks = [items[i:i+chunk] for i in range(0, len(items), chunk)]
+        ret, stats, cache_stats, num = [], self.stats, self._sk_cache_stats, len(chunks)
+        for res, res_stats, res_cache_stats in self._get_pool(pool, workers).map(
+                _worker_run, [meth] * num, chunks, *[[arg] * num for arg in args]):
+            ret.extend(res)
+            for reason, cnt in res_stats.items():
+                stats[reason] += cnt
+            for reason, cnt in res_cache_stats.items():
+                cache_stats[reason] += cnt
+        return ret
+    
+    def _get_pool(self, kind, workers):
+        if self._pool_cfg != (kind, workers):
+            self.close()
+            from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+            if kind == 'process':
+                Executor = ProcessPoolExecutor
+            elif kind == 'thread':
+                Executor = ThreadPoolExecutor
+            else:
+                raise(CMException('unknown pool kind %s' % kind))
+            # each worker parses the HN private key once, when started
+            self._pool = Executor(workers, initializer=_worker_init,
+                                  initargs=(self._hn_priv_key, self.profile, self._sk_cache_cfg))
+            self._pool_cfg = (kind, workers)
+        return self._pool
+    
+    def unprotect_batch(self, items, workers=None, pool='process', chunk=64):
+        """unprotects a list of (UE ephemeral public key, ciphertext, MAC) 3-tuples
+        
+        returns the list of decrypted cleartext bytes buffers, in order, with None 
+        for each MAC verification failure or invalid UE ephemeral public key;
+        the workers counters are added to stats
+        
+        with workers > 1, the list is processed by chunks of chunk items in a pool of
+        workers processes (or threads, if pool is 'thread'), each holding its own HN
+        private key; the pool is kept for subsequent batches, until close() is called
+        """
+        return self._run_batch('_unprotect_items', list(items), (), workers, pool, chunk)
+    
+    def deconceal_suci_batch(self, scheme_outputs, bcd=True, workers=None, pool='process',
+                             chunk=64):
+        """deconceals a list of SUCI ECIES scheme outputs [bytes buffers]
+        
+        returns the list of MSIN digit-strings (or decrypted cleartexts if bcd is False),
+        in order, with None for each failure; workers, pool and chunk are handled as
+        for unprotect_batch()
+        """
+        scheme_outputs = list(scheme_outputs)
+        if workers and workers > 1 and pool == 'process':
+            # memoryviews cannot be sent to worker processes
+            scheme_outputs = [bytes(scheme_output) for scheme_output in scheme_outputs]
+        return self._run_batch('_deconceal_items', scheme_outputs, (bcd, ), workers, pool, chunk)
+    
+    def close(self):
+        """shuts down the pool of workers of unprotect_batch(), if any
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool, self._pool_cfg = None, None
 
+
+class ECIESKeyRegistry(object):
+    """ECIESKeyRegistry holds the Home Network private keys of a SIDF, each one 
+    being identified by its ECIES profile ('A' or 'B') and HN public key identifier
+    [uint8], and routes each SUCI to its preloaded ECIES_HN instance
+    
+    keys are added, removed or rotated by replacing the whole mapping (copy-on-write),
+    so that unprotecting never waits for an update;
+    usage counters are kept per key in the stats of each ECIES_HN instance
+    """
+    
+    def __init__(self, keys=()):
+        """keys is an iterable of (profile, key_id, hn_priv_key) 3-tuples
+        """
+        self._keys = {}
+        # serializes updates only, readers just take the current mapping
+        self._lock = Lock()
+        self.unknown = 0
+        # SK cache config applied to each key, see set_sk_cache()
+        self._sk_cache_cfg = (0, 0)
+        for profile, key_id, hn_priv_key in keys:
+            self.add(profile, key_id, hn_priv_key)
+    
+    def _update(self, add=(), remove=(), replace=True):
+        # private keys are parsed before taking the lock
+        new = [((profile, key_id), ECIES_HN(hn_priv_key, profile)) \
+               for profile, key_id, hn_priv_key in add]
+        with self._lock:
+            keys, removed = dict(self._keys), []
+            for k in remove:
+                if k in keys:
+                    removed.append(keys.pop(k))
+            # instances replaced by the new ones are returned as removed ones too
+            for k, _ in new:
+                if k in keys:
+                    if not replace:
+                        raise(CMException('HN key %s / %r already registered' % k))
+                    removed.append(keys.pop(k))
+            if self._sk_cache_cfg[0]:
+                for _, hn in new:
+                    hn.set_sk_cache(*self._sk_cache_cfg)
+            keys.update(new)
+            self._keys = keys
+        return removed
+    
+    def add(self, profile, key_id, hn_priv_key):
+        """adds (or replaces) the private key of the given profile and key id, and
+        returns the replaced ECIES_HN instance (or None), e.g. to close() it once
+        not in use anymore
+        """
+        if not 0 <= key_id <= 255:
+            raise(CMException('invalid HN public key identifier %r' % key_id))
+        removed = self._update(add=[(profile, key_id, hn_priv_key)])
+        return removed[0] if removed else None
+    
+    def remove(self, profile, key_id):
+        """removes the private key of the given profile and key id, and returns
+        its ECIES_HN instance (or None), e.g. to close() it once not in use anymore
+        """
+        removed = self._update(remove=[(profile, key_id)])
+        return removed[0] if removed else None
+    
+    def rotate(self, profile, key_id, hn_priv_key, old_key_id):
+        """adds the private key of the given profile and key id, and removes the one
+        with old_key_id, in a single update; returns the removed ECIES_HN instance
+        (or None)
+        
+        key_id can be old_key_id, otherwise it must not be already registered
+        """
+        if not 0 <= key_id <= 255:
+            raise(CMException('invalid HN public key identifier %r' % key_id))
+        if old_key_id == key_id:
+            removed = self._update(add=[(profile, key_id, hn_priv_key)])
+        else:
+            removed = self._update(add=[(profile, key_id, hn_priv_key)],
+                                   remove=[(profile, old_key_id)], replace=False)
+        return removed[0] if removed else None
+    
+    def set_sk_cache(self, size=1024, ttl=30.0):
+        """enables (size > 0) or disables (size = 0) the SK cache of all keys, 
+        registered and to be added, see ECIES_HN.set_sk_cache();
+        cached SK are hence keyed by key id and UE ephemeral public key
+        """
+        with self._lock:
+            self._sk_cache_cfg = (size, ttl)
+            for hn in self._keys.values():
+                hn.set_sk_cache(size, ttl)
+    
+    def get(self, profile, key_id):
+        """returns the ECIES_HN instance of the given profile and key id
+        or raises CMException
+        """
+        try:
+            return self._keys[(profile, key_id)]
+        except KeyError:
+            raise(CMException('unknown HN key %s / %r' % (profile, key_id)))
+    
+    def keys(self):
+        """returns the list of (profile, key_id) registered
+        """
+        return list(self._keys)
+    
+    def unprotect(self, profile, key_id, ue_pubkey, ciphertext, mac):
+        """unprotects the given ciphertext with the private key of the given profile
+        and key id
+        
+        returns the decrypted cleartext bytes buffer or None on failure, failures
+        being counted in the stats of the key, or in unknown for unregistered keys
+        """
+        hn = self._keys.get((profile, key_id))
+        if hn is None:
+            self.unknown += 1
+            return None
+        return hn.unprotect(ue_pubkey, ciphertext, mac)
+    
+    def unprotect_batch(self, items, workers=None, pool='process', chunk=64):
+        """unprotects a list of (profile, key_id, UE ephemeral public key, ciphertext, MAC)
+        5-tuples
+        
+        returns the list of decrypted cleartext bytes buffers, in order, with None 
+        for each failure; items are grouped per key and processed with the
+        unprotect_batch() method of each ECIES_HN instance
+        """
+        keys, groups = self._keys, {}
+        ret = [None] * len(items)
+        for i, (profile, key_id, ue_pubkey, ciphertext, mac) in enumerate(items):
+            if (profile, key_id) in keys:
+                inds, group = groups.setdefault((profile, key_id), ([], []))
+                inds.append(i)
+                group.append((ue_pubkey, ciphertext, mac))
+            else:
+                self.unknown += 1
+        for k, (inds, group) in groups.items():
+            for i, res in zip(inds, keys[k].unprotect_batch(group, workers, pool, chunk)):
+                ret[i] = res
+        return ret
+    
+    def get_stats(self):
+        """returns a dict of usage counters (ok, mac and pubkey failures) per
+        (profile, key_id)
+        """
+        return dict([(k, dict(hn.stats)) for k, hn in self._keys.items()])
+    
+    def close(self):
+        """shuts down the pools of workers of all registered keys
+        """
+        for hn in self._keys.values():
+            hn.close()
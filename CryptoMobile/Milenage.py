@@ -247,3 +247,80 @@ class Milenage:
         #
         return out5[:6]
 
+    
+    #####################
+    # RESYNCHRONISATION #
+    #####################
+    
+    def _process_auts(self, cipher, OPc, RAND, AUTS, AMF):
+        # shared core of process_auts() and process_auts_batch():
+        # E_K(RAND ^ OPc) is computed once and used by both f5* and f1*
+        K_OPc_RAND = cipher.encrypt(xor_buf(RAND, OPc))
+        #
+        # f5*: AK* to unmask SQN_MS
+        out5 = xor_buf(OPc,
+                       cipher.encrypt(
+                       xor_buf(rot_buf16(xor_buf(K_OPc_RAND, OPc),
+                                         self.r5),
+                               self.c5)))
+        SQN_MS = xor_buf(AUTS[:6], out5[:6])
+        #
+        # f1*: MAC-S verification
+        inp  = SQN_MS + AMF + SQN_MS + AMF
+        out1 = xor_buf(cipher.encrypt(
+                       xor_buf(xor_buf(rot_buf16(xor_buf(inp, OPc),
+                                                 self.r1),
+                                       self.c1),
+                               K_OPc_RAND)),
+                       OPc)
+        return SQN_MS, hmac.compare_digest(out1[8:16], AUTS[6:14])
+    
+    def process_auts(self, K, RAND, AUTS, OP=None, AMF=b'\0\0'):
+        """return SQN_MS [6 bytes buffer] and the MAC-S verification result [bool]
+        from the resynchronisation token AUTS [14 bytes buffer], or None on error
+        
+        AUTS = SQN_MS ^ AK* || MAC-S, with AK* = f5*(K, RAND)
+        and MAC-S = f1*(K, RAND, SQN_MS, AMF), AMF being the dummy all-zero value
+        (see 3GPP TS 33.102, section 6.3.3)
+        """
+        if len(K) != 16 or len(RAND) != 16 or len(AUTS) != 14 or len(AMF) != 2:
+            log('ERR', 'Milenage.process_auts: invalid args')
+            return None
+        #
+        if self.OPc is not None:
+            OPc = self.OPc
+        elif OP is not None:
+            OPc = make_OPc(K, OP)
+        else:
+            OPc = make_OPc(K, self.OP)
+        #
+        return self._process_auts(AES_ECB(K), OPc, RAND, AUTS, AMF)
+    
+    def process_auts_batch(self, vectors, AMF=b'\0\0'):
+        """return a list of (SQN_MS, MAC-S verification result) 2-tuples, or None
+        for each invalid vector, from an iterable of (K, OPc, RAND, AUTS) 4-tuples
+        
+        when OPc is None, it is taken from self.OPc if set or derived from self.OP;
+        the AES key schedule and OPc are computed only once per distinct K in the 
+        batch
+        """
+        ret, ciphers, opcs = [], {}, {}
+        for K, OPc, RAND, AUTS in vectors:
+            if len(K) != 16 or len(RAND) != 16 or len(AUTS) != 14:
+                log('ERR', 'Milenage.process_auts_batch: invalid args')
+                ret.append(None)
+                continue
+            K = bytes(K)
+            if K in ciphers:
+                cipher = ciphers[K]
+            else:
+                cipher = ciphers[K] = AES_ECB(K)
+            if OPc is None:
+                if self.OPc is not None:
+                    OPc = self.OPc
+                elif K in opcs:
+                    OPc = opcs[K]
+                else:
+                    OPc = opcs[K] = xor_buf(cipher.encrypt(self.OP), self.OP)
+            ret.append(self._process_auts(cipher, OPc, RAND, AUTS, AMF))
+        return ret
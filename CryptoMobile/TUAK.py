@@ -21,15 +21,33 @@
 # see 3GPP TS 35.231, 232 and 233
 #######################################################
 
+import hmac
 from binascii import *
 
 import sys
 python_version = sys.version_info[0]
+from collections import OrderedDict
 
 import pykeccakp1600 as kec
 keccakp1600 = kec.pykeccakp1600
+# permutation of N states together, interleaved over SIMD lanes
+keccakp1600_batch = kec.keccakp1600_batch
+# widest number of SIMD lanes available to keccakp1600_batch (larger requests are clamped)
+keccakp1600_lanes = kec.keccakp1600_lanes
+# in place permutation of a writable buffer, for a given number of iterations
+keccakp1600_inplace = kec.keccakp1600_inplace
+# selection of the single state permutation: optimized (default) or 3GPP reference ones
+keccakp1600_impls    = kec.keccakp1600_impls
+keccakp1600_set_impl = kec.keccakp1600_set_impl
+keccakp1600_get_impl = kec.keccakp1600_get_impl
+# TUAK functions building the Keccak state and running all the iterations in C
+tuak_topc   = kec.tuak_topc
+tuak_f1     = kec.tuak_f1
+tuak_f2345  = kec.tuak_f2345
+tuak_f5star = kec.tuak_f5star
 
 from .utils        import *
+from .conv         import conv_102_C23_vectors
 
 
 __all__ = ['TUAK', 'make_TOPc']
@@ -39,28 +57,55 @@ def make_TOPc( K, TOP, ALGONAME, KeccakIterations ):
     """derives TOP with K to produce TOPc
     requires the TUAK global parameters ALGONAME and KeccakIterations"""
     if len(K) == 16:
-        INSTANCE = b'\x00'
+        INSTANCE = 0x00
     else:
         #len(K) == 32
-        INSTANCE = b'\x01'
-    
-    INOUT = []
-    INOUT.append( TOP[::-1] )
-    INOUT.append( INSTANCE[::-1] )
-    INOUT.append( ALGONAME[::-1] )
-    INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-    INOUT.append( K[::-1] )
-    if len(K) == 16:
-        INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-    # add padding
-    INOUT.append( b'\x1f\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\x80' )
-    INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0'\
-                  b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-    INOUT = b''.join(INOUT)
-    
-    for i in range(KeccakIterations):
-        INOUT = keccakp1600(INOUT)
-    return INOUT[:32][::-1]
+        INSTANCE = 0x01
+    return tuak_topc(TOP, INSTANCE, ALGONAME, K, KeccakIterations)
+
+
+# INSTANCE values of f1, f1*, f2345 and f5* for a 128 bit K (add 1 for a 256 bit K),
+# for each (LEN_MAC, LEN_RES, LEN_CK, LEN_IK) operator setting
+_INSTANCES = {}
+
+def _make_instances( LEN_MAC, LEN_RES, LEN_CK, LEN_IK ):
+    """return the INSTANCE values of f1, f1*, f2345 and f5* for a 128 bit K and
+    the given lengths of outputs, see 3GPP TS 35.231, section 6
+    """
+    cfg = (LEN_MAC, LEN_RES, LEN_CK, LEN_IK)
+    try:
+        return _INSTANCES[cfg]
+    except KeyError:
+        pass
+    #
+    if LEN_MAC == 64:
+        inst_mac = 0x08
+    elif LEN_MAC == 128:
+        inst_mac = 0x10
+    else:
+        #LEN_MAC == 256
+        inst_mac = 0x20
+    #
+    if LEN_RES == 32:
+        inst_res = 0x40
+    elif LEN_RES == 64:
+        inst_res = 0x48
+    elif LEN_RES == 128:
+        inst_res = 0x50
+    else:
+        #LEN_RES == 256
+        inst_res = 0x60
+    if LEN_CK == 256:
+        inst_res += 4
+    if LEN_IK == 256:
+        inst_res += 2
+    #
+    _INSTANCES[cfg] = (inst_mac, 0x80 + inst_mac, inst_res, 0xc0)
+    return _INSTANCES[cfg]
+
+
+# Keccak state padding, from location 96 to 199
+_STATE_PAD = b'\x1f' + 38*b'\0' + b'\x80' + 64*b'\0'
 
 
 ###
@@ -73,7 +118,7 @@ class TUAK:
     see 3GPP TS 35.231
     """
     
-    ALGONAME = b'TUAK1.0'
+    ALGONAME = b'TUAK1.0' # 7 bytes
     
     KeccakIterations = 1
     
@@ -88,10 +133,14 @@ class TUAK:
     # input length for K: 128 or 256 bit
     # input length for TOP: 256 bit
     
+    # max number of TOPc values kept by generate_vector(), 0 to disable caching
+    TOPC_CACHE_SIZE = 1024
+    
     
     def __init__(self, TOP):
         self.TOP  = TOP
         self.TOPc = None
+        self._topc_cache = OrderedDict()
     
     def make_topc(self, K, TOP=None):
         """return the TOPc value derived from K, TOP and the TUAK configuration
@@ -111,6 +160,40 @@ class TUAK:
     def unset_opc(self):
         self.TOPc = None
     
+    def _get_topc(self, K, TOP=None):
+        if self.TOPc is not None:
+            return self.TOPc
+        else:
+            return self.make_topc(K, TOP)
+    
+    def _get_topc_cached(self, K, TOP=None):
+        if self.TOPc is not None:
+            return self.TOPc
+        if TOP is None:
+            TOP = self.TOP
+        K, TOP = bytes(K), bytes(TOP)
+        key = (K, TOP, self.ALGONAME, self.KeccakIterations)
+        cache = self._topc_cache
+        try:
+            TOPc = cache[key]
+        except KeyError:
+            TOPc = make_TOPc(K, TOP, self.ALGONAME, self.KeccakIterations)
+            if self.TOPC_CACHE_SIZE > 0:
+                cache[key] = TOPc
+                while len(cache) > self.TOPC_CACHE_SIZE:
+                    cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return TOPc
+    
+    def clear_topc_cache(self):
+        """empty the TOPc cache used by generate_vector()
+        """
+        self._topc_cache.clear()
+    
+    def _instances(self):
+        return _make_instances(self.LEN_MAC, self.LEN_RES, self.LEN_CK, self.LEN_IK)
+    
     ##################
     # TUAK FUNCTIONS #
     ##################
@@ -121,48 +204,11 @@ class TUAK:
         if len(K) not in (16, 32) or len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
             log('ERR', 'TUAK.f1: invalid args')
             return None
-        
-        if self.LEN_MAC == 64:
-            INSTANCE = 0x08
-            off = 8
-        elif self.LEN_MAC == 128:
-            INSTANCE = 0x10
-            off = 16
-        else:
-            #self.LEN_MAC == 256
-            INSTANCE = 0x20
-            off = 32
-        if len(K) == 32:
-            INSTANCE += 1
-        if python_version > 2:
-            INSTANCE = bytes([INSTANCE])
-        else:
-            INSTANCE = chr(INSTANCE)
-        
-        if self.TOPc is not None:
-            TOPc = self.TOPc
-        else:
-            TOPc = self.make_topc(K, TOP)
-        
-        INOUT = []
-        INOUT.append( TOPc[::-1] )
-        INOUT.append( INSTANCE[::-1] )
-        INOUT.append( self.ALGONAME[::-1] )
-        INOUT.append( RAND[::-1] )
-        INOUT.append( AMF[::-1] )
-        INOUT.append( SQN[::-1] )
-        INOUT.append( K[::-1] )
-        if len(K) == 16:
-            INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        # add padding
-        INOUT.append( b'\x1f\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\x80' )
-        INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0'\
-                      b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        INOUT = b''.join(INOUT)
-        
-        for i in range(self.KeccakIterations):
-            INOUT = keccakp1600(INOUT)
-        return INOUT[:off][::-1]
+        return self._f1(K, RAND, SQN, AMF, self._get_topc(K, TOP))
+    
+    def _f1(self, K, RAND, SQN, AMF, TOPc):
+        return tuak_f1(TOPc, self._instances()[0] + (len(K)>>5), self.ALGONAME,
+                       RAND, AMF, SQN, K, self.KeccakIterations, self.LEN_MAC>>3)
     
     def f1star(self, K, RAND, SQN, AMF, TOP=None):
         """return MAC_S [8, 16 or 32 bytes buffer] or None on error
@@ -170,48 +216,11 @@ class TUAK:
         if len(K) not in (16, 32) or len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
             log('ERR', 'TUAK.f1star: invalid args')
             return None
-        
-        if self.LEN_MAC == 64:
-            INSTANCE = 0x88
-            off = 8
-        elif self.LEN_MAC == 128:
-            INSTANCE = 0x90
-            off = 16
-        else:
-            #self.LEN_MAC == 256
-            INSTANCE = 0xa0
-            off = 32
-        if len(K) == 32:
-            INSTANCE += 1
-        if python_version > 2:
-            INSTANCE = bytes([INSTANCE])
-        else:
-            INSTANCE = chr(INSTANCE)
-        
-        if self.TOPc is not None:
-            TOPc = self.TOPc
-        else:
-            TOPc = self.make_topc(K, TOP)
-        
-        INOUT = []
-        INOUT.append( TOPc[::-1] )
-        INOUT.append( INSTANCE[::-1] )
-        INOUT.append( self.ALGONAME[::-1] )
-        INOUT.append( RAND[::-1] )
-        INOUT.append( AMF[::-1] )
-        INOUT.append( SQN[::-1] )
-        INOUT.append( K[::-1] )
-        if len(K) == 16:
-            INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        # add padding
-        INOUT.append( b'\x1f\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\x80' )
-        INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0'\
-                      b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        INOUT = b''.join(INOUT)
-        
-        for i in range(self.KeccakIterations):
-            INOUT = keccakp1600(INOUT)
-        return INOUT[:off][::-1]
+        return self._f1star(K, RAND, SQN, AMF, self._get_topc(K, TOP))
+    
+    def _f1star(self, K, RAND, SQN, AMF, TOPc):
+        return tuak_f1(TOPc, self._instances()[1] + (len(K)>>5), self.ALGONAME,
+                       RAND, AMF, SQN, K, self.KeccakIterations, self.LEN_MAC>>3)
     
     def f2345(self, K, RAND, TOP=None):
         """return RES [4, 8, 16 or 32], CK [16 or 32], IK [16 or 32] and AK [6] bytes buffers or None on error
@@ -219,61 +228,12 @@ class TUAK:
         if len(K) not in (16, 32) or len(RAND) != 16:
             log('ERR', 'TUAK.f234: invalid args')
             return None
-        
-        if self.LEN_RES == 32:
-            INSTANCE = 0x40
-            offres = 4
-        elif self.LEN_RES == 64:
-            INSTANCE = 0x48
-            offres = 8
-        elif self.LEN_RES == 128:
-            INSTANCE = 0x50
-            offres = 16
-        else:
-            #self.LEN_RES == 256
-            INSTANCE = 0x60
-            offres = 32
-        if self.LEN_CK == 256:
-            INSTANCE += 4
-            offck = 32
-        else:
-            offck = 16
-        if self.LEN_IK == 256:
-            INSTANCE += 2
-            offik = 32
-        else:
-            offik = 16
-        if len(K) == 32:
-            INSTANCE += 1
-        
-        if python_version > 2:
-            INSTANCE = bytes([INSTANCE])
-        else:
-            INSTANCE = chr(INSTANCE)
-        
-        if self.TOPc is not None:
-            TOPc = self.TOPc
-        else:
-            TOPc = self.make_topc(K, TOP)
-        
-        INOUT = []
-        INOUT.append( TOPc[::-1] )
-        INOUT.append( INSTANCE[::-1] )
-        INOUT.append( self.ALGONAME[::-1] )
-        INOUT.append( RAND[::-1] )
-        INOUT.append( b'\0\0\0\0\0\0\0\0' )
-        INOUT.append( K[::-1] )
-        if len(K) == 16:
-            INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        # add padding
-        INOUT.append( b'\x1f\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\x80' )
-        INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0'\
-                      b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        INOUT = b''.join(INOUT)
-        
-        for i in range(self.KeccakIterations):
-            INOUT = keccakp1600(INOUT)
-        return INOUT[:offres][::-1], INOUT[32:32+offck][::-1], INOUT[64:64+offik][::-1], INOUT[96:102][::-1]
+        return self._f2345(K, RAND, self._get_topc(K, TOP))
+    
+    def _f2345(self, K, RAND, TOPc):
+        return tuak_f2345(TOPc, self._instances()[2] + (len(K)>>5), self.ALGONAME,
+                          RAND, K, self.KeccakIterations,
+                          self.LEN_RES>>3, self.LEN_CK>>3, self.LEN_IK>>3)
     
     def f5star(self, K, RAND, TOP=None):
         """return AK [6 bytes buffer] or None on error
@@ -281,37 +241,131 @@ class TUAK:
         if len(K) not in (16, 32) or len(RAND) != 16:
             log('ERR', 'TUAK.f5star: invalid args')
             return None
+        return self._f5star(K, RAND, self._get_topc(K, TOP))
+    
+    def _f5star(self, K, RAND, TOPc):
+        return tuak_f5star(TOPc, self._instances()[3] + (len(K)>>5), self.ALGONAME,
+                           RAND, K, self.KeccakIterations)
+    
+    def generate_vector(self, K, RAND, SQN, AMF, TOP=None):
+        """return MAC_A [8, 16 or 32], RES [4, 8, 16 or 32], CK [16 or 32], IK [16 or 32]
+        and AK [6] bytes buffers or None on error
+        
+        TOPc is derived once for both f1 and f2345, and kept in a per-K LRU cache
+        of TOPC_CACHE_SIZE entries when not set with set_topc()
+        """
+        if len(K) not in (16, 32) or len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
+            log('ERR', 'TUAK.generate_vector: invalid args')
+            return None
+        TOPc = self._get_topc_cached(K, TOP)
+        inst_mac, _, inst_res, _ = self._instances()
+        kinc, ALGONAME, KeccakIterations = len(K)>>5, self.ALGONAME, self.KeccakIterations
+        return (tuak_f1(TOPc, inst_mac + kinc, ALGONAME, RAND, AMF, SQN, K,
+                        KeccakIterations, self.LEN_MAC>>3), ) + \
+               tuak_f2345(TOPc, inst_res + kinc, ALGONAME, RAND, K, KeccakIterations,
+                          self.LEN_RES>>3, self.LEN_CK>>3, self.LEN_IK>>3)
+    
+    def generate_vectors(self, vectors):
+        """return a list of (MAC_A, RES, CK, IK, AK) 5-tuples, or None for each
+        invalid vector, from an iterable of (K, RAND, SQN, AMF) 4-tuples
         
-        INSTANCE = 0xc0
-        if len(K) == 32:
-            INSTANCE += 1
+        the f1 and f2345 Keccak states of all vectors are permuted together
+        in a single buffer with keccakp1600_inplace(), TOPc being taken as in generate_vector()
         
-        if python_version > 2:
-            INSTANCE = bytes([INSTANCE])
-        else:
-            INSTANCE = chr(INSTANCE)
+        raises CMException if ALGONAME is not 7 bytes long
+        """
+        if len(self.ALGONAME) != 7:
+            raise(CMException('TUAK.generate_vectors: invalid ALGONAME length'))
+        inst_mac, _, inst_res, _ = self._instances()
+        ALGONAME = self.ALGONAME[::-1]
+        maclen, reslen = self.LEN_MAC>>3, self.LEN_RES>>3
+        cklen, iklen = 32 + (self.LEN_CK>>3), 64 + (self.LEN_IK>>3)
+        states, valid = [], []
+        for K, RAND, SQN, AMF in vectors:
+            if len(K) not in (16, 32) or len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
+                log('ERR', 'TUAK.generate_vectors: invalid args')
+                valid.append(False)
+                continue
+            valid.append(True)
+            # all fields are pushed byte-reversed into the state
+            TOPc, kinc = self._get_topc_cached(K)[::-1], len(K)>>5
+            RAND, K = RAND[::-1], K[::-1] + (32-len(K))*b'\0' + _STATE_PAD
+            states.extend((TOPc, bytes((inst_mac + kinc, )), ALGONAME, RAND, AMF[::-1],
+                           SQN[::-1], K,
+                           TOPc, bytes((inst_res + kinc, )), ALGONAME, RAND, 8*b'\0',
+                           K))
+        out = bytearray().join(states)
+        if out:
+            keccakp1600_inplace(out, self.KeccakIterations)
+        ret, off = [], 0
+        for v in valid:
+            if not v:
+                ret.append(None)
+                continue
+            s1, s2 = out[off:off+200], out[off+200:off+400]
+            ret.append((s1[:maclen][::-1], s2[:reslen][::-1], s2[32:cklen][::-1],
+                        s2[64:iklen][::-1], s2[96:102][::-1]))
+            off += 400
+        return ret
+    
+    def generate_triplets(self, vectors):
+        """return a list of GSM (RAND, SRES, Kc) triplets, or None for each invalid
+        vector, from an iterable of (K, RAND, SQN, AMF) 4-tuples
         
-        if self.TOPc is not None:
-            TOPc = self.TOPc
-        else:
-            TOPc = self.make_topc(K, TOP)
+        quintets are produced with generate_vectors() and converted all together with
+        the C2 and C3 batch conversion functions, which requires LEN_RES, LEN_CK and LEN_IK
+        to be at most 128 bits
+        """
+        vectors = list(vectors)
+        return [None if trip is None else (vec[1], ) + trip for vec, trip in \
+                zip(vectors, conv_102_C23_vectors(self.generate_vectors(vectors)))]
+    
+    #####################
+    # RESYNCHRONISATION #
+    #####################
+    
+    def _process_auts(self, K, RAND, AUTS, AMF, TOPc):
+        # AK* to unmask SQN_MS, then MAC-S verification, with a single TOPc
+        SQN_MS = xor_buf(AUTS[:6], self._f5star(K, RAND, TOPc))
+        MAC_S  = self._f1star(K, RAND, SQN_MS, AMF, TOPc)
+        return SQN_MS, hmac.compare_digest(MAC_S, AUTS[6:])
+    
+    def process_auts(self, K, RAND, AUTS, TOP=None, AMF=b'\0\0'):
+        """return SQN_MS [6 bytes buffer] and the MAC-S verification result [bool]
+        from the resynchronisation token AUTS [6 + LEN_MAC/8 bytes buffer], 
+        or None on error
         
-        INOUT = []
-        INOUT.append( TOPc[::-1] )
-        INOUT.append( INSTANCE[::-1] )
-        INOUT.append( self.ALGONAME[::-1] )
-        INOUT.append( RAND[::-1] )
-        INOUT.append( b'\0\0\0\0\0\0\0\0' )
-        INOUT.append( K[::-1] )
-        if len(K) == 16:
-            INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        # add padding
-        INOUT.append( b'\x1f\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\x80' )
-        INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0'\
-                      b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        INOUT = b''.join(INOUT)
+        AUTS = SQN_MS ^ AK* || MAC-S, with AK* = f5*(K, RAND)
+        and MAC-S = f1*(K, RAND, SQN_MS, AMF), AMF being the dummy all-zero value
+        (see 3GPP TS 33.102, section 6.3.3)
+        """
+        if len(K) not in (16, 32) or len(RAND) != 16 or len(AMF) != 2 \
+        or len(AUTS) != 6 + (self.LEN_MAC>>3):
+            log('ERR', 'TUAK.process_auts: invalid args')
+            return None
+        return self._process_auts(K, RAND, AUTS, AMF, self._get_topc(K, TOP))
+    
+    def process_auts_batch(self, vectors, AMF=b'\0\0'):
+        """return a list of (SQN_MS, MAC-S verification result) 2-tuples, or None
+        for each invalid vector, from an iterable of (K, TOPc, RAND, AUTS) 4-tuples
         
-        for i in range(self.KeccakIterations):
-            INOUT = keccakp1600(INOUT)
-        return INOUT[96:102][::-1]
-
+        when TOPc is None, it is taken from self.TOPc if set or derived from self.TOP,
+        only once per distinct K in the batch
+        """
+        ret, topcs, len_auts = [], {}, 6 + (self.LEN_MAC>>3)
+        for K, TOPc, RAND, AUTS in vectors:
+            if len(K) not in (16, 32) or len(RAND) != 16 or len(AUTS) != len_auts:
+                log('ERR', 'TUAK.process_auts_batch: invalid args')
+                ret.append(None)
+                continue
+            if TOPc is None:
+                if self.TOPc is not None:
+                    TOPc = self.TOPc
+                else:
+                    K = bytes(K)
+                    if K in topcs:
+                        TOPc = topcs[K]
+                    else:
+                        TOPc = topcs[K] = self.make_topc(K)
+            ret.append(self._process_auts(K, RAND, AUTS, AMF, TOPc))
+        return ret
@@ -1,2 +1,3 @@
-__all__ = ['utils', 'AES', 'CMAC', 'CM', 'Milenage', 'TUAK', 'EC', 'ECIES', 'conv']
+__all__ = ['utils', 'AES', 'CMAC', 'CM', 'Milenage', 'TUAK', 'EC', 'ECIES', 'conv', 'keyset',
+           'sidf_server', 'suci_load', 'context']
 __version__ = '0.4'
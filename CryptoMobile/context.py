@@ -0,0 +1,404 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.4
+# *
+# * Copyright 2020. Benoit Michau. P1Sec.
+# *
+# *--------------------------------------------------------
+# * File Name : CryptoMobile/context.py
+# * Created : 2026-10-19
+# * Authors : Benoit Michau
+# *--------------------------------------------------------
+#*/
+
+import hmac
+from struct  import pack
+#
+from pysnow  import snow_f8, snow_f9, snow_protect
+from pyzuc   import zuc_eea3, zuc_eia3, zuc_protect
+from .utils  import *
+from .CMAC   import CMAC
+
+try:
+    from .AES import AES_CTR, AES_ECB, AES_CMAC
+    _with_aes = True
+except ImportError:
+    _with_aes = False
+
+
+__all__ = [
+    'PDCPSecurityContext',
+    'NASSecurityContext',
+    ]
+
+
+#------------------------------------------------------------------------------#
+# CryptoMobile python toolkit
+# security contexts, binding the LTE / 5G algorithms to their keys and parameters
+#------------------------------------------------------------------------------#
+# Algorithm identifiers are the ones of EEA / NEA and EIA / NIA:
+# 0: null, 1: SNOW 3G, 2: AES, 3: ZUC
+
+def _get_key(key):
+    # 128 bit algorithms use the 16 least significant bytes of 32 bytes 5G keys
+    if len(key) == 32:
+        return key[16:]
+    elif len(key) == 16:
+        return key
+    else:
+        raise(CMException('invalid key length %i' % len(key)))
+
+
+def _bind_enc(alg, key, bearer, dir):
+    # return the (count, data_in) -> data_out function of the ciphering algorithm,
+    # or None for the null algorithm
+    if alg == 0:
+        return None
+    key = _get_key(key)
+    if alg == 1:
+        return lambda count, data_in: snow_f8(key, count, bearer, dir, data_in, 8*len(data_in))
+    elif alg == 2:
+        if not _with_aes:
+            raise(CMException('EEA2 / NEA2 not available'))
+        # the AES key is bound once, only the CTR IV is set per PDU
+        ctr, iv_low = AES_CTR.bind(key), (bearer<<27) + (dir<<26)
+        return lambda count, data_in: ctr(pack('>II', count, iv_low), data_in)
+    elif alg == 3:
+        return lambda count, data_in: zuc_eea3(key, count, bearer, dir, 8*len(data_in), data_in)
+    else:
+        raise(CMException('invalid ciphering algorithm %r' % alg))
+
+
+def _bind_int(alg, key, bearer, dir):
+    # return the (count, data_in) -> MAC [4 bytes] function of the integrity
+    # protection algorithm
+    if alg == 0:
+        return lambda count, data_in: b'\0\0\0\0'
+    key = _get_key(key)
+    if alg == 1:
+        fresh = bearer<<27
+        return lambda count, data_in: snow_f9(key, count, fresh, dir, data_in, 8*len(data_in))
+    elif alg == 2:
+        if not _with_aes:
+            raise(CMException('EIA2 / NIA2 not available'))
+        # the AES key schedule and CMAC subkeys are computed once
+        cmac, iv_low = _get_cmac(key), (bearer<<27) + (dir<<26)
+        return lambda count, data_in: cmac(pack('>II', count, iv_low) + data_in)
+    elif alg == 3:
+        return lambda count, data_in: zuc_eia3(key, count, bearer, dir, 8*len(data_in), data_in)
+    else:
+        raise(CMException('invalid integrity protection algorithm %r' % alg))
+
+
+def _get_cmac(key):
+    # return the data_in -> MAC [4 bytes] function of AES CMAC, with the native
+    # CMAC mode of the AES backend when available
+    if AES_CMAC is not None:
+        mac = AES_CMAC(key).mac
+        return lambda data_in: mac(data_in)[:4]
+    else:
+        return CMAC(key, AES_ECB, Tlen=32).cmac
+
+
+def _bind_protect(alg_enc, alg_int, k_enc, k_int, bearer, dir):
+    # return the (count, data_in, offset, mode) -> data_out function computing
+    # the MAC and ciphering in a single call, see the *_protect functions, 
+    # or None when the ciphering and integrity protection algorithms differ
+    if alg_enc != alg_int or alg_enc not in (1, 2, 3):
+        return None
+    k_enc, k_int = _get_key(k_enc), _get_key(k_int)
+    if alg_enc == 1:
+        fresh = bearer<<27
+        return lambda count, data_in, offset, mode: \
+            snow_protect(k_enc, k_int, count, bearer, fresh, dir, data_in, offset, mode)
+    elif alg_enc == 2:
+        if not _with_aes:
+            raise(CMException('EEA2 / NEA2 not available'))
+        ctr, cmac, iv_low = AES_CTR.bind(k_enc), _get_cmac(k_int), (bearer<<27) + (dir<<26)
+        def protect(count, data_in, offset, mode):
+            iv = pack('>II', count, iv_low)
+            if mode:
+                data_in = data_in[:offset] + ctr(iv, data_in[offset:])
+                return cmac(iv + data_in) + data_in
+            else:
+                return data_in[:offset] + ctr(iv, data_in[offset:] + cmac(iv + data_in))
+        return protect
+    else:
+        return lambda count, data_in, offset, mode: \
+            zuc_protect(k_enc, k_int, count, bearer, dir, data_in, offset, mode)
+
+
+#------------------------------------------------------------------------------#
+# PDCP
+#------------------------------------------------------------------------------#
+# see TS 38.323, sections 5.2, 5.8 and 5.9, and TS 33.501, annex D
+
+class PDCPSecurityContext(object):
+    """PDCPSecurityContext protects and unprotects the PDCP data PDU of a radio bearer
+    in a given direction, with the ciphering algorithm alg_enc and the integrity
+    protection algorithm alg_int (None when integrity protection is not activated),
+    and their keys k_enc and k_int [16 bytes, or 32 bytes 5G keys]
+    
+    bearer [uint5] is the radio bearer identity - 1, direction [0 or 1] is 0 for
+    uplink, 1 for downlink, and sn_len [12 or 18] the length of the PDCP SN in bits
+    
+    algorithms are bound to their keys and parameters once, the AES key schedule
+    and CMAC subkeys being kept for all PDU; when alg_enc and alg_int are the same
+    non-null algorithm, protect() computes the MAC-I and ciphers in a single call
+    
+    the COUNT of each PDU is the HFN || SN, the HFN being determined from the SN
+    against the next COUNT of the context (tx_next for protect(), rx_next for
+    unprotect()), within a window of half the SN space
+    """
+    
+    def __init__(self, alg_enc, alg_int, k_enc, k_int, bearer, direction, sn_len=12, count=0):
+        if not 0 <= bearer < 32 or direction not in (0, 1):
+            raise(CMException('invalid args'))
+        if sn_len not in (12, 18):
+            raise(CMException('invalid SN length %r' % sn_len))
+        if not 0 <= count < MAX_UINT32:
+            raise(CMException('invalid COUNT %r' % count))
+        self.alg_enc, self.alg_int = alg_enc, alg_int
+        self.bearer, self.direction, self.sn_len = bearer, direction, sn_len
+        self._enc = _bind_enc(alg_enc, k_enc, bearer, direction)
+        self._int = _bind_int(alg_int, k_int, bearer, direction) if alg_int is not None else None
+        self._prot = _bind_protect(alg_enc, alg_int, k_enc, k_int, bearer, direction)
+        # PDCP data PDU header length, SN mask and reordering window size
+        self._hdr_len  = 2 if sn_len == 12 else 3
+        self._sn_mask  = (1<<sn_len) - 1
+        self._win_size = 1<<(sn_len-1)
+        self.tx_next, self.rx_next = count, count
+    
+    def get_count(self, sn, next_count):
+        """returns the COUNT [uint32] of the given SN, against the next expected COUNT,
+        or raises CMException
+        """
+        sn_len = self.sn_len
+        hfn, next_sn = next_count >> sn_len, next_count & self._sn_mask
+        if sn < next_sn - self._win_size:
+            hfn += 1
+        elif sn >= next_sn + self._win_size:
+            hfn -= 1
+        count = (hfn << sn_len) + sn
+        if not 0 <= count < MAX_UINT32 or sn > self._sn_mask:
+            raise(CMException('invalid SN %r for COUNT %r' % (sn, next_count)))
+        return count
+    
+    def get_sn(self, pdu):
+        """returns the SN of the PDCP data PDU
+        """
+        return int_from_bytes(pdu[:self._hdr_len]) & self._sn_mask
+    
+    def protect(self, sn, pdu):
+        """protects the PDCP data PDU, i.e. header || SDU [bytes buffer], with the
+        given SN (or the one of the header, when sn is None)
+        
+        returns the protected PDU, i.e. header || ciphered (SDU || MAC-I), the MAC-I
+        being present only when integrity protection is activated
+        or raises CMException
+        """
+        if sn is None:
+            sn = self.get_sn(pdu)
+        count = self.get_count(sn, self.tx_next)
+        hdr_len = self._hdr_len
+        if self._prot is not None:
+            pdu = self._prot(count, pdu, hdr_len, 0)
+        else:
+            if self._int is not None:
+                data = pdu[hdr_len:] + self._int(count, pdu)
+            else:
+                data = pdu[hdr_len:]
+            if self._enc is not None:
+                data = self._enc(count, data)
+            pdu = pdu[:hdr_len] + data
+        if count >= self.tx_next:
+            self.tx_next = count + 1
+        return pdu
+    
+    def unprotect(self, sn, pdu):
+        """unprotects the protected PDCP data PDU, i.e. header || ciphered (SDU || MAC-I)
+        [bytes buffer], with the given SN (or the one of the header, when sn is None)
+        
+        returns the PDU, i.e. header || SDU [bytes buffer]
+        or None when the SN is out of the window or the MAC-I is invalid
+        """
+        if sn is None:
+            sn = self.get_sn(pdu)
+        try:
+            count = self.get_count(sn, self.rx_next)
+        except CMException:
+            return None
+        hdr_len = self._hdr_len
+        data = pdu[hdr_len:]
+        if self._enc is not None:
+            data = self._enc(count, data)
+        if self._int is not None:
+            if len(data) < 4:
+                return None
+            data, mac = pdu[:hdr_len] + data[:-4], data[-4:]
+            if not hmac.compare_digest(self._int(count, data), mac):
+                return None
+        else:
+            data = pdu[:hdr_len] + data
+        if count >= self.rx_next:
+            self.rx_next = count + 1
+        return data
+
+
+#------------------------------------------------------------------------------#
+# NAS
+#------------------------------------------------------------------------------#
+# see TS 24.301, section 9.1 and 4.4, TS 24.501, section 9.1 and 4.4,
+# TS 33.401, section 8 and TS 33.501, section 6.4
+#
+# security protected NAS message:
+# - LTE: security header type [uint4] || protocol discriminator [uint4, 7: EMM] ||
+#        MAC [4 bytes] || SN [uint8] || NAS message
+# - 5G : extended protocol discriminator [uint8, 0x7e: 5GMM] || spare [uint4] ||
+#        security header type [uint4] || MAC [4 bytes] || SN [uint8] || NAS message
+# the NAS message is ciphered first, the MAC being then computed over SN || NAS message
+
+class NASSecurityContext(object):
+    """NASSecurityContext protects and verifies the security protected NAS messages
+    of a NAS connection in a given direction, with the ciphering algorithm alg_enc,
+    the integrity protection algorithm alg_int and their keys k_enc and k_int
+    [16 bytes, or 32 bytes NAS keys]
+    
+    direction [0 or 1] is 0 for uplink, 1 for downlink; for 5G (lte is False),
+    conn_id [0 or 1] is the NAS connection identifier (0: 3GPP access, 1: non-3GPP
+    access) used as the BEARER, which is always 0 for LTE
+    
+    the NAS COUNT [uint24] is the NAS overflow [uint16] || NAS SN [uint8]: tx_count
+    is the COUNT of the next message to protect, rx_count the next one expected to be
+    verified; when verifying, the COUNT is estimated from the SN as the lowest one
+    not below rx_count - window, messages up to window COUNT behind being accepted
+    once each
+    
+    verification outcomes are counted in stats: ok, mac (MAC failure), count
+    (replayed or too old COUNT) and format (invalid or not protected message)
+    """
+    
+    # NAS protocol discriminators
+    PD_LTE = 0x07
+    PD_5G  = 0x7e
+    
+    def __init__(self, alg_enc, alg_int, k_enc, k_int, direction, conn_id=0, lte=False,
+                 tx_count=0, rx_count=0, window=0):
+        if direction not in (0, 1) or conn_id not in (0, 1) or (lte and conn_id):
+            raise(CMException('invalid args'))
+        if not 0 <= tx_count < 0x1000000 or not 0 <= rx_count < 0x1000000:
+            raise(CMException('invalid NAS COUNT'))
+        if not 0 <= window < 256:
+            raise(CMException('invalid COUNT window %r' % window))
+        self.alg_enc, self.alg_int = alg_enc, alg_int
+        self.direction, self.conn_id, self.lte = direction, conn_id, lte
+        self._enc = _bind_enc(alg_enc, k_enc, conn_id, direction)
+        self._int = _bind_int(alg_int, k_int, conn_id, direction)
+        self._prot = _bind_protect(alg_enc, alg_int, k_enc, k_int, conn_id, direction)
+        # protocol discriminator, and security header prefix per security header type
+        self._pd = self.PD_LTE if lte else self.PD_5G
+        if lte:
+            self._hdrs = [bytes(bytearray([(sht<<4) + self.PD_LTE])) for sht in range(16)]
+        else:
+            self._hdrs = [bytes(bytearray([self.PD_5G, sht])) for sht in range(16)]
+        self._hdr_len = len(self._hdrs[0])
+        self.tx_count, self.rx_count, self.window = tx_count, rx_count, window
+        # bitmap of the COUNT accepted behind rx_count, bit i for rx_count - 1 - i
+        self._rx_seen = 0
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """resets the verify_and_decrypt() counters in stats
+        """
+        self.stats = {'ok': 0, 'mac': 0, 'count': 0, 'format': 0}
+    
+    def protect(self, nas_msg, ciphered=True):
+        """protects the plain NAS message [bytes buffer] with the next COUNT, 
+        integrity protected and ciphered (security header type 2) or integrity
+        protected only (security header type 1)
+        
+        returns the security protected NAS message [bytes buffer]
+        or raises CMException when the COUNT wraps around
+        """
+        count = self.tx_count
+        if count >= 0x1000000:
+            raise(CMException('NAS COUNT wrap-around'))
+        self.tx_count = count + 1
+        data = bytes(bytearray([count & 0xff])) + nas_msg
+        if ciphered:
+            if self._prot is not None:
+                return self._hdrs[2] + self._prot(count, data, 1, 1)
+            elif self._enc is not None:
+                data = data[:1] + self._enc(count, nas_msg)
+        return self._hdrs[2 if ciphered else 1] + self._int(count, data) + data
+    
+    def protect_many(self, nas_msgs, ciphered=True):
+        """protects the list of plain NAS messages, with successive COUNT,
+        see protect()
+        """
+        protect = self.protect
+        return [protect(nas_msg, ciphered) for nas_msg in nas_msgs]
+    
+    def _get_count(self, sn):
+        # return the COUNT of the SN, within the window, or None for replays
+        rx_count, window = self.rx_count, self.window
+        low = rx_count - window if rx_count > window else 0
+        count = low + ((sn - low) & 0xff)
+        if count < rx_count:
+            if (self._rx_seen >> (rx_count - 1 - count)) & 1:
+                return None
+        elif count >= 0x1000000:
+            return None
+        return count
+    
+    def _set_count(self, count):
+        rx_count = self.rx_count
+        if count >= rx_count:
+            shift = count + 1 - rx_count
+            self._rx_seen = ((self._rx_seen << shift) | 1) & ((1<<self.window) - 1)
+            self.rx_count = count + 1
+        else:
+            self._rx_seen |= 1 << (rx_count - 1 - count)
+    
+    def verify_and_decrypt(self, sec_msg):
+        """verifies the MAC of the security protected NAS message [bytes buffer],
+        and deciphers it when its security header type is 2 or 4
+        
+        returns the plain NAS message [bytes buffer]
+        or None on failure (counted in stats)
+        """
+        hdr_len, stats = self._hdr_len, self.stats
+        if len(sec_msg) < hdr_len + 5:
+            stats['format'] += 1
+            return None
+        if self.lte:
+            sht, pd = sec_msg[0] >> 4, sec_msg[0] & 0xf
+        else:
+            sht, pd = sec_msg[1] & 0xf, sec_msg[0]
+        if not 1 <= sht <= 4 or pd != self._pd:
+            stats['format'] += 1
+            return None
+        data = sec_msg[hdr_len+4:]
+        count = self._get_count(data[0])
+        if count is None:
+            stats['count'] += 1
+            return None
+        if not hmac.compare_digest(self._int(count, data), sec_msg[hdr_len:hdr_len+4]):
+            stats['mac'] += 1
+            return None
+        self._set_count(count)
+        stats['ok'] += 1
+        if sht in (2, 4) and self._enc is not None:
+            return self._enc(count, data[1:])
+        else:
+            return data[1:]
+    
+    def verify_and_decrypt_many(self, sec_msgs):
+        """verifies and deciphers the list of security protected NAS messages, 
+        see verify_and_decrypt()
+        
+        returns the list of plain NAS messages, with None for each failure
+        """
+        verify_and_decrypt = self.verify_and_decrypt
+        return [verify_and_decrypt(sec_msg) for sec_msg in sec_msgs]
@@ -13,17 +13,29 @@
 #*/
 
 import hmac
-from hashlib import sha256
-from struct  import pack
-from .utils  import *
+from hashlib     import sha256
+from struct      import pack, Struct, error as struct_error
+from operator    import itemgetter
+from collections import OrderedDict
+from threading   import Lock
+from .utils      import *
 
 
 __all__ = [
     'KDF',
+    'KDFKey',
+    'get_kdf_key',
+    'kdf_cache_clear',
+    'KDFTemplate',
     'conv_102_C2',
     'conv_102_C3',
     'conv_102_C4',
     'conv_102_C5',
+    'conv_102_C2_batch',
+    'conv_102_C3_batch',
+    'conv_102_C4_batch',
+    'conv_102_C5_batch',
+    'conv_102_C23_vectors',
     'conv_401_A2',
     'conv_401_A3',
     'conv_401_A4',
@@ -32,6 +44,7 @@ __all__ = [
     'conv_501_A3',
     'conv_501_A4',
     'conv_501_A5',
+    'conv_501_ausf_batch',
     'conv_501_A6',
     'conv_501_A7',
     'conv_501_A8',
@@ -39,6 +52,8 @@ __all__ = [
     'conv_501_A10',
     'conv_501_A11',
     'conv_501_A12',
+    'conv_501_A11_batch',
+    'conv_501_A12_batch',
     'conv_501_A13',
     'conv_501_A141',
     'conv_501_A142',
@@ -49,6 +64,10 @@ __all__ = [
     'conv_501_A18',
     'conv_501_A19',
     'conv_501_A20',
+    'conv_501_A17_batch',
+    'conv_501_A18_verify_batch',
+    'conv_501_A19_batch',
+    'conv_501_A20_verify_batch',
     'conv_501_A21',
     'conv_501_A22',
     'conv_501_A23',
@@ -61,10 +80,230 @@ __all__ = [
 # conversion functions and Key Derivation Functions
 #------------------------------------------------------------------------------#
 
+# HMAC (RFC 2104) inner and outer key paddings, as translation tables
+_HMAC_IPAD = bytes(bytearray(x ^ 0x36 for x in range(256)))
+_HMAC_OPAD = bytes(bytearray(x ^ 0x5c for x in range(256)))
+
+
+class KDFKey(object):
+    """3GPP Key Derivation Function defined in TS 33.220, keyed with K
+    
+    the HMAC-SHA-256 inner and outer hash states are computed once from K,
+    each derivation then only copies them before processing S
+    """
+    
+    __slots__ = ('_inner', '_outer')
+    
+    def __init__(self, K):
+        K = bytes(K)
+        if len(K) > 64:
+            K = sha256(K).digest()
+        K = K.ljust(64, b'\0')
+        self._inner = sha256(K.translate(_HMAC_IPAD))
+        self._outer = sha256(K.translate(_HMAC_OPAD))
+    
+    def derive(self, S):
+        """return the 32 bytes derivation of S
+        """
+        inner = self._inner.copy()
+        inner.update(S)
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()
+    
+    __call__ = derive
+
+
+# max number of KDFKey kept by get_kdf_key(), 0 (default) to disable caching
+# when enabled, the cache keeps the raw keys (e.g. KAUSF, KSEAF, KAMF, KASME) in memory
+# as its dict keys, until they are evicted or kdf_cache_clear() is called
+KDF_CACHE_SIZE = 0
+
+_KDF_CACHE = OrderedDict()
+_KDF_CACHE_LOCK = Lock()
+
+def get_kdf_key(K):
+    """return the KDFKey for K, kept in a LRU cache of KDF_CACHE_SIZE keys
+    """
+    K = bytes(K)
+    # lookups rely on the atomicity of OrderedDict methods, only updates are locked
+    kdf = _KDF_CACHE.get(K)
+    if kdf is not None:
+        try:
+            _KDF_CACHE.move_to_end(K)
+        except KeyError:
+            # evicted concurrently
+            pass
+        return kdf
+    kdf = KDFKey(K)
+    if KDF_CACHE_SIZE > 0:
+        with _KDF_CACHE_LOCK:
+            _KDF_CACHE[K] = kdf
+            while len(_KDF_CACHE) > KDF_CACHE_SIZE:
+                _KDF_CACHE.popitem(last=False)
+    return kdf
+
+
+def kdf_cache_clear():
+    """empty the cache of KDFKey used by KDF() and get_kdf_key(), releasing the
+    keys it retains (see KDF_CACHE_SIZE)
+    """
+    with _KDF_CACHE_LOCK:
+        _KDF_CACHE.clear()
+
+
+class KDFTemplate(object):
+    """3GPP KDF input template, S = FC || P0 || L0 || P1 || L1 ... (TS 33.220, annex B.2)
+    
+    params is the list of parameters following FC [uint8], each one being:
+        bytes   : constant bytes, inserted as is
+        'B', 'H', 'T', 'I': uint8, uint16, uint24 or uint32 argument, followed by its length
+        (code, L): integer argument as above, followed by the explicit length L
+        'Ns'    : argument of N bytes (e.g. '16s'), followed by its length
+        's'     : variable length bytes argument, followed by its length
+        'r'     : variable length bytes argument, inserted as is without length
+    
+    the build() function is set up once per template: a single itemgetter puts FC,
+    the constant values and the arguments in order, and a single struct.Struct per
+    set of variable lengths packs them; bytes arguments can be any bytes-like object,
+    and the length of 'Ns' arguments is left to the caller to check, as struct pads
+    or truncates them
+    """
+    
+    __slots__ = ('fc', 'params', 'build', '_structs', '_fmt')
+    
+    # struct format and length of integer parameters
+    _INT_FMT = {'B': ('B', 1), 'H': ('H', 2), 'T': ('HB', 3), 'I': ('I', 4)}
+    
+    def __init__(self, fc, params=()):
+        self.fc, self.params = fc, tuple(params)
+        # struct format, with a %i placeholder for each variable length argument,
+        # and the source of each struct value, as (kind, index) with kind being 'c'
+        # for constants, 'a' for arguments, 'l' for variable lengths and 't' for
+        # 'T' arguments split as 16 + 8 bits
+        fmt, consts, src = ['>B'], [fc], [('c', 0)]
+        nargs, bufs, var, tris = 0, [], [], []
+        for param in self.params:
+            if isinstance(param, bytes):
+                fmt.append('%is' % len(param))
+                src.append(('c', len(consts)))
+                consts.append(param)
+                continue
+            if isinstance(param, tuple) and len(param) == 2 and param[0] in self._INT_FMT:
+                code, ilen = param[0], int(param[1])
+            elif param in self._INT_FMT:
+                code, ilen = param, self._INT_FMT[param][1]
+            else:
+                code = None
+            if code == 'T':
+                fmt.append('HBH')
+                src.extend((('t', 2*len(tris)), ('t', 2*len(tris)+1), ('c', len(consts))))
+                tris.append(nargs)
+                consts.append(ilen)
+            elif code:
+                fmt.append(self._INT_FMT[code][0] + 'H')
+                src.extend((('a', nargs), ('c', len(consts))))
+                consts.append(ilen)
+            elif param in ('s', 'r'):
+                fmt.append('%isH' if param == 's' else '%is')
+                src.append(('a', nargs))
+                if param == 's':
+                    src.append(('l', len(var)))
+                bufs.append(nargs)
+                var.append(nargs)
+            elif param[-1:] == 's' and param[:-1].isdigit():
+                fmt.append(param + 'H')
+                src.extend((('a', nargs), ('c', len(consts))))
+                bufs.append(nargs)
+                consts.append(int(param[:-1]))
+            else:
+                raise(CMException('KDFTemplate: invalid parameter %r' % (param, )))
+            nargs += 1
+        self._fmt, self._structs = ''.join(fmt), {}
+        # struct values are taken from consts + args + variable lengths + splits
+        offs = {'c': 0, 'a': len(consts), 'l': len(consts) + nargs,
+                't': len(consts) + nargs + len(var)}
+        inds = [offs[k] + i for k, i in src]
+        getter = itemgetter(*inds) if len(inds) > 1 else lambda vals: (vals[0], )
+        self.build = self._bind(tuple(consts), getter, nargs, tuple(bufs), tuple(var),
+                                tuple(tris))
+    
+    def _bind(self, consts, getter, nargs, bufs, var, tris):
+        # return the build() function of the template, struct only accepting
+        # bytes and bytearray, other bytes-like arguments are converted on failure
+        def retry(pack_, args, tail):
+            args = list(args)
+            for i in bufs:
+                args[i] = bytes(args[i])
+            try:
+                return pack_(*getter(consts + tuple(args) + tail))
+            except struct_error as err:
+                raise(CMException('KDFTemplate: %s' % err))
+        #
+        if tris:
+            pack_ = self._compile(())
+            def build(*args):
+                if len(args) != nargs:
+                    raise(CMException('KDFTemplate: %i args expected' % nargs))
+                tail = ()
+                for i in tris:
+                    tail += ((args[i] >> 8) & 0xffff, args[i] & 0xff)
+                try:
+                    return pack_(*getter(consts + args + tail))
+                except struct_error as err:
+                    raise(CMException('KDFTemplate: %s' % err))
+        elif not var:
+            pack_ = self._compile(())
+            def build(*args):
+                if len(args) != nargs:
+                    raise(CMException('KDFTemplate: %i args expected' % nargs))
+                try:
+                    return pack_(*getter(consts + args))
+                except struct_error:
+                    return retry(pack_, args, ())
+        else:
+            structs, compile_ = self._structs, self._compile
+            def build(*args):
+                if len(args) != nargs:
+                    raise(CMException('KDFTemplate: %i args expected' % nargs))
+                lens = tuple([len(args[i]) for i in var])
+                try:
+                    pack_ = structs[lens]
+                except KeyError:
+                    pack_ = compile_(lens)
+                try:
+                    return pack_(*getter(consts + args + lens))
+                except struct_error:
+                    return retry(pack_, args, lens)
+        return build
+    
+    def _compile(self, lens):
+        pack_ = Struct(self._fmt % lens).pack
+        if len(self._structs) < 1024:
+            self._structs[lens] = pack_
+        return pack_
+    
+    def derive(self, K, *args):
+        """return the 32 bytes derivation with K of the KDF input built from args
+        """
+        return KDF(K, self.build(*args))
+
+
 # 3G / 4G / 5G are using SHA2 for key derivation
 def KDF( K, S ):
-    """derive S with K according to 3GPP Key Derivation Function defined in TS 33.220"""
-    return hmac.new( K, S, sha256 ).digest()
+    """derive S with K according to 3GPP Key Derivation Function defined in TS 33.220
+    
+    the HMAC key states of K are kept by get_kdf_key() for the next derivations,
+    when KDF_CACHE_SIZE is set
+    """
+    if KDF_CACHE_SIZE > 0:
+        return get_kdf_key(K).derive(S)
+    # single derivation, without precomputing the HMAC key states
+    try:
+        return hmac.new(K, S, sha256).digest()
+    except TypeError:
+        # hmac only accepts bytes and bytearray keys
+        return hmac.new(bytes(K), S, sha256).digest()
 
 
 #------------------------------------------------------------------------------#
@@ -140,10 +379,141 @@ def conv_102_C5(Kc):
     return XKc + Kc + XKc
 
 
+# batch conversions work on packed arrays of N values:
+# the same word of all records is extracted with a strided memoryview and handled
+# as a single wide integer, so that all records are xored at once
+if py_vers > 2:
+    
+    def _get_words(buf, fmt, step, off):
+        # off-th word of each record of step words, as a wide integer
+        return int.from_bytes(memoryview(buf).cast(fmt)[off::step].tobytes(), 'little')
+    
+    def _set_words(out, fmt, step, off, words, length):
+        # set the off-th word of each record of step words from a wide integer
+        memoryview(out).cast(fmt)[off::step] = memoryview(words.to_bytes(length, 'little')).cast(fmt)
+
+
+def conv_102_C2_batch(XRES, res_len=16):
+    """C2 conversion function, for a batch of N XRES
+    
+    return 2G SRES [N*4 bytes buffer] from
+        3G XRES USIM output [N*res_len bytes buffer, res_len being between 4 and 16]
+    or None on error
+    """
+    if not 4 <= res_len <= 16 or len(XRES) % res_len:
+        log('ERR', 'conv_C2_batch: invalid args')
+        return None
+    num = len(XRES) // res_len
+    if not num:
+        return b''
+    elif py_vers < 3:
+        return b''.join([conv_102_C2(XRES[i:i+res_len]) for i in range(0, len(XRES), res_len)])
+    if res_len & 3:
+        # zero-pad each XRES to a multiple of 4 bytes
+        pad   = (4 - (res_len & 3)) * b'\0'
+        XRES  = pad.join([XRES[i:i+res_len] for i in range(0, len(XRES), res_len)]) + pad
+        res_len += len(pad)
+    step, sres = res_len >> 2, 0
+    for off in range(step):
+        sres ^= _get_words(XRES, 'I', step, off)
+    return sres.to_bytes(num << 2, 'little')
+
+
+def conv_102_C3_batch(CK, IK):
+    """C3 conversion function, for a batch of N CK and IK
+    
+    return 2G Kc [N*8 bytes buffer] from
+        3G CK and IK USIM output [N*16 bytes buffer each]
+    or None on error
+    """
+    if len(CK) & 15 or len(IK) != len(CK):
+        log('ERR', 'conv_C3_batch: invalid args')
+        return None
+    elif not CK:
+        return b''
+    elif py_vers < 3:
+        return b''.join([conv_102_C3(CK[i:i+16], IK[i:i+16]) for i in range(0, len(CK), 16)])
+    return (_get_words(CK, 'Q', 2, 0) ^ _get_words(CK, 'Q', 2, 1) ^ \
+            _get_words(IK, 'Q', 2, 0) ^ _get_words(IK, 'Q', 2, 1)).to_bytes(len(CK) >> 1, 'little')
+
+
+def conv_102_C4_batch(Kc):
+    """C4 conversion function, for a batch of N Kc
+    
+    return 3G CK [N*16 bytes buffer] from
+        2G Kc SIM output [N*8 bytes buffer]
+    or None on error
+    """
+    if len(Kc) & 7:
+        log('ERR', 'conv_C4_batch: invalid args')
+        return None
+    elif not Kc or py_vers < 3:
+        return b''.join([Kc[i:i+8] * 2 for i in range(0, len(Kc), 8)])
+    CK = bytearray(len(Kc) << 1)
+    mv, kc = memoryview(CK).cast('Q'), memoryview(Kc).cast('Q')
+    mv[0::2], mv[1::2] = kc, kc
+    return bytes(CK)
+
+
+def conv_102_C5_batch(Kc):
+    """C5 conversion function, for a batch of N Kc
+    
+    return 3G IK [N*16 bytes buffer] from
+        2G Kc SIM output [N*8 bytes buffer]
+    or None on error
+    """
+    if len(Kc) & 7:
+        log('ERR', 'conv_C5_batch: invalid args')
+        return None
+    elif not Kc:
+        return b''
+    elif py_vers < 3:
+        return b''.join([conv_102_C5(Kc[i:i+8]) for i in range(0, len(Kc), 8)])
+    # IK = XKc || Kc || XKc, as 4 words of 4 bytes
+    IK, num = bytearray(len(Kc) << 1), len(Kc) >> 3
+    mv, kc = memoryview(IK).cast('I'), memoryview(Kc).cast('I')
+    mv[1::4], mv[2::4] = kc[0::2], kc[1::2]
+    XKc = _get_words(Kc, 'I', 2, 0) ^ _get_words(Kc, 'I', 2, 1)
+    _set_words(IK, 'I', 4, 0, XKc, num << 2)
+    _set_words(IK, 'I', 4, 3, XKc, num << 2)
+    return bytes(IK)
+
+
+def conv_102_C23_vectors(vectors):
+    """C2 and C3 conversion functions, for authentication vectors
+    
+    return a list of (SRES [4 bytes buffer], Kc [8 bytes buffer]) 2-tuples from
+        a list of (MAC_A, RES, CK, IK, AK) 5-tuples, as returned by TUAK.generate_vectors(),
+    with None for each None input or vector with RES longer than 16 or CK / IK not of 16 bytes
+    """
+    ret = [None] * len(vectors)
+    # vectors are converted together, per RES length
+    groups = {}
+    for i, vec in enumerate(vectors):
+        if vec is not None and 4 <= len(vec[1]) <= 16 and len(vec[2]) == 16 and len(vec[3]) == 16:
+            groups.setdefault(len(vec[1]), []).append(i)
+    for res_len, inds in groups.items():
+        SRES = conv_102_C2_batch(b''.join([vectors[i][1] for i in inds]), res_len)
+        Kc   = conv_102_C3_batch(b''.join([vectors[i][2] for i in inds]),
+                                 b''.join([vectors[i][3] for i in inds]))
+        for j, i in enumerate(inds):
+            ret[i] = (SRES[4*j:4*j+4], Kc[8*j:8*j+8])
+    return ret
+
+
 #------------------------------------------------------------------------------#
 # 3G / LTE conversion functions
 #------------------------------------------------------------------------------#
 # see TS 33.401, annex A
+#
+# KDF input templates of each conversion function, used by the batch functions and
+# the key sets of keyset.py; single conversions pack their input inline, which is faster
+
+KDF_401_A2 = KDFTemplate(0x10, ['3s', '6s'])
+KDF_401_A3 = KDFTemplate(0x11, ['I'])
+KDF_401_A4 = KDFTemplate(0x12, ['32s'])
+KDF_401_A7 = KDFTemplate(0x15, ['B', 'B'])
+
 
 # Kasme (LTE master key) from CK, IK (3G USIM key)
 def conv_401_A2(CK, IK, sn_id, sqn_x_ak):
@@ -211,6 +581,35 @@ def conv_401_A7(KEY, alg_dist=0, alg_id=0):
 # 3G / 5G and LTE / 5G conversion functions
 #------------------------------------------------------------------------------#
 # see TS 33.501, annex A
+#
+# KDF input templates of each conversion function, used by the batch functions and
+# the key sets of keyset.py; single conversions pack their input inline, which is faster
+
+KDF_501_A2       = KDFTemplate(0x6a, ['s', '6s'])
+KDF_501_A3       = KDFTemplate(0x20, ['s', '6s'])
+KDF_501_A4       = KDFTemplate(0x6b, ['s', '16s', 's'])
+KDF_501_A6       = KDFTemplate(0x6c, ['s'])
+KDF_501_A7       = KDFTemplate(0x6d, ['s', '2s'])
+KDF_501_A8       = KDFTemplate(0x69, ['B', 'B'])
+KDF_501_A9       = KDFTemplate(0x6e, ['I', 'B'])
+KDF_501_A10      = KDFTemplate(0x6f, ['32s'])
+KDF_501_A11      = KDFTemplate(0x70, ['H', 'T'])
+KDF_501_A12      = KDFTemplate(0x71, ['H', 'T'])
+KDF_501_A13      = KDFTemplate(0x72, ['B', 'I'])
+KDF_501_A141     = KDFTemplate(0x73, ['I'])
+KDF_501_A142     = KDFTemplate(0x74, ['I'])
+KDF_501_A151     = KDFTemplate(0x75, ['I'])
+KDF_501_A152     = KDFTemplate(0x76, ['32s'])
+KDF_501_A16      = KDFTemplate(0x79, ['H'])
+KDF_501_A17      = KDFTemplate(0x77, ['s', 'H'])
+KDF_501_A17_PLMN = KDFTemplate(0x77, ['s', 'H', 's'])
+KDF_501_A18      = KDFTemplate(0x78, [('B', 2), 'H'])
+# A19 UPU data are not followed by their length (TS 33.501, A.19)
+KDF_501_A19      = KDFTemplate(0x7b, ['r', b'\x00\x02', 'H'])
+KDF_501_A20      = KDFTemplate(0x7c, [('B', 2), 'H'])
+KDF_501_A21      = KDFTemplate(0x7d, ['I'])
+KDF_501_A23      = KDFTemplate(0x83, ['s', 's'])
+
 
 def  conv_501_A2(CK, IK, sn_name, sqn_x_ak):
     """A2 conversion function
@@ -279,6 +678,46 @@ def conv_501_A5(rand, res_star):
     return sha256(rand + res_star).digest()[16:]
 
 
+def conv_501_ausf_batch(CK, IK, rand, res, sqn_x_ak, sn_name):
+    """A2, A4 and A5 conversion functions, for a batch of N authentication vectors
+    
+    return KAUSF [N*32 bytes buffer], RES* [N*16 bytes buffer] and HRES* [N*16 bytes buffer]
+    from
+        3G CK and IK USIM output [N*16 bytes buffer each],
+        RAND [N*16 bytes buffer],
+        RES [N*4 to N*16 bytes buffer, all RES having the same length],
+        SQN^AK [N*6 bytes buffer] and
+        Serving network name [bytes buffer, e.g. b"5G:mnc001.mcc001.3gppnetwork.org"]
+    or raise CMException
+    """
+    num = len(CK) >> 4
+    if len(CK) != num << 4 or len(IK) != num << 4 or len(rand) != num << 4 \
+    or len(sqn_x_ak) != 6 * num or not 32 <= len(sn_name) <= 255 \
+    or (num and (len(res) % num or not 4 <= len(res) // num <= 16)):
+        raise(CMException('conv_501_ausf_batch: invalid args'))
+    if not num:
+        return b'', b'', b''
+    CK, IK, rand, res, sqn_x_ak = bytes(CK), bytes(IK), bytes(rand), bytes(res), bytes(sqn_x_ak)
+    res_len = len(res) // num
+    # the KDF input prefixes, with the serving network name and its length, and
+    # the RES length are packed once for the whole batch
+    sn_name  = bytes(sn_name) + pack('>H', len(sn_name))
+    pre_a2   = b'\x6a' + sn_name
+    pre_a4   = b'\x6b' + sn_name
+    res_len_ = pack('>H', res_len)
+    kausf, res_star, hres_star = [], [], []
+    for i in range(num):
+        # each CK || IK is used for 2 derivations, without being kept in the KDF cache
+        kdf   = KDFKey(CK[16*i:16*i+16] + IK[16*i:16*i+16])
+        rand_ = rand[16*i:16*i+16]
+        kausf.append(kdf.derive(pre_a2 + sqn_x_ak[6*i:6*i+6] + b'\x00\x06'))
+        res_star_ = kdf.derive(pre_a4 + rand_ + b'\x00\x10' + \
+                               res[res_len*i:res_len*(i+1)] + res_len_)[16:]
+        res_star.append(res_star_)
+        hres_star.append(sha256(rand_ + res_star_).digest()[16:])
+    return b''.join(kausf), b''.join(res_star), b''.join(hres_star)
+
+
 def conv_501_A6(KAUSF, sn_name):
     """A6 conversion function
     
@@ -385,6 +824,41 @@ def conv_501_A12(K, pci=0, earfcn_dl=0):
                   pack('>IH', earfcn_dl, 3)[1:])
 
 
+def _conv_501_A1112_batch(tmpl, name, K, pcis, arfcns_dl):
+    pcis, arfcns_dl = list(pcis), list(arfcns_dl)
+    if len(K) != 32 or len(pcis) != len(arfcns_dl) \
+    or not all([0 <= pci <= 65535 for pci in pcis]) \
+    or not all([0 <= arfcn < 16777216 for arfcn in arfcns_dl]):
+        raise(CMException('%s: invalid args' % name))
+    # single HMAC key state for the whole list of target cells
+    derive, build = get_kdf_key(K).derive, tmpl.build
+    return [derive(build(pci, arfcn)) for pci, arfcn in zip(pcis, arfcns_dl)]
+
+
+def conv_501_A11_batch(K, pcis, arfcns_dl):
+    """A11 conversion function, for a list of target cells
+    
+    return the list of K_NG_RAN* for target gNBs from
+        KGNB or NH [32 bytes buffer],
+        PCI target physical cell-IDs [iterable of uint16] and
+        ARFCN-DL [iterable of uint24, one per PCI]
+    or raise CMException
+    """
+    return _conv_501_A1112_batch(KDF_501_A11, 'conv_501_A11_batch', K, pcis, arfcns_dl)
+
+
+def conv_501_A12_batch(K, pcis, earfcns_dl):
+    """A12 conversion function, for a list of target cells
+    
+    return the list of K_NG_RAN* for target ng-eNBs from
+        KGNB or NH [32 bytes buffer],
+        PCI target physical cell-IDs [iterable of uint16] and
+        EARFCN-DL [iterable of uint24, one per PCI]
+    or raise CMException
+    """
+    return _conv_501_A1112_batch(KDF_501_A12, 'conv_501_A12_batch', K, pcis, earfcns_dl)
+
+
 def conv_501_A13(KAMF, dir=1, dl_nas_cnt=0):
     """A13 conversion function
     
@@ -530,6 +1004,140 @@ def conv_501_A20(KAUSF, upu_ack=1, upu_cnt=0):
     return KDF(KAUSF, b'\x7c' + pack('>BHHH', upu_ack, 2, upu_cnt, 2))
 
 
+# SoR and UPU batches: one KDF input and one KAUSF per subscriber,
+# the KDF inputs being built in the calling process, and possibly dispatched
+# by chunks to a pool of workers (e.g. a concurrent.futures ProcessPoolExecutor)
+
+# each KAUSF being used once, the HMAC key states are not precomputed
+
+def _conv_501_mac_chunk(KAUSF, inputs):
+    # MAC [32 bytes] for each KAUSF [32 bytes] and KDF input
+    KAUSF = bytes(KAUSF)
+    return b''.join([hmac.new(KAUSF[32*i:32*i+32], S, sha256).digest() \
+                     for i, S in enumerate(inputs)])
+
+
+def _conv_501_verify_chunk(KAUSF, inputs, macs, mac_len):
+    # bitmap of the MAC [mac_len LSB] verifications for each KAUSF and KDF input
+    KAUSF, bitmap = bytes(KAUSF), 0
+    for i, S in enumerate(inputs):
+        mac = hmac.new(KAUSF[32*i:32*i+32], S, sha256).digest()[32-mac_len:]
+        if hmac.compare_digest(mac, macs[mac_len*i:mac_len*(i+1)]):
+            bitmap |= 1 << i
+    return bitmap
+
+
+def _conv_501_run_chunks(KAUSF, inputs, macs=None, mac_len=16, pool=None, chunk=1024):
+    # MACs computation [N*32 bytes buffer] when macs is None, MACs verification
+    # bitmap [int] otherwise, by chunks submitted to pool when provided
+    num = len(inputs)
+    step = chunk if pool is not None and chunk > 0 else max(1, num)
+    jobs = []
+    for off in range(0, num, step):
+        if macs is None:
+            jobs.append((_conv_501_mac_chunk, KAUSF[32*off:32*(off+step)], inputs[off:off+step]))
+        else:
+            jobs.append((_conv_501_verify_chunk, KAUSF[32*off:32*(off+step)], inputs[off:off+step],
+                         macs[mac_len*off:mac_len*(off+step)], mac_len))
+    if pool is None or len(jobs) < 2:
+        res = [job[0](*job[1:]) for job in jobs]
+    else:
+        res = [fut.result() for fut in [pool.submit(*job) for job in jobs]]
+    if macs is None:
+        return b''.join(res)
+    bitmap = 0
+    for i, bm in enumerate(res):
+        bitmap |= bm << (i*step)
+    return bitmap
+
+
+def _conv_501_check_batch(name, KAUSF, cnts, macs=None):
+    # return the number of subscribers and MAC length, or raise CMException
+    num = len(KAUSF) >> 5
+    if len(KAUSF) != num << 5 or len(cnts) != num \
+    or not all([0 <= cnt <= 65535 for cnt in cnts]) \
+    or (macs is not None and (len(macs) not in (16*num, 32*num))):
+        raise(CMException('%s: invalid args' % name))
+    return num, len(macs) // num if macs is not None and num else 16
+
+
+def conv_501_A17_batch(KAUSF, sor_hdr, sor_cnts, pref_plmns=None, pool=None, chunk=1024):
+    """A17 conversion function, for a batch of N subscribers
+    
+    return SoR-MAC-I_AUSF [N*32 bytes buffer] from
+        KAUSF [N*32 bytes buffer],
+        SoR header [bytes buffer, shared by all subscribers],
+        SoR counters [list of N uint16] and
+        Preferred PLMNs / Access Tech [list of N bytes buffer, optional]
+    or raise CMException
+    
+    pool is an optional executor (e.g. concurrent.futures.ProcessPoolExecutor),
+    to which the batch is submitted by chunks of chunk subscribers
+    """
+    num, _ = _conv_501_check_batch('conv_501_A17_batch', KAUSF, sor_cnts)
+    if not 0 <= len(sor_hdr) <= 65535 \
+    or (pref_plmns is not None and (len(pref_plmns) != num \
+                                    or not all([len(plmn) <= 255 for plmn in pref_plmns]))):
+        raise(CMException('conv_501_A17_batch: invalid args'))
+    if pref_plmns is None:
+        inputs = [KDF_501_A17.build(sor_hdr, cnt) for cnt in sor_cnts]
+    else:
+        inputs = [KDF_501_A17_PLMN.build(sor_hdr, cnt, plmn) \
+                  for cnt, plmn in zip(sor_cnts, pref_plmns)]
+    return _conv_501_run_chunks(KAUSF, inputs, pool=pool, chunk=chunk)
+
+
+def conv_501_A18_verify_batch(KAUSF, sor_cnts, macs, pool=None, chunk=1024):
+    """A18 conversion function, for verifying a batch of N SoR acknowledgements
+    
+    return a bitmap [int], with bit i set when the i-th SoR-MAC-I_UE is verified, from
+        KAUSF [N*32 bytes buffer],
+        SoR counters [list of N uint16] and
+        SoR-MAC-I_UE received [N*16 bytes buffer, or N*32 bytes for full MACs]
+    or raise CMException
+    
+    pool and chunk are handled as for conv_501_A17_batch()
+    """
+    num, mac_len = _conv_501_check_batch('conv_501_A18_verify_batch', KAUSF, sor_cnts, macs)
+    inputs = [KDF_501_A18.build(1, cnt) for cnt in sor_cnts]
+    return _conv_501_run_chunks(KAUSF, inputs, macs, mac_len, pool, chunk)
+
+
+def conv_501_A19_batch(KAUSF, upu_datas, upu_cnts, pool=None, chunk=1024):
+    """A19 conversion function, for a batch of N subscribers
+    
+    return UPU-MAC-I_AUSF [N*32 bytes buffer] from
+        KAUSF [N*32 bytes buffer],
+        UPU data [list of N bytes buffer] and
+        UPU counters [list of N uint16]
+    or raise CMException
+    
+    pool and chunk are handled as for conv_501_A17_batch()
+    """
+    num, _ = _conv_501_check_batch('conv_501_A19_batch', KAUSF, upu_cnts)
+    if len(upu_datas) != num or not all([len(data) <= 65535 for data in upu_datas]):
+        raise(CMException('conv_501_A19_batch: invalid args'))
+    build = KDF_501_A19.build
+    inputs = [build(data, cnt) for data, cnt in zip(upu_datas, upu_cnts)]
+    return _conv_501_run_chunks(KAUSF, inputs, pool=pool, chunk=chunk)
+
+
+def conv_501_A20_verify_batch(KAUSF, upu_cnts, macs, pool=None, chunk=1024):
+    """A20 conversion function, for verifying a batch of N UPU acknowledgements
+    
+    return a bitmap [int], with bit i set when the i-th UPU-MAC-I_UE is verified, from
+        KAUSF [N*32 bytes buffer],
+        UPU counters [list of N uint16] and
+        UPU-MAC-I_UE received [N*16 bytes buffer, or N*32 bytes for full MACs]
+    or raise CMException
+    
+    pool and chunk are handled as for conv_501_A17_batch()
+    """
+    num, mac_len = _conv_501_check_batch('conv_501_A20_verify_batch', KAUSF, upu_cnts, macs)
+    inputs = [KDF_501_A20.build(1, cnt) for cnt in upu_cnts]
+    return _conv_501_run_chunks(KAUSF, inputs, macs, mac_len, pool, chunk)
+
+
 def conv_501_A21(KAMF, dl_nas_cnt=0):
     """A21 conversion function
     
@@ -0,0 +1,444 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.4
+# *
+# * Copyright 2020. Benoit Michau. P1Sec.
+# *
+# *--------------------------------------------------------
+# * File Name : CryptoMobile/keyset.py
+# * Created : 2026-10-19
+# * Authors : Benoit Michau
+# *--------------------------------------------------------
+#*/
+
+from hashlib import sha256
+from .utils  import *
+from .conv   import KDF, KDFKey, KDF_401_A2, KDF_401_A3, KDF_401_A4, KDF_401_A7, \
+                    KDF_501_A2, KDF_501_A4, KDF_501_A6, KDF_501_A7, KDF_501_A8, \
+                    KDF_501_A9, KDF_501_A10
+
+
+__all__ = [
+    'KeyHierarchy5G',
+    'derive_5g_hierarchy',
+    'EPSKeySet',
+    'NHChain',
+    ]
+
+
+#------------------------------------------------------------------------------#
+# CryptoMobile python toolkit
+# key hierarchies, derived lazily with the KDF and conversion functions
+#------------------------------------------------------------------------------#
+
+def _lazy_key(name, doc):
+    # read-only attribute, derived by the _derive_<name>() method on first access
+    # and then kept in the _<name> slot
+    slot, derive = '_' + name, '_derive_' + name
+    def get(self):
+        val = getattr(self, slot)
+        if val is None:
+            val = getattr(self, derive)()
+            setattr(self, slot, val)
+        return val
+    return property(get, doc=doc)
+
+
+#------------------------------------------------------------------------------#
+# 5G key hierarchy
+#------------------------------------------------------------------------------#
+# see TS 33.501, section 6.2 and annex A
+
+class KeyHierarchy5G(object):
+    """5G key hierarchy, from 3G CK / IK to the NAS, RRC and UP keys, as produced
+    by derive_5g_hierarchy()
+    
+    each key is derived on first access, with the KDF of TS 33.501 annex A,
+    and kept for the following ones; NAS, RRC and UP keys are 32 bytes,
+    128 bit algorithms using their 16 least significant bytes
+    """
+    
+    __slots__ = (
+        # inputs
+        '_ckik', '_sn_name', '_sqn_x_ak', '_supi', '_abba', '_ul_nas_cnt',
+        '_acc_type_dist', '_algs', '_rand', '_res',
+        # HMAC key states
+        '_kdf_ckik', '_kdf_kamf', '_kdf_kgnb',
+        # keys
+        '_KAUSF', '_RESstar', '_HRESstar', '_KSEAF', '_KAMF', '_KNASenc', '_KNASint',
+        '_KgNB', '_KRRCenc', '_KRRCint', '_KUPenc', '_KUPint'
+        )
+    
+    def __init__(self, CK, IK, sn_name, sqn_x_ak, supi, abba, ul_nas_cnt, algs,
+                 rand=None, res=None, acc_type_dist=1):
+        self._ckik, self._sn_name, self._sqn_x_ak = CK + IK, sn_name, sqn_x_ak
+        self._supi, self._abba, self._ul_nas_cnt = supi, abba, ul_nas_cnt
+        self._acc_type_dist, self._algs = acc_type_dist, tuple(algs)
+        self._rand, self._res = rand, res
+        self._kdf_ckik, self._kdf_kamf, self._kdf_kgnb = None, None, None
+        self._KAUSF, self._RESstar, self._HRESstar = None, None, None
+        self._KSEAF, self._KAMF, self._KNASenc, self._KNASint = None, None, None, None
+        self._KgNB, self._KRRCenc, self._KRRCint = None, None, None
+        self._KUPenc, self._KUPint = None, None
+    
+    # HMAC key states, shared by all derivations from a given key
+    
+    def _get_kdf_ckik(self):
+        if self._kdf_ckik is None:
+            self._kdf_ckik = KDFKey(self._ckik)
+        return self._kdf_ckik
+    
+    def _get_kdf_kamf(self):
+        if self._kdf_kamf is None:
+            self._kdf_kamf = KDFKey(self.KAMF)
+        return self._kdf_kamf
+    
+    def _get_kdf_kgnb(self):
+        if self._kdf_kgnb is None:
+            self._kdf_kgnb = KDFKey(self.KgNB)
+        return self._kdf_kgnb
+    
+    # derivations, with the KDF input templates of conv_501_A* for each one
+    
+    def _derive_KAUSF(self):
+        return self._get_kdf_ckik().derive(KDF_501_A2.build(self._sn_name, self._sqn_x_ak))
+    
+    def _derive_RESstar(self):
+        if self._rand is None:
+            return None
+        return self._get_kdf_ckik().derive(KDF_501_A4.build(self._sn_name, self._rand,
+                                                            self._res))[16:]
+    
+    def _derive_HRESstar(self):
+        if self._rand is None:
+            return None
+        return sha256(self._rand + self.RESstar).digest()[16:]
+    
+    def _derive_KSEAF(self):
+        return KDF(self.KAUSF, KDF_501_A6.build(self._sn_name))
+    
+    def _derive_KAMF(self):
+        return KDF(self.KSEAF, KDF_501_A7.build(self._supi, self._abba))
+    
+    def _derive_KNASenc(self):
+        return self._get_kdf_kamf().derive(KDF_501_A8.build(1, self._algs[0]))
+    
+    def _derive_KNASint(self):
+        return self._get_kdf_kamf().derive(KDF_501_A8.build(2, self._algs[1]))
+    
+    def _derive_KgNB(self):
+        return self._get_kdf_kamf().derive(KDF_501_A9.build(self._ul_nas_cnt,
+                                                            self._acc_type_dist))
+    
+    def _derive_KRRCenc(self):
+        return self._get_kdf_kgnb().derive(KDF_501_A8.build(3, self._algs[2]))
+    
+    def _derive_KRRCint(self):
+        return self._get_kdf_kgnb().derive(KDF_501_A8.build(4, self._algs[3]))
+    
+    def _derive_KUPenc(self):
+        return self._get_kdf_kgnb().derive(KDF_501_A8.build(5, self._algs[4]))
+    
+    def _derive_KUPint(self):
+        return self._get_kdf_kgnb().derive(KDF_501_A8.build(6, self._algs[5]))
+    
+    KAUSF    = _lazy_key('KAUSF', 'K_AUSF [32 bytes buffer]')
+    RESstar  = _lazy_key('RESstar', 'RES* [16 bytes buffer], None without RAND and RES')
+    HRESstar = _lazy_key('HRESstar', 'HRES* [16 bytes buffer], None without RAND and RES')
+    KSEAF    = _lazy_key('KSEAF', 'K_SEAF [32 bytes buffer]')
+    KAMF     = _lazy_key('KAMF', 'K_AMF [32 bytes buffer]')
+    KNASenc  = _lazy_key('KNASenc', 'K_NAS_enc [32 bytes buffer]')
+    KNASint  = _lazy_key('KNASint', 'K_NAS_int [32 bytes buffer]')
+    KgNB     = _lazy_key('KgNB', 'K_gNB [32 bytes buffer]')
+    KRRCenc  = _lazy_key('KRRCenc', 'K_RRC_enc [32 bytes buffer]')
+    KRRCint  = _lazy_key('KRRCint', 'K_RRC_int [32 bytes buffer]')
+    KUPenc   = _lazy_key('KUPenc', 'K_UP_enc [32 bytes buffer]')
+    KUPint   = _lazy_key('KUPint', 'K_UP_int [32 bytes buffer]')
+    
+    KEYS = ('KAUSF', 'RESstar', 'HRESstar', 'KSEAF', 'KAMF', 'KNASenc', 'KNASint',
+            'KgNB', 'KRRCenc', 'KRRCint', 'KUPenc', 'KUPint')
+    
+    def derive_all(self):
+        """derive all keys and return them in a dict, indexed by KEYS names
+        """
+        return dict([(name, getattr(self, name)) for name in self.KEYS])
+
+
+def derive_5g_hierarchy(CK, IK, sn_name, sqn_x_ak, supi, abba, ul_nas_cnt=0,
+                        algs=(0, 0, 0, 0, 0, 0), rand=None, res=None, acc_type_dist=1):
+    """return a KeyHierarchy5G with all keys derived from
+        3G CK and IK USIM output [16 bytes buffer each],
+        Serving network name [bytes buffer, e.g. b"5G:mnc001.mcc001.3gppnetwork.org"],
+        SQN^AK [6 bytes buffer],
+        Subscriber identity [bytes buffer, IMSI / NAI / GCI / GLI],
+        ABBA parameter [2 bytes buffer],
+        Uplink NAS count [uint32],
+        Algorithms identity [6-tuple of uint4, NAS enc / int, RRC enc / int, UP enc / int],
+        RAND and RES [16 and 4 to 16 bytes buffer, optional, for RES* and HRES*] and
+        Access type distinguisher [uint8, 3GPP access: 0x01, Non-3GPP access: 0x02]
+    or raise CMException
+    
+    keys are only derived when accessed, e.g. KeyHierarchy5G.KAMF, each HMAC key
+    state and the serving network name encoding being computed once
+    """
+    if len(CK) != 16 or len(IK) != 16 or not 32 <= len(sn_name) <= 255 \
+    or len(sqn_x_ak) != 6 or not 12 <= len(supi) <= 255 or len(abba) != 2 \
+    or not 0 <= ul_nas_cnt <= 4294967295 or not 1 <= acc_type_dist <= 2 \
+    or len(algs) != 6 or not all([0 <= alg_id <= 15 for alg_id in algs]) \
+    or (rand is None) != (res is None) \
+    or (rand is not None and (len(rand) != 16 or not 4 <= len(res) <= 16)):
+        raise(CMException('derive_5g_hierarchy: invalid args'))
+    return KeyHierarchy5G(CK, IK, sn_name, sqn_x_ak, supi, abba, ul_nas_cnt, algs,
+                          rand, res, acc_type_dist)
+
+
+#------------------------------------------------------------------------------#
+# EPS key set
+#------------------------------------------------------------------------------#
+# see TS 33.401, section 6.2 and annex A
+
+class EPSKeySet(object):
+    """EPS key set, from 3G CK / IK to the NAS, RRC and UP keys
+    
+    KASME is derived with conv_401_A2, NAS keys from KASME and RRC / UP keys
+    from KeNB with conv_401_A7, and KeNB from KASME and the UL NAS count with
+    conv_401_A3; each key is derived on first access and then kept, together
+    with the HMAC key states of KASME and KeNB, so that derivations for other
+    algorithms only cost the hashing of their input
+    
+    keys are 32 bytes, 128 bit algorithms using their 16 least significant bytes
+    
+    clone() returns a new key set for another UL NAS count or other algorithms,
+    sharing all the KASME-based derivations with the initial one
+    """
+    
+    # algorithm type distinguishers, TS 33.401, annex A.7
+    NAS_ENC, NAS_INT, RRC_ENC, RRC_INT, UP_ENC = 1, 2, 3, 4, 5
+    
+    __slots__ = (
+        # KASME-based state, shared between clones
+        '_kasme',
+        # KeNB-based state, shared between clones with the same UL NAS count
+        '_kenb',
+        # configuration
+        '_ul_nas_cnt', '_eea', '_eia'
+        )
+    
+    def __init__(self, CK, IK, sn_id, sqn_x_ak, ul_nas_cnt=0, eea=0, eia=0):
+        """CK and IK [16 bytes buffer each], SN_ID serving network identity [3 bytes buffer],
+        SQN^AK [6 bytes buffer], UL NAS count [uint24] and
+        EEA / EIA algorithms identity [uint8]
+        
+        raise CMException on invalid args
+        """
+        if len(CK) != 16 or len(IK) != 16 or len(sn_id) != 3 or len(sqn_x_ak) != 6:
+            raise(CMException('EPSKeySet: invalid args'))
+        self._set_config(ul_nas_cnt, eea, eia)
+        # [CK || IK, KDF input of KASME, KASME, KASME HMAC key states, {(alg dist, alg id): key}]
+        self._kasme = [CK + IK, KDF_401_A2.build(sn_id, sqn_x_ak), None, None, {}]
+        # [KeNB, KeNB HMAC key states, {(alg dist, alg id): key}]
+        self._kenb  = None
+    
+    def _set_config(self, ul_nas_cnt, eea, eia):
+        if not 0 <= ul_nas_cnt < 16777216 or not 0 <= eea < 256 or not 0 <= eia < 256:
+            raise(CMException('EPSKeySet: invalid args'))
+        self._ul_nas_cnt, self._eea, self._eia = ul_nas_cnt, eea, eia
+    
+    def _get_kdf_kasme(self):
+        kasme = self._kasme
+        if kasme[3] is None:
+            kasme[2] = KDF(kasme[0], kasme[1])
+            kasme[3] = KDFKey(kasme[2])
+        return kasme[3]
+    
+    def _get_kenb(self):
+        if self._kenb is None:
+            KeNB = self._get_kdf_kasme().derive(KDF_401_A3.build(self._ul_nas_cnt))
+            self._kenb = [KeNB, KDFKey(KeNB), {}]
+        return self._kenb
+    
+    @property
+    def KASME(self):
+        """K_ASME [32 bytes buffer]"""
+        self._get_kdf_kasme()
+        return self._kasme[2]
+    
+    @property
+    def KeNB(self):
+        """K_eNB [32 bytes buffer], for the UL NAS count of the key set"""
+        return self._get_kenb()[0]
+    
+    @property
+    def ul_nas_cnt(self):
+        return self._ul_nas_cnt
+    
+    @property
+    def eea(self):
+        return self._eea
+    
+    @property
+    def eia(self):
+        return self._eia
+    
+    def nas_key(self, alg_dist, alg_id):
+        """return the NAS key [32 bytes buffer] derived from KASME for
+            algorithm dist [uint8] and algorithm id [uint8]
+        """
+        keys, key = self._kasme[4], (alg_dist, alg_id)
+        if key not in keys:
+            if not 0 <= alg_dist < 256 or not 0 <= alg_id < 256:
+                raise(CMException('EPSKeySet.nas_key: invalid args'))
+            keys[key] = self._get_kdf_kasme().derive(KDF_401_A7.build(alg_dist, alg_id))
+        return keys[key]
+    
+    def as_key(self, alg_dist, alg_id):
+        """return the RRC or UP key [32 bytes buffer] derived from KeNB for
+            algorithm dist [uint8] and algorithm id [uint8]
+        """
+        kenb = self._get_kenb()
+        keys, key = kenb[2], (alg_dist, alg_id)
+        if key not in keys:
+            if not 0 <= alg_dist < 256 or not 0 <= alg_id < 256:
+                raise(CMException('EPSKeySet.as_key: invalid args'))
+            keys[key] = kenb[1].derive(KDF_401_A7.build(alg_dist, alg_id))
+        return keys[key]
+    
+    @property
+    def KNASenc(self):
+        """K_NASenc [32 bytes buffer], for the EEA of the key set"""
+        return self.nas_key(self.NAS_ENC, self._eea)
+    
+    @property
+    def KNASint(self):
+        """K_NASint [32 bytes buffer], for the EIA of the key set"""
+        return self.nas_key(self.NAS_INT, self._eia)
+    
+    @property
+    def KRRCenc(self):
+        """K_RRCenc [32 bytes buffer], for the EEA of the key set"""
+        return self.as_key(self.RRC_ENC, self._eea)
+    
+    @property
+    def KRRCint(self):
+        """K_RRCint [32 bytes buffer], for the EIA of the key set"""
+        return self.as_key(self.RRC_INT, self._eia)
+    
+    @property
+    def KUPenc(self):
+        """K_UPenc [32 bytes buffer], for the EEA of the key set"""
+        return self.as_key(self.UP_ENC, self._eea)
+    
+    def clone(self, ul_nas_cnt=None, eea=None, eia=None):
+        """return a new EPSKeySet for another UL NAS count and / or other algorithms,
+        the ones of the key set being kept when None
+        
+        KASME and the keys derived from it are shared with the initial key set,
+        and so are KeNB and the RRC / UP keys when the UL NAS count is kept
+        """
+        ks = self.__class__.__new__(self.__class__)
+        ks._set_config(self._ul_nas_cnt if ul_nas_cnt is None else ul_nas_cnt,
+                       self._eea if eea is None else eea,
+                       self._eia if eia is None else eia)
+        ks._kasme = self._kasme
+        if ks._ul_nas_cnt == self._ul_nas_cnt:
+            ks._kenb = self._kenb
+        else:
+            ks._kenb = None
+        return ks
+
+
+#------------------------------------------------------------------------------#
+# Next Hop chain
+#------------------------------------------------------------------------------#
+# see TS 33.501, section 6.9.2.1.1 and TS 33.401, section 7.2.8
+
+class NHChain(object):
+    """NH chain of a UE, for vertical key derivations at handover
+    
+    hop 0 is the initial K_gNB (or K_eNB), and each NH of the next hops is
+    derived from KAMF (or KASME) and the previous one (conv_501_A10, or
+    conv_401_A4 for EPS), the NH Chaining Counter NCC being the hop count
+    modulo 8
+    
+    NH are derived on demand or ahead with precompute(), and only the ones from
+    the current hop are kept
+    """
+    
+    __slots__ = ('_kdf', '_build', '_hop', '_chain')
+    
+    def __init__(self, K, KgNB, eps=False):
+        """K is KAMF, or KASME when eps is True, and KgNB is the initial K_gNB,
+        or K_eNB, [32 bytes buffer each]
+        
+        raise CMException on invalid args
+        """
+        if len(K) != 32 or len(KgNB) != 32:
+            raise(CMException('NHChain: invalid args'))
+        self._kdf   = KDFKey(K)
+        # KDF input template of conv_401_A4 or conv_501_A10
+        self._build = KDF_401_A4.build if eps else KDF_501_A10.build
+        self._hop   = 0
+        # NH from the current hop
+        self._chain = [bytes(KgNB)]
+    
+    @property
+    def hop(self):
+        """current hop count"""
+        return self._hop
+    
+    @property
+    def NCC(self):
+        """current NH Chaining Counter [uint3]"""
+        return self._hop & 7
+    
+    @property
+    def NH(self):
+        """NH [32 bytes buffer] of the current hop, the initial K_gNB for hop 0"""
+        return self._chain[0]
+    
+    def precompute(self, num=8):
+        """derive the NH of the num hops following the current one
+        """
+        chain, derive, build = self._chain, self._kdf.derive, self._build
+        while len(chain) <= num:
+            chain.append(derive(build(chain[-1])))
+    
+    def get(self, hop):
+        """return the NH [32 bytes buffer] of the given hop, not before the current one
+        """
+        if hop < self._hop:
+            raise(CMException('NHChain.get: hop %i already passed' % hop))
+        self.precompute(hop - self._hop)
+        return self._chain[hop - self._hop]
+    
+    def lookup(self, ncc):
+        """return the first hop from the current one with the given NCC [uint3],
+        and its NH [32 bytes buffer]
+        """
+        if not 0 <= ncc <= 7:
+            raise(CMException('NHChain.lookup: invalid NCC'))
+        hop = self._hop + ((ncc - self._hop) & 7)
+        return hop, self.get(hop)
+    
+    def advance(self, num=1):
+        """move num hops forward, and return the NCC and NH of the new current hop
+        
+        raise CMException if num is negative
+        """
+        if num < 0:
+            raise(CMException('NHChain.advance: invalid number of hops %r' % (num, )))
+        elif num == 0:
+            return self._hop & 7, self._chain[0]
+        self.precompute(num)
+        self._hop += num
+        del self._chain[:num]
+        return self._hop & 7, self._chain[0]
+    
+    def sync(self, ncc):
+        """move forward to the first hop with the given NCC [uint3], and return its NH,
+        e.g. for a UE receiving NCC in a handover command
+        """
+        hop, NH = self.lookup(ncc)
+        self.advance(hop - self._hop)
+        return NH
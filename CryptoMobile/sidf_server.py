@@ -0,0 +1,316 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.4
+# *
+# * Copyright 2020. Benoit Michau. P1Sec.
+# *
+# *--------------------------------------------------------
+# * File Name : CryptoMobile/sidf_server.py
+# * Created : 2026-10-19
+# * Authors : Benoit Michau
+# *--------------------------------------------------------
+#*/
+
+import asyncio
+from struct             import Struct
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import *
+from .ECIES import ECIESKeyRegistry
+
+
+__all__ = [
+    'SIDFServer',
+    'SIDFClient',
+    'STATUS_OK',
+    'STATUS_UNKNOWN_KEY',
+    'STATUS_FAILURE',
+    'STATUS_MALFORMED',
+    ]
+
+
+#------------------------------------------------------------------------------#
+# CryptoMobile python toolkit
+# asyncio SUCI deconcealment service (SIDF), built on ECIESKeyRegistry
+#------------------------------------------------------------------------------#
+# All messages are framed with a 4 bytes big endian length prefix, followed by:
+# - request : req_id [uint32] || protection scheme id [uint8, 1: profile A, 2: profile B] ||
+#             HN public key id [uint8] || scheme output (UE ephemeral pubkey || ciphertext || MAC)
+# - response: req_id [uint32] || status [uint8] || cleartext (when status is STATUS_OK)
+#
+# Requests are pipelined: a client can send many of them on a connection without
+# waiting, responses being matched with their req_id.
+# The server coalesces requests of all connections into micro-batches, which
+# are deconcealed with ECIESKeyRegistry.unprotect_batch() outside of the event loop.
+
+STATUS_OK          = 0
+STATUS_UNKNOWN_KEY = 1 # no HN private key for the scheme id / key id
+STATUS_FAILURE     = 2 # invalid UE public key or MAC verification failure
+STATUS_MALFORMED   = 3 # invalid request
+
+_LEN      = Struct('>I')
+_REQ      = Struct('>IBB')
+_RESP     = Struct('>IIB') # with the length prefix
+_RESP_HDR = Struct('>IB')
+
+# ECIES profile and UE ephemeral public key length, per protection scheme id
+_SCHEMES = {1: ('A', 32), 2: ('B', 33)}
+
+# ECIES MAC tag length
+_MAC_LEN = 8
+
+# max request length, larger ones make the server drop the connection
+MAX_REQ_LEN = 4096
+
+
+def _parse_request(buf):
+    # return the req_id and the (profile, key_id, ue_pubkey, ciphertext, mac) item,
+    # or None instead of the item when malformed (e.g. without ciphertext)
+    req_id, scheme_id, key_id = _REQ.unpack_from(buf)
+    if scheme_id not in _SCHEMES:
+        return req_id, None
+    profile, pk_len = _SCHEMES[scheme_id]
+    if len(buf) <= _REQ.size + pk_len + _MAC_LEN:
+        return req_id, None
+    buf = memoryview(buf)
+    return req_id, (profile, key_id,
+                    bytes(buf[_REQ.size:_REQ.size+pk_len]),
+                    bytes(buf[_REQ.size+pk_len:-_MAC_LEN]),
+                    bytes(buf[-_MAC_LEN:]))
+
+
+class SIDFServer(object):
+    """SIDFServer serves SUCI deconcealment requests over a Unix domain socket or
+    a TCP socket, with the HN private keys of an ECIESKeyRegistry
+    
+    requests from all connections are coalesced into micro-batches of up to max_batch
+    items, waiting at most max_delay seconds for a batch to fill; each batch is
+    processed in a separate thread with the registry unprotect_batch() method,
+    which runs on a pool of workers when workers > 1; all requests of a failing
+    batch are answered with STATUS_FAILURE
+    
+    each connection has at most max_pending requests being processed, further
+    ones not being read until responses are sent and flushed to the client
+    
+    close() answers the requests still queued or being processed with STATUS_FAILURE,
+    then closes all connections
+    """
+    
+    def __init__(self, registry, max_batch=256, max_delay=0.0005, workers=None,
+                 pool='process', chunk=64, max_pending=1024):
+        if not isinstance(registry, ECIESKeyRegistry):
+            raise(CMException('invalid registry'))
+        self.registry  = registry
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.workers, self.pool, self.chunk = workers, pool, chunk
+        self.max_pending = max_pending
+        self.stats     = {'requests': 0, 'batches': 0, 'malformed': 0, 'errors': 0}
+        self._server, self._batcher, self._queue, self._executor = None, None, None, None
+        # writers of the accepted connections
+        self._writers = set()
+    
+    async def start_unix(self, path):
+        """starts serving on the Unix domain socket path
+        """
+        self._start()
+        self._server = await asyncio.start_unix_server(self._handle, path=path)
+    
+    async def start_tcp(self, host='127.0.0.1', port=0):
+        """starts serving on the TCP host and port, and returns the port
+        """
+        self._start()
+        self._server = await asyncio.start_server(self._handle, host=host, port=port)
+        return self._server.sockets[0].getsockname()[1]
+    
+    def _start(self):
+        if self._server is not None:
+            raise(CMException('server already started'))
+        self._queue    = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(1)
+        self._batcher  = asyncio.ensure_future(self._run_batches())
+    
+    async def close(self):
+        """stops serving and closes all connections
+        """
+        if self._server is not None:
+            self._server.close()
+            # the batch being processed is answered by the batch task when cancelled
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            queue = self._queue
+            while not queue.empty():
+                self._respond([queue.get_nowait()], [(STATUS_FAILURE, b'')])
+            # responses are flushed before the transports are closed, which
+            # ends the connection handlers
+            for writer in self._writers:
+                writer.close()
+            await self._server.wait_closed()
+            # a batch still running in the executor thread is not waited for
+            self._executor.shutdown(wait=False)
+            self._server, self._batcher, self._queue, self._executor = None, None, None, None
+    
+    async def _handle(self, reader, writer):
+        # read the requests of a connection, and push them to the batch queue
+        queue, stats = self._queue, self.stats
+        # released by the batch task when responding
+        pending = asyncio.Semaphore(self.max_pending)
+        self._writers.add(writer)
+        try:
+            while True:
+                length, = _LEN.unpack(await reader.readexactly(4))
+                if not _REQ.size <= length <= MAX_REQ_LEN:
+                    break
+                req_id, item = _parse_request(await reader.readexactly(length))
+                stats['requests'] += 1
+                if item is None:
+                    stats['malformed'] += 1
+                    writer.write(_RESP.pack(5, req_id, STATUS_MALFORMED))
+                else:
+                    await pending.acquire()
+                    queue.put_nowait((writer, pending, req_id, item))
+                # stop reading while the client does not read its responses
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+    
+    async def _run_batches(self):
+        loop, queue, stats = asyncio.get_running_loop(), self._queue, self.stats
+        while True:
+            batch = [await queue.get()]
+            # take all pending requests, and wait for more ones once, at most max_delay
+            for wait in (True, False):
+                while len(batch) < self.max_batch and not queue.empty():
+                    batch.append(queue.get_nowait())
+                if not wait or len(batch) >= self.max_batch or not self.max_delay:
+                    break
+                await asyncio.sleep(self.max_delay)
+            stats['batches'] += 1
+            try:
+                res = await loop.run_in_executor(self._executor, self._unprotect_batch,
+                                                 [item for _, _, _, item in batch])
+            except asyncio.CancelledError:
+                # server closing
+                self._respond(batch, [(STATUS_FAILURE, b'')] * len(batch))
+                raise
+            except Exception:
+                # keep serving the next batches
+                stats['errors'] += 1
+                res = [(STATUS_FAILURE, b'')] * len(batch)
+            self._respond(batch, res)
+    
+    def _respond(self, batch, res):
+        # write the (status, cleartext) response of each queued request
+        for (writer, pending, req_id, _), (status, cleartext) in zip(batch, res):
+            if not writer.is_closing():
+                writer.write(_RESP.pack(5 + len(cleartext), req_id, status) + cleartext)
+            pending.release()
+    
+    def _unprotect_batch(self, items):
+        # return a (status, cleartext) pair per item
+        registry = self.registry
+        keys = set(registry.keys())
+        res = registry.unprotect_batch(items, self.workers, self.pool, self.chunk)
+        return [(STATUS_OK, cleartext) if cleartext is not None else \
+                (STATUS_FAILURE if item[:2] in keys else STATUS_UNKNOWN_KEY, b'') \
+                for item, cleartext in zip(items, res)]
+
+
+class _SIDFConnection(object):
+    # single client connection, with its pending requests futures per req_id
+    
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self.pending = {}
+        self.task = asyncio.ensure_future(self._read())
+    
+    async def _read(self):
+        pending = self.pending
+        try:
+            while True:
+                length, = _LEN.unpack(await self.reader.readexactly(4))
+                buf = await self.reader.readexactly(length)
+                req_id, status = _RESP_HDR.unpack_from(buf)
+                fut = pending.pop(req_id, None)
+                if fut is not None and not fut.done():
+                    fut.set_result((status, buf[5:]))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(CMException('SIDF connection closed'))
+            pending.clear()
+    
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+
+class SIDFClient(object):
+    """SIDFClient sends SUCI deconcealment requests to a SIDFServer, pipelined over
+    a pool of connections to a Unix domain socket path or a TCP host and port
+    """
+    
+    def __init__(self, path=None, host='127.0.0.1', port=None, connections=4):
+        if path is None and port is None:
+            raise(CMException('path or port required'))
+        self.path, self.host, self.port = path, host, port
+        self.connections = connections
+        self._conns, self._next, self._req_id = [], 0, 0
+    
+    async def connect(self):
+        """opens the pool of connections
+        """
+        for i in range(self.connections):
+            if self.path is not None:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            else:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            self._conns.append(_SIDFConnection(reader, writer))
+    
+    async def close(self):
+        """closes the pool of connections
+        """
+        conns, self._conns = self._conns, []
+        for conn in conns:
+            await conn.close()
+    
+    async def deconceal(self, scheme_id, key_id, scheme_output):
+        """sends a deconcealment request for the given protection scheme id
+        [uint8, 1: profile A, 2: profile B], HN public key id [uint8] and scheme output
+        (UE ephemeral public key || ciphertext || MAC) [bytes buffer]
+    
+        returns the status [uint8, STATUS_*] and the cleartext [bytes buffer]
+        or raises CMException if the connection is closed
+        """
+        if not self._conns:
+            raise(CMException('SIDF client not connected'))
+        conn = self._conns[self._next]
+        self._next = (self._next + 1) % len(self._conns)
+        if conn.task.done():
+            # responses are not read anymore, e.g. after the server closed the connection
+            raise(CMException('SIDF connection closed'))
+        self._req_id = req_id = (self._req_id + 1) & 0xffffffff
+        fut = asyncio.get_running_loop().create_future()
+        conn.pending[req_id] = fut
+        conn.writer.write(_LEN.pack(_REQ.size + len(scheme_output)) + \
+                          _REQ.pack(req_id, scheme_id, key_id) + scheme_output)
+        await conn.writer.drain()
+        return await fut
+    
+    async def deconceal_many(self, requests):
+        """sends all (scheme_id, key_id, scheme_output) requests at once, and returns
+        the list of (status, cleartext) responses, in order
+        """
+        return await asyncio.gather(*[self.deconceal(*req) for req in requests])
@@ -0,0 +1,344 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.4
+# *
+# * Copyright 2020. Benoit Michau. P1Sec.
+# *
+# *--------------------------------------------------------
+# * File Name : CryptoMobile/suci_load.py
+# * Created : 2026-10-19
+# * Authors : Benoit Michau
+# *--------------------------------------------------------
+#*/
+
+import json
+import math
+import random
+from time               import perf_counter
+from struct             import Struct
+from binascii           import unhexlify
+from collections        import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .utils import *
+from .ECIES import ECIES_UE, ECIES_HN
+
+
+__all__ = [
+    'TEST_HN_KEYS',
+    'SCHEME_IDS',
+    'SUPIDistribution',
+    'SUCIGenerator',
+    'write_file',
+    'read_file',
+    'run_benchmark',
+    ]
+
+
+#------------------------------------------------------------------------------#
+# CryptoMobile python toolkit
+# SUCI load generator and deconcealment benchmark, for sizing SIDF deployments
+#------------------------------------------------------------------------------#
+# Each generated SUCI is a (scheme_id, key_id, scheme_output, msin) 4-tuple, with
+# scheme_output being UE ephemeral pubkey || ciphertext || MAC, concealing the
+# BCD-encoded MSIN digit-string of an IMSI-based SUPI.
+#
+# SUCI files are made of a header, followed by records:
+# - header: magic b'SUCI' || version [uint8]
+# - record: scheme_id [uint8] || key_id [uint8] || MSIN length [uint8] ||
+#           scheme output length [uint16] || BCD-encoded MSIN || scheme output
+#
+# The module can be run to generate SUCI files and run benchmarks, e.g.:
+# python -m CryptoMobile.suci_load generate -n 1000000 -o suci.bin
+# python -m CryptoMobile.suci_load bench -i suci.bin --workers 1,2,4 --json bench.json
+
+# ECIES protection scheme id, per profile
+SCHEME_IDS = {'A': 1, 'B': 2}
+
+# HN keys of the TS 33.501 Annex C.4 test data, per profile: (key_id, private key, public key)
+TEST_HN_KEYS = {
+    'A': (1, unhexlify('c53c22208b61860b06c62e5406a7b330c2b577aa5558981510d128247d38bd1d'),
+             unhexlify('5a8d38864820197c3394b92613b20b91633cbd897119273bf8e4a6f4eec0a650')),
+    'B': (2, unhexlify('F1AB1074477EBCC7F554EA1C5FC368B1616730155E0041AC447D6301975FECDA'),
+             unhexlify('0272DA71976234CE833A6907425867B82E074D44EF907DFB4B3E21C1C2256EBCD1')),
+    }
+
+_FILE_MAGIC   = b'SUCI'
+_FILE_VERSION = 1
+_FILE_HDR     = Struct('>4sB')
+_FILE_REC     = Struct('>BBBH')
+
+
+class SUPIDistribution(object):
+    """SUPIDistribution draws the MSIN of IMSI-based SUPI among a population of
+    subscribers, numbered from first, according to kind:
+    - 'uniform'   : all subscribers being equally likely
+    - 'sequential': each subscriber in turn
+    - 'zipf'      : with a Zipf law of exponent zipf_s, the lowest subscriber
+                    numbers being the most frequent ones
+    """
+    
+    KINDS = ('uniform', 'sequential', 'zipf')
+    
+    def __init__(self, population=1000000, kind='uniform', msin_len=10, first=0, zipf_s=1.1):
+        if kind not in self.KINDS:
+            raise(CMException('unknown SUPI distribution %s' % kind))
+        if population < 1 or first + population > 10**msin_len:
+            raise(CMException('invalid population %r for %i digits MSIN' % (population, msin_len)))
+        if kind == 'zipf' and zipf_s <= 0:
+            raise(CMException('invalid Zipf exponent %r' % zipf_s))
+        self.population = population
+        self.kind       = kind
+        self.msin_len   = msin_len
+        self.first      = first
+        self.zipf_s     = zipf_s
+        self._fmt       = '%%0%ii' % msin_len
+    
+    def draw(self, rng, pos, num):
+        """returns a list of num MSIN digit-strings, drawn with the random.Random
+        instance rng, pos being the rank of the first one in the whole sequence
+        """
+        pop, fmt, first = self.population, self._fmt, self.first
+        if self.kind == 'uniform':
+            return [fmt % (first + rng.randrange(pop)) for i in range(num)]
+        elif self.kind == 'sequential':
+            return [fmt % (first + (pos + i) % pop) for i in range(num)]
+        else:
+            # continuous approximation of the inverse Zipf CDF
+            s, rand = self.zipf_s, rng.random
+            if s == 1:
+                ranks = [pop ** rand() for i in range(num)]
+            else:
+                e, m = 1.0 - s, pop ** (1.0 - s) - 1.0
+                ranks = [(rand() * m + 1.0) ** (1.0 / e) for i in range(num)]
+            return [fmt % (first + min(int(r) - 1, pop - 1)) for r in ranks]
+    
+    def _cfg(self):
+        return (self.population, self.kind, self.msin_len, self.first, self.zipf_s)
+
+
+def _generate_chunk(cfg, seed, pos, num):
+    # generate num SUCI, see SUCIGenerator.generate()
+    hn_keys, supi_cfg, profiles, weights, retransmit = cfg
+    rng = random.Random('%r/%i' % (seed, pos))
+    msins = SUPIDistribution(*supi_cfg).draw(rng, pos, num)
+    ues = dict([(p, ECIES_UE(profile=p)) for p in profiles])
+    recent, ret = deque(maxlen=1024), []
+    for msin, profile in zip(msins, rng.choices(profiles, weights, k=num)):
+        if recent and retransmit and rng.random() < retransmit:
+            # UE retransmitting a recent SUCI
+            ret.append(recent[rng.randrange(len(recent))])
+            continue
+        key_id, _, hn_pubkey = hn_keys[profile]
+        ue = ues[profile]
+        ue.generate_sharedkey(hn_pubkey)
+        rec = (SCHEME_IDS[profile], key_id, b''.join(ue.protect(encode_bcd(msin))), msin)
+        recent.append(rec)
+        ret.append(rec)
+    return ret
+
+
+class SUCIGenerator(object):
+    """SUCIGenerator generates SUCI of IMSI-based SUPI, drawn from a SUPIDistribution,
+    concealed with ECIES profiles A and / or B
+    
+    hn_keys is a dict of profile: (key_id, private key, public key), only public keys
+    being used; profiles is a dict of profile: weight, e.g. {'A': 3, 'B': 1};
+    retransmit is the ratio of SUCI which are a copy of a recent one, as sent by UE
+    retransmitting their registration request
+    
+    the sequence of SUPI, profiles and retransmissions is reproducible, given the seed,
+    whatever the number of workers (UE ephemeral keys being random)
+    """
+    
+    def __init__(self, hn_keys=TEST_HN_KEYS, supi=None, profiles=None, retransmit=0.0, seed=0):
+        if profiles is None:
+            profiles = dict([(p, 1) for p in hn_keys])
+        for p in profiles:
+            if p not in SCHEME_IDS or p not in hn_keys:
+                raise(CMException('no HN key for ECIES profile %s' % p))
+        if not 0.0 <= retransmit < 1.0:
+            raise(CMException('invalid retransmission ratio %r' % retransmit))
+        self.hn_keys    = hn_keys
+        self.supi       = supi if supi is not None else SUPIDistribution()
+        self.profiles   = profiles
+        self.retransmit = retransmit
+        self.seed       = seed
+    
+    def generate(self, num, workers=None, chunk=4096):
+        """yields num (scheme_id, key_id, scheme_output, msin) SUCI, generated by chunks,
+        in a pool of worker processes when workers > 1
+        """
+        profiles = sorted(self.profiles)
+        cfg = (dict([(p, self.hn_keys[p]) for p in profiles]), self.supi._cfg(), profiles,
+               [self.profiles[p] for p in profiles], self.retransmit)
+        chunks = [(pos, min(chunk, num - pos)) for pos in range(0, num, chunk)]
+        if not workers or workers < 2 or len(chunks) < 2:
+            for pos, cnt in chunks:
+                for rec in _generate_chunk(cfg, self.seed, pos, cnt):
+                    yield rec
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                for recs in pool.map(_generate_chunk, [cfg] * len(chunks),
+                                     [self.seed] * len(chunks), *zip(*chunks)):
+                    for rec in recs:
+                        yield rec
+
+
+def write_file(path, records):
+    """writes the (scheme_id, key_id, scheme_output, msin) SUCI records to the file
+    at path, and returns the number of records written
+    """
+    pack, cnt = _FILE_REC.pack, 0
+    with open(path, 'wb') as fd:
+        fd.write(_FILE_HDR.pack(_FILE_MAGIC, _FILE_VERSION))
+        for scheme_id, key_id, scheme_output, msin in records:
+            fd.write(pack(scheme_id, key_id, len(msin), len(scheme_output)) + \
+                     encode_bcd(msin) + scheme_output)
+            cnt += 1
+    return cnt
+
+
+def read_file(path):
+    """yields the (scheme_id, key_id, scheme_output, msin) SUCI records of the file
+    at path, or raises CMException if the file is invalid
+    """
+    unpack, rec_len = _FILE_REC.unpack_from, _FILE_REC.size
+    with open(path, 'rb') as fd:
+        buf = fd.read()
+    if buf[:_FILE_HDR.size] != _FILE_HDR.pack(_FILE_MAGIC, _FILE_VERSION):
+        raise(CMException('invalid SUCI file header'))
+    off, end, buf = _FILE_HDR.size, len(buf), memoryview(buf)
+    while off < end:
+        if off + rec_len > end:
+            raise(CMException('truncated SUCI file'))
+        scheme_id, key_id, msin_len, so_len = unpack(buf, off)
+        off += rec_len
+        bcd_len = (msin_len + 1) // 2
+        if off + bcd_len + so_len > end:
+            raise(CMException('truncated SUCI file'))
+        msin = decode_bcd(bytes(buf[off:off+bcd_len]))
+        off += bcd_len
+        yield scheme_id, key_id, bytes(buf[off:off+so_len]), msin
+        off += so_len
+
+
+def _percentile(values, p):
+    # nearest-rank percentile of sorted values
+    return values[max(0, min(len(values) - 1, int(math.ceil(p * len(values) / 100.0)) - 1))]
+
+
+def run_benchmark(records, hn_keys=TEST_HN_KEYS, workers=(1, ), batch=256, pool='process',
+                  chunk=64, sk_cache=0):
+    """deconceals the (scheme_id, key_id, scheme_output, msin) SUCI records, per ECIES
+    profile and number of workers, with ECIES_HN.deconceal_suci_batch() called on
+    successive batches of records, and an SK cache of sk_cache entries when not 0
+
+    returns a dict of results, which can be dumped to JSON; for each profile and
+    number of workers, it gives the throughput (SUCI per second), the batch latency
+    percentiles in milliseconds (per SUCI when batch is 1), and the number of
+    SUCI not deconcealed into their MSIN
+    """
+    records, results = list(records), []
+    for profile in sorted(hn_keys):
+        key_id, hn_privkey, _ = hn_keys[profile]
+        scheme_id = SCHEME_IDS[profile]
+        recs = [(so, msin) for sid, kid, so, msin in records if sid == scheme_id and kid == key_id]
+        if not recs:
+            continue
+        batches = [recs[i:i+batch] for i in range(0, len(recs), batch)]
+        for num in workers:
+            hn = ECIES_HN(hn_privkey, profile)
+            if sk_cache:
+                hn.set_sk_cache(sk_cache)
+            # start the pool of workers before measuring, with empty scheme outputs
+            # rejected before any computation
+            hn.deconceal_suci_batch([b''] * (num * chunk + 1), workers=num, pool=pool, chunk=chunk)
+            hn.reset_stats()
+            lat, errors = [], 0
+            T0 = perf_counter()
+            for b in batches:
+                t0 = perf_counter()
+                res = hn.deconceal_suci_batch([so for so, _ in b], workers=num, pool=pool,
+                                              chunk=chunk)
+                lat.append(perf_counter() - t0)
+                errors += sum([1 for r, (_, msin) in zip(res, b) if r != msin])
+            T = perf_counter() - T0
+            hn.close()
+            lat.sort()
+            results.append({
+                'profile'   : profile,
+                'workers'   : num,
+                'suci'      : len(recs),
+                'errors'    : errors,
+                'seconds'   : T,
+                'throughput': len(recs) / T if T else 0.0,
+                'latency_ms': dict([('p%i' % p, 1000 * _percentile(lat, p)) for p in (50, 90, 99)] + \
+                                   [('max', 1000 * lat[-1])]),
+                'stats'     : dict(hn.stats),
+                'sk_cache'  : hn.sk_cache_info(),
+                })
+    return {
+        'config' : {'batch': batch, 'pool': pool, 'chunk': chunk, 'sk_cache': sk_cache,
+                    'workers': list(workers)},
+        'results': results,
+        }
+
+
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m CryptoMobile.suci_load',
+                                     description='SUCI load generator and deconcealment benchmark')
+    subparsers = parser.add_subparsers(dest='cmd')
+    subparsers.required = True
+    gen_parser = argparse.ArgumentParser(add_help=False)
+    gen_parser.add_argument('-n', '--num', type=int, default=10000, help='number of SUCI')
+    gen_parser.add_argument('--profiles', default='A,B', help='ECIES profiles, e.g. A:3,B:1')
+    gen_parser.add_argument('--population', type=int, default=1000000, help='number of subscribers')
+    gen_parser.add_argument('--dist', choices=SUPIDistribution.KINDS, default='uniform',
+                            help='SUPI distribution')
+    gen_parser.add_argument('--zipf-s', type=float, default=1.1, help='Zipf exponent')
+    gen_parser.add_argument('--msin-len', type=int, default=10, help='number of MSIN digits')
+    gen_parser.add_argument('--retransmit', type=float, default=0.0, help='retransmitted SUCI ratio')
+    gen_parser.add_argument('--seed', type=int, default=0, help='random seed')
+    gen_parser.add_argument('--gen-workers', type=int, default=None,
+                            help='number of generating processes')
+    p = subparsers.add_parser('generate', parents=[gen_parser], help='generate a SUCI file')
+    p.add_argument('-o', '--output', required=True, help='SUCI file')
+    p = subparsers.add_parser('bench', parents=[gen_parser], help='run a deconcealment benchmark')
+    p.add_argument('-i', '--input', default=None, help='SUCI file, instead of generating SUCI')
+    p.add_argument('--workers', default='1', help='numbers of workers, e.g. 1,2,4')
+    p.add_argument('--batch', type=int, default=256, help='deconcealment batch size')
+    p.add_argument('--pool', choices=('process', 'thread'), default='process', help='pool kind')
+    p.add_argument('--chunk', type=int, default=64, help='items per worker task')
+    p.add_argument('--sk-cache', type=int, default=0, help='SK cache size')
+    p.add_argument('--json', default=None, help='JSON output file, instead of stdout')
+    args = parser.parse_args(args)
+    #
+    if args.cmd == 'generate' or args.input is None:
+        profiles = {}
+        for prof in args.profiles.split(','):
+            prof, _, weight = prof.partition(':')
+            profiles[prof] = float(weight) if weight else 1.0
+        gen = SUCIGenerator(supi=SUPIDistribution(args.population, args.dist, args.msin_len,
+                                                  zipf_s=args.zipf_s),
+                            profiles=profiles, retransmit=args.retransmit, seed=args.seed)
+        records = gen.generate(args.num, workers=args.gen_workers)
+    else:
+        records = read_file(args.input)
+    if args.cmd == 'generate':
+        print('%i SUCI written to %s' % (write_file(args.output, records), args.output))
+        return
+    res = run_benchmark(records, workers=[int(w) for w in args.workers.split(',')],
+                        batch=args.batch, pool=args.pool, chunk=args.chunk,
+                        sk_cache=args.sk_cache)
+    if args.json:
+        with open(args.json, 'w') as fd:
+            json.dump(res, fd, indent=2)
+    else:
+        print(json.dumps(res, indent=2))
+
+
+if __name__ == '__main__':
+    main()
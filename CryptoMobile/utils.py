@@ -13,6 +13,7 @@
 #*/
 
 import sys
+from binascii import hexlify, unhexlify
 if sys.version_info[0] < 3:
     py_vers = 2
     int_types = (int, long)
@@ -61,3 +62,26 @@ def log(level='DBG', msg=''):
     # log wrapper
     print('[%s] %s' % (level, msg))
 
+
+# BCD digits swap, for the MSIN of IMSI-based SUPI
+_BCD_SWAP = bytes(bytearray(((x & 0xf) << 4) | (x >> 4) for x in range(256)))
+
+
+def encode_bcd(digits):
+    """return the BCD-encoded buffer of the digit-string, with a final 0xf filler
+    when of odd length
+    """
+    if len(digits) % 2:
+        digits += 'f'
+    return unhexlify(digits).translate(_BCD_SWAP)
+
+
+def decode_bcd(buf):
+    """return the digit-string of the BCD-encoded buffer, without the final 0xf
+    filler, or None when not decimal
+    """
+    digits = hexlify(buf.translate(_BCD_SWAP)).decode()
+    if digits[-1:] == 'f':
+        digits = digits[:-1]
+    return digits if digits.isdigit() else None
+
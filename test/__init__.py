@@ -26,6 +26,8 @@
 # *--------------------------------------------------------
 #*/
 #
-__all__ = ['test_CM', 'test_Milenage', 'test_TUAK', 'test_ECIES', 'test_CryptoMobile']
+__all__ = ['test_CM', 'test_Milenage', 'test_TUAK', 'test_ECIES', 'test_conv', 'test_sidf_server',
+           'test_suci_load', 'test_context',
+           'test_CryptoMobile']
 __version__ = '0.3'
 
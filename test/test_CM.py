@@ -39,6 +39,7 @@
 # - SNOW3G (UEA2, UIA2, EEA1, EIA1)
 # - ZUC (EEA3, EIA3)
 # - AES (EEA2, EIA2) - from pycrypto
+# - fused encryption / integrity protection (F8F9, EEAx_EIAx), against the former
 #######################################################
 
 from time import time
@@ -775,11 +776,79 @@ def aes_testsets():
             aes_EIA2_testset_7() & aes_EIA2_testset_8()
 
 
+###
+# F8F9, EEAx_EIAx: checked against the F8 / F9, EEAx / EIAx functions, for both modes
+###
+
+_protect_key_enc = b'\x2b\xd6\x45\x9f\x82\xc5\xb3\x00\x95\x2c\x49\x10\x48\x81\xff\x48'
+_protect_key_int = b'\xc7\x36\xc6\xaa\xb2\x2b\xff\xf9\x1e\x26\x98\xd2\xe2\x2a\xd5\x7e'
+_protect_data    = bytes(bytearray(range(100)))
+
+def _protect_testset(protect, enc, mac, count, bearer, direct):
+    # enc(data_in) and mac(data_in) are bound to the keys and parameters
+    # (empty messages are not checked, as SNOW 3G F9 does not support them)
+    ret = True
+    for length, offset in ((1, 0), (1, 1), (5, 2), (8, 3), (17, 0), (64, 12), (100, 3)):
+        data = _protect_data[:length]
+        ciph = data[offset:]
+        ret &= protect(_protect_key_enc, _protect_key_int, count, bearer, direct,
+                       data, offset, 0) == data[:offset] + enc(ciph + mac(data))
+        if ciph:
+            ciph = enc(ciph)
+        ret &= protect(_protect_key_enc, _protect_key_int, count, bearer, direct,
+                       data, offset, 1) == mac(data[:offset] + ciph) + data[:offset] + ciph
+    return ret
+
+def kasumi_F8F9_testset():
+    kas     = KASUMI()
+    count, bearer, fresh, direct = 0x72a4f20f, 0xc, 0x05d2ec49, 1
+    return _protect_testset(
+        lambda ck, ik, count, bearer, direct, data, offset, mode: \
+            kas.F8F9(ck, ik, count, bearer, fresh, direct, data, offset, mode),
+        lambda data: kas.F8(_protect_key_enc, count, bearer, direct, data),
+        lambda data: kas.F9(_protect_key_int, count, fresh, direct, data),
+        count, bearer, direct)
+
+def snow3g_EEA1_EIA1_testset():
+    snow    = SNOW3G()
+    count, bearer, direct = 0x398a59b4, 0x15, 0
+    return _protect_testset(
+        snow.EEA1_EIA1,
+        lambda data: snow.EEA1(_protect_key_enc, count, bearer, direct, data),
+        lambda data: snow.EIA1(_protect_key_int, count, bearer, direct, data),
+        count, bearer, direct)
+
+def zuc_EEA3_EIA3_testset():
+    zuc     = ZUC()
+    count, bearer, direct = 0x561eb2dd, 0x1c, 0
+    return _protect_testset(
+        zuc.EEA3_EIA3,
+        lambda data: zuc.EEA3(_protect_key_enc, count, bearer, direct, data),
+        lambda data: zuc.EIA3(_protect_key_int, count, bearer, direct, data),
+        count, bearer, direct)
+
+def aes_EEA2_EIA2_testset():
+    aes3gpp = AES_3GPP()
+    count, bearer, direct = 0x7827fab2, 0x5, 1
+    return _protect_testset(
+        aes3gpp.EEA2_EIA2,
+        lambda data: aes3gpp.EEA2(_protect_key_enc, count, bearer, direct, data),
+        lambda data: aes3gpp.EIA2(_protect_key_int, count, bearer, direct, data),
+        count, bearer, direct)
+
+def protect_testsets():
+    ret = kasumi_F8F9_testset() & snow3g_EEA1_EIA1_testset() & zuc_EEA3_EIA3_testset()
+    if _with_aes:
+        ret &= aes_EEA2_EIA2_testset()
+    return ret
+
+
 def testall():
     if _with_aes:
-        return kasumi_testsets() & snow3g_testsets() & zuc_testsets() & aes_testsets()
+        return kasumi_testsets() & snow3g_testsets() & zuc_testsets() & aes_testsets() & \
+               protect_testsets()
     else:
-        return kasumi_testsets() & snow3g_testsets() & zuc_testsets()
+        return kasumi_testsets() & snow3g_testsets() & zuc_testsets() & protect_testsets()
 
 
 def testperf():
@@ -37,6 +37,14 @@ from test.test_TUAK     import (
     test_TUAK,
     testperf as testperf_TUAK
     )
+from test.test_conv     import (
+    test_conv,
+    testperf as testperf_conv
+    )
+from test.test_context  import (
+    test_context,
+    testperf as testperf_context
+    )
 try:
     from test.test_Milenage import (
         test_Milenage,
@@ -51,6 +59,14 @@ else:
             test_ECIES,
             testperf as testperf_ECIES
             )
+        from test.test_sidf_server import (
+            test_sidf_server,
+            testperf as testperf_sidf_server
+            )
+        from test.test_suci_load import (
+            test_suci_load,
+            testperf as testperf_suci_load
+            )
     except ImportError:
         _with_ec = False
     else:
@@ -68,6 +84,14 @@ class TestCryptoMobile(unittest.TestCase):
         print('[<>] testing CryptoMobile.TUAK')
         test_TUAK()
     
+    def test_conv(self):
+        print('[<>] testing CryptoMobile.conv')
+        test_conv()
+    
+    def test_context(self):
+        print('[<>] testing CryptoMobile.context')
+        test_context()
+    
     if _with_aes:
         
         def test_milenage(self):
@@ -79,12 +103,24 @@ class TestCryptoMobile(unittest.TestCase):
             def test_ecies(self):
                 print('[<>] testing CryptoMobile.ECIES')
                 test_ECIES()
+            
+            def test_sidf_server(self):
+                print('[<>] testing CryptoMobile.sidf_server')
+                test_sidf_server()
+            
+            def test_suci_load(self):
+                print('[<>] testing CryptoMobile.suci_load')
+                test_suci_load()
 
 
 if __name__ == '__main__':
     testperf_CM()
     testperf_TUAK()
+    testperf_conv()
+    testperf_context()
     if _with_aes:
         testperf_Milenage()
         if _with_ec:
             testperf_ECIES()
+            testperf_sidf_server()
+            testperf_suci_load()
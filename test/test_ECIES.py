@@ -34,11 +34,13 @@
 #######################################################
 
 from time     import time
+from threading import Thread
 from binascii import unhexlify
 
 from cryptography.hazmat.primitives.asymmetric.x25519   import X25519PrivateKey
 from cryptography.hazmat.primitives import serialization
 from CryptoMobile.ECIES import *
+from CryptoMobile.utils import CMException
 from CryptoMobile.EC    import (
     X25519,
     ECDH_SECP256R1, 
@@ -117,8 +119,173 @@ def test_profileB():
     ue_ct == ciphertext and ue_mac == mactag and hn_ct == plaintext
 
 
+# batch unprotection, in order, with invalid MAC and public key
+def test_unprotect_batch():
+    hn_privkey  = unhexlify('c53c22208b61860b06c62e5406a7b330c2b577aa5558981510d128247d38bd1d')
+    hn_pubkey   = unhexlify('5a8d38864820197c3394b92613b20b91633cbd897119273bf8e4a6f4eec0a650')
+    ue = ECIES_UE(profile='A')
+    hn = ECIES_HN(profile='A', hn_priv_key=hn_privkey)
+    plaintexts, items = [], []
+    for i in range(10):
+        ue.generate_sharedkey(hn_pubkey)
+        plaintexts.append(unhexlify('0001208%i' % i))
+        items.append(ue.protect(plaintexts[-1]))
+    items[3] = (items[3][0], items[3][1], 8*b'\0')
+    items[7] = (5*b'\0', items[7][1], items[7][2])
+    plaintexts[3], plaintexts[7] = None, None
+    ret = hn.unprotect_batch(items) == plaintexts and \
+          hn.stats == {'ok': 8, 'mac': 1, 'pubkey': 1, 'format': 0}
+    hn.reset_stats()
+    ret &= hn.unprotect_batch(items, workers=2, pool='thread', chunk=3) == plaintexts and \
+           hn.unprotect_batch(items[::-1], workers=2, pool='thread', chunk=3) == plaintexts[::-1] and \
+           hn.stats == {'ok': 16, 'mac': 2, 'pubkey': 2, 'format': 0}
+    hn.close()
+    return ret and hn._pool is None
+
+
+# routing of SUCI to the HN keys of a registry, with key rotation
+def test_key_registry():
+    hn_privkey_a = unhexlify('c53c22208b61860b06c62e5406a7b330c2b577aa5558981510d128247d38bd1d')
+    hn_pubkey_a  = unhexlify('5a8d38864820197c3394b92613b20b91633cbd897119273bf8e4a6f4eec0a650')
+    hn_privkey_b = unhexlify('F1AB1074477EBCC7F554EA1C5FC368B1616730155E0041AC447D6301975FECDA')
+    hn_pubkey_b  = unhexlify('0272DA71976234CE833A6907425867B82E074D44EF907DFB4B3E21C1C2256EBCD1')
+    plaintext    = unhexlify('00012080f6')
+    #
+    reg = ECIESKeyRegistry([('A', 1, hn_privkey_a), ('B', 2, hn_privkey_b)])
+    ue_a, ue_b = ECIES_UE(profile='A'), ECIES_UE(profile='B')
+    ue_a.generate_sharedkey(hn_pubkey_a)
+    ue_b.generate_sharedkey(hn_pubkey_b)
+    suci_a, suci_b = ue_a.protect(plaintext), ue_b.protect(plaintext)
+    hn_a = reg.get('A', 1)
+    ret = sorted(reg.keys()) == [('A', 1), ('B', 2)] and \
+          reg.unprotect('A', 1, *suci_a) == plaintext and reg.unprotect('B', 2, *suci_b) == plaintext and \
+          reg.unprotect('B', 1, *suci_a) is None and reg.unprotect('A', 1, *suci_b) is None and \
+          reg.unprotect_batch([('A', 1) + suci_a, ('B', 2) + suci_b, ('A', 3) + suci_a]) == \
+            [plaintext, plaintext, None] and reg.unknown == 2 and \
+          reg.get_stats() == {('A', 1): {'ok': 2, 'mac': 0, 'pubkey': 1, 'format': 0},
+                              ('B', 2): {'ok': 2, 'mac': 0, 'pubkey': 0, 'format': 0}}
+    # the new key is used for id 3, the removed one is returned
+    ret &= reg.rotate('A', 3, hn_privkey_a, 1) is hn_a and sorted(reg.keys()) == [('A', 3), ('B', 2)] and \
+           reg.unprotect('A', 3, *suci_a) == plaintext and reg.unprotect('A', 1, *suci_a) is None and \
+           reg.remove('B', 2) is not None and reg.remove('B', 2) is None and reg.keys() == [('A', 3)]
+    # replaced instances are returned too, when re-adding or rotating in place a key id
+    hn_a3 = reg.get('A', 3)
+    ret &= reg.add('A', 3, hn_privkey_a) is hn_a3 and reg.add('A', 4, hn_privkey_a) is None
+    hn_a3 = reg.get('A', 3)
+    ret &= reg.rotate('A', 3, hn_privkey_a, 3) is hn_a3 and reg.get('A', 3) is not hn_a3 and \
+           reg.unprotect('A', 3, *suci_a) == plaintext
+    # rotating to another registered key id would drop it silently
+    hn_a3, hn_a4 = reg.get('A', 3), reg.get('A', 4)
+    try:
+        reg.rotate('A', 4, hn_privkey_a, 3)
+    except CMException:
+        ret &= reg.get('A', 3) is hn_a3 and reg.get('A', 4) is hn_a4
+    else:
+        return False
+    reg.close()
+    try:
+        reg.get('B', 2)
+    except CMException:
+        return ret
+    else:
+        return False
+
+
+# UE ephemeral keypairs taken from a pre-generated pool
+def test_keypool():
+    hn_privkey  = unhexlify('c53c22208b61860b06c62e5406a7b330c2b577aa5558981510d128247d38bd1d')
+    hn_pubkey   = unhexlify('5a8d38864820197c3394b92613b20b91633cbd897119273bf8e4a6f4eec0a650')
+    plaintext   = unhexlify('00012080f6')
+    hn = ECIES_HN(profile='A', hn_priv_key=hn_privkey)
+    # without the background thread, keypairs are generated on demand
+    pool = EphemeralKeyPool('A', low=2, high=4, start=False)
+    ue = ECIES_UE(profile='A', keypool=pool)
+    ue.generate_sharedkey(hn_pubkey)
+    ret = pool.misses == 1 and len(pool) == 0 and hn.unprotect(*ue.protect(plaintext)) == plaintext
+    pool.start()
+    pubkeys = set()
+    for i in range(6):
+        ue.generate_sharedkey(hn_pubkey)
+        pubkeys.add(ue.EK)
+        ret &= hn.unprotect(*ue.protect(plaintext)) == plaintext
+    pool.stop()
+    ret &= len(pubkeys) == 6 and pool._thread is None
+    # misses of concurrent consumers of an empty pool are all counted
+    pool = EphemeralKeyPool('A', low=2, high=4, start=False)
+    threads = [Thread(target=lambda: [pool.get() for i in range(25)]) for j in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ret &= pool.misses == 100
+    try:
+        ECIES_UE(profile='B', keypool=pool)
+    except CMException:
+        return ret
+    else:
+        return False
+
+
+# SK cache of retransmitted SUCI
+def test_sk_cache():
+    hn_privkey  = unhexlify('c53c22208b61860b06c62e5406a7b330c2b577aa5558981510d128247d38bd1d')
+    hn_pubkey   = unhexlify('5a8d38864820197c3394b92613b20b91633cbd897119273bf8e4a6f4eec0a650')
+    plaintext   = unhexlify('00012080f6')
+    hn = ECIES_HN(profile='A', hn_priv_key=hn_privkey)
+    hn.set_sk_cache(2, 30.0)
+    ue = ECIES_UE(profile='A')
+    sucis = []
+    for i in range(3):
+        ue.generate_sharedkey(hn_pubkey)
+        sucis.append(ue.protect(plaintext))
+    # invalid MAC are not cached, retransmissions hit
+    ret = hn.unprotect(sucis[0][0], sucis[0][1], b'\0'*8) is None and \
+          hn.unprotect(*sucis[0]) == plaintext and \
+          hn.unprotect(*sucis[0]) == plaintext and \
+          hn.unprotect(sucis[0][0], sucis[0][1], b'\0'*8) is None
+    info = hn.sk_cache_info()
+    ret &= info['hits'] == 2 and info['misses'] == 2 and info['entries'] == 1
+    # LRU eviction beyond size
+    ret &= hn.unprotect(*sucis[1]) == plaintext and hn.unprotect(*sucis[2]) == plaintext
+    ret &= hn.sk_cache_info()['entries'] == 2 and sucis[0][0] not in hn._sk_cache
+    # expired entries are recomputed
+    hn._sk_cache[sucis[1][0]] = (0, hn._sk_cache[sucis[1][0]][1])
+    ret &= hn.unprotect(*sucis[1]) == plaintext and hn.sk_cache_info()['misses'] == 5
+    # registry config applies to keys added afterwards
+    reg = ECIESKeyRegistry()
+    reg.set_sk_cache(16)
+    reg.add('A', 3, hn_privkey)
+    ret &= reg.unprotect('A', 3, *sucis[0]) == plaintext and reg.unprotect('A', 3, *sucis[0]) == plaintext
+    ret &= reg.get('A', 3).sk_cache_info()['hits'] == 1
+    hn.set_sk_cache(0)
+    return ret and hn.unprotect(*sucis[0]) == plaintext and hn.sk_cache_info()['hits'] == 0
+
+
+# SUCI scheme outputs parsed and deconcealed, with BCD-encoded MSIN
+def test_deconceal_suci():
+    hn_privkey_b = unhexlify('F1AB1074477EBCC7F554EA1C5FC368B1616730155E0041AC447D6301975FECDA')
+    hn_pubkey_b  = unhexlify('0272DA71976234CE833A6907425867B82E074D44EF907DFB4B3E21C1C2256EBCD1')
+    hn = ECIES_HN(profile='B', hn_priv_key=hn_privkey_b)
+    ue = ECIES_UE(profile='B')
+    scheme_outputs = []
+    # MSIN 0123456789, 012345678 (with filler), not BCD-encoded
+    for msin in (b'\x10\x32\x54\x76\x98', b'\x10\x32\x54\x76\xf8', b'\x1a'):
+        ue.generate_sharedkey(hn_pubkey_b)
+        scheme_outputs.append(b''.join(ue.protect(msin)))
+    scheme_outputs.extend([scheme_outputs[0][:-1] + b'\0', scheme_outputs[0][:41]])
+    ret = hn.deconceal_suci(memoryview(scheme_outputs[0])) == '0123456789' and \
+          hn.deconceal_suci(scheme_outputs[2], bcd=False) == b'\x1a' and \
+          hn.deconceal_suci_batch(scheme_outputs) == ['0123456789', '012345678', None, None, None] and \
+          hn.deconceal_suci_batch(scheme_outputs, workers=2, pool='thread', chunk=2) == \
+            ['0123456789', '012345678', None, None, None] and \
+          hn.stats == {'ok': 6, 'mac': 2, 'pubkey': 0, 'format': 4}
+    hn.close()
+    return ret
+
+
 def testall():
-    return test_profileA() & test_profileB()
+    return test_profileA() & test_profileB() & test_unprotect_batch() & test_key_registry() & \
+           test_keypool() & test_sk_cache() & test_deconceal_suci()
 
 
 def testperf():
@@ -131,8 +131,40 @@ def milenage_testsets():
     milenage_testset_4() and milenage_testset_5() and milenage_testset_6()
 
 
+###
+# Milenage resynchronisation: AUTS built from testset 1 f1* and f5*
+###
+
+def milenage_testset_auts():
+    K       = b'F[\\\xe8\xb1\x99\xb4\x9f\xaa_\n.\xe28\xa6\xbc'
+    RAND    = b'#U<\xbe\x967\xa8\x9d!\x8a\xe6M\xaeG\xbf5'
+    SQN_MS  = b'\xff\x9b\xb4\xd0\xb6\x07'
+    OP      = b'\xcd\xc2\x02\xd5\x12> \xf6+mgj\xc7,\xb3\x18'
+    OPc     = make_OPc(K, OP)
+    #
+    Mil  = Milenage(OP)
+    AUTS = bytes([a^b for a, b in zip(SQN_MS, Mil.f5star(K, RAND))]) + \
+           Mil.f1star(K, RAND, SQN_MS, b'\0\0')
+    BAD  = AUTS[:-1] + bytes([AUTS[-1]^1])
+    return Mil.process_auts(K, RAND, AUTS) == (SQN_MS, True) and \
+    Milenage(OPnull).process_auts(K, RAND, AUTS, OP) == (SQN_MS, True) and \
+    Mil.process_auts(K, RAND, BAD) == (SQN_MS, False) and \
+    Mil.process_auts_batch([(K, None, RAND, AUTS), (K, OPc, RAND, BAD)]) == \
+        [(SQN_MS, True), (SQN_MS, False)]
+
+
+def milenage_testset_auts_invalid():
+    # invalid vectors of a batch return None, without affecting the other ones
+    K, RAND, OP = 16*b'\x01', 16*b'\x02', 16*b'\x03'
+    Mil  = Milenage(OP)
+    AUTS = Mil.f5star(K, RAND) + Mil.f1star(K, RAND, 6*b'\0', b'\0\0')
+    return Mil.process_auts_batch([(K, None, RAND, AUTS[:6]), (K[:8], None, RAND, AUTS),
+                                   (K, None, RAND + b'\0', AUTS), (K, None, RAND, AUTS)]) == \
+        [None, None, None, (6*b'\0', True)]
+
+
 def testall():
-    return milenage_testsets()
+    return milenage_testsets() and milenage_testset_auts() and milenage_testset_auts_invalid()
 
 
 def testperf():
@@ -37,7 +37,10 @@
 
 from time import time
 
-from CryptoMobile.TUAK import TUAK, keccakp1600
+from CryptoMobile.TUAK import TUAK, keccakp1600, keccakp1600_batch, keccakp1600_inplace, \
+     keccakp1600_impls, keccakp1600_set_impl, keccakp1600_get_impl, keccakp1600_lanes
+from CryptoMobile.conv import conv_102_C2, conv_102_C3
+from CryptoMobile.utils import CMException
 
 TUAK.KeccakIterations = 1
 
@@ -75,6 +78,38 @@ def keccak_testsets():
             keccak_testset_3() & keccak_testset_4() & \
             keccak_testset_5() & keccak_testset_6()
 
+def keccak_testset_impls():
+    # all testsets with each single state permutation, the optimized one being restored
+    ret = True
+    for impl in keccakp1600_impls():
+        keccakp1600_set_impl(impl)
+        ret &= keccakp1600_get_impl() == impl and keccak_testsets() and keccak_testset_inplace()
+    keccakp1600_set_impl('opt64')
+    return ret
+
+def keccak_testset_batch():
+    # 11 chained states permuted together, over all lanes width
+    states = [bytes(range(200))]
+    for i in range(10):
+        states.append(keccakp1600(states[-1]))
+    ret = True
+    for lanes in (0, 1, 2, 4, 8):
+        ret &= keccakp1600_batch(b''.join(states[:-1]), 1, lanes) == b''.join(states[1:])
+        ret &= keccakp1600_batch(b''.join(states[:9]), 2, lanes) == b''.join(states[2:])
+    return ret
+
+def keccak_testset_inplace():
+    # in place permutation of a bytearray and of a memoryview slice of it
+    states = [bytes(range(200))]
+    for i in range(4):
+        states.append(keccakp1600(states[-1]))
+    buf = bytearray(states[0])
+    keccakp1600_inplace(buf, 4)
+    ret = buf == states[4]
+    buf = bytearray(b''.join(states[:2]))
+    keccakp1600_inplace(memoryview(buf)[200:])
+    return ret and buf == b''.join(states[:3:2])
+
 
 def tuak_testset_61():
     K    = b'\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab'
@@ -290,8 +325,129 @@ def tuak_testsets_7():
         tuak_testset_75() and tuak_testset_76()
 
 
+def tuak_testset_auts():
+    # AUTS built from testset 6.3 / 7.3 f1* and f5*
+    K    = b'\xff\xfe\xfd\xfc\xfb\xfa\xf9\xf8\xf7\xf6\xf5\xf4\xf3\xf2\xf1\xf0\xef\xee\xed\xec\xeb\xea\xe9\xe8\xe7\xe6\xe5\xe4\xe3\xe2\xe1\xe0'
+    RAND = b'\x01#Eg\x89\xab\xcd\xef\x01#Eg\x89\xab\xcd\xef'
+    SQN  = b'\x01#Eg\x89\xab'
+    TOP  = b'\x80\x81\x82\x83\x84\x85\x86\x87\x88\x89\x8a\x8b\x8c\x8d\x8e\x8f\x90\x91\x92\x93\x94\x95\x96\x97\x98\x99\x9a\x9b\x9c\x9d\x9e\x9f'
+    
+    tuak = TUAK(TOP)
+    tuak.LEN_MAC = 256
+    AUTS = bytes([a^b for a, b in zip(SQN, b'\xf8N\xb38\x84\x8c')]) + \
+        tuak.f1star(K, RAND, SQN, b'\0\0')
+    BAD  = AUTS[:-1] + bytes([AUTS[-1]^1])
+    TOPc = tuak.make_topc(K)
+    
+    return tuak.process_auts(K, RAND, AUTS) == (SQN, True) and \
+        tuak.process_auts(K, RAND, BAD) == (SQN, False) and \
+        tuak.process_auts_batch([(K, None, RAND, AUTS), (K, TOPc, RAND, BAD)]) == \
+            [(SQN, True), (SQN, False)]
+
+
+def tuak_testset_auts_invalid():
+    # invalid vectors of a batch return None, without affecting the other ones
+    K, RAND, TOP = 16*b'\x01', 16*b'\x02', 32*b'\x03'
+    tuak = TUAK(TOP)
+    AUTS = tuak.f5star(K, RAND) + tuak.f1star(K, RAND, 6*b'\0', b'\0\0')
+    return tuak.process_auts_batch([(K, None, RAND, AUTS[:13]), (K[:8], None, RAND, AUTS),
+                                    (K, None, RAND + b'\0', AUTS), (K, None, RAND, AUTS)]) == \
+        [None, None, None, (6*b'\0', True)]
+
+
+def tuak_testset_vector():
+    # generate_vector() with parameters from testsets 6.5 and 7.5
+    K    = b'\x15t\xcaV\x88\x1d\x05\xc1\x89\xc8(\x80\xf7\x89\xc9\xcdBD\x95_D&\xaa+i\xc2\x9f\x15w\x0eZ\xa5'
+    RAND = b'\xc5p\xaa\xc6\x8c\xdee\x1f\xb1\xe3\x08\x83"I\x8b\xef'
+    SQN  = b'\xc8\x9b\xb7\x1f:A'
+    AMF  = b')}'
+    TOP  = b'\xe5\x9fn\xb1\x0e\xa4\x06\x81?I\x91\xb0\xb9\xe0/\x18\x1e\xdfL~\x17\xb4\x80\xf6m4\xda5\xee\x88\xc9^'
+    
+    tuak = TUAK(TOP)
+    tuak.LEN_MAC = 64
+    tuak.LEN_CK  = 256
+    tuak.LEN_IK  = 128
+    tuak.LEN_RES = 256
+    tuak.TOPC_CACHE_SIZE = 1
+    
+    vec = (b'\xd74\r\xad\x02\xb4\xcb\x01',
+        b'\x84\xd8\x9bA\xdb\x18g\xff\xd4\xc7\xba\x1d\x82\x16?MRj \xfb\xaeT\x18\xfb\xb5&\x94\x0b\x1e\xeb\x90\\',
+        b"\xd4\x19gj\xfeZ\xb5\x8c\x1d\x8b\xee\rCR:M/R\xef\x0b1\xa4gj\x0c3D'\xa9\x88\xfee",
+        b' U3\xe5\x05f\x1ba\xd0\\\xc0\xea\xc8x\x18\xf4', b'\xd7\xb3\xd2\xd4\x98\n')
+    
+    ret = tuak.generate_vector(K, RAND, SQN, AMF) == vec and len(tuak._topc_cache) == 1 and \
+        tuak.generate_vector(K, RAND, SQN, AMF) == vec and \
+        tuak.generate_vector(K[:16], RAND, SQN, AMF) == \
+            (tuak.f1(K[:16], RAND, SQN, AMF), ) + tuak.f2345(K[:16], RAND) and \
+        len(tuak._topc_cache) == 1
+    tuak.clear_topc_cache()
+    ret &= not tuak._topc_cache
+    # bytes-like K and TOP are keyed as bytes in the TOPc cache
+    tuak.TOP = bytearray(TOP)
+    ret &= tuak.generate_vector(memoryview(K), RAND, SQN, AMF) == vec and \
+        tuak.generate_vector(K, RAND, SQN, AMF) == vec and len(tuak._topc_cache) == 1
+    tuak.clear_topc_cache()
+    return ret
+
+def tuak_testset_vectors():
+    # generate_vectors() with parameters from testsets 6.5 and 7.5, checked against generate_vector()
+    K    = b'\x15t\xcaV\x88\x1d\x05\xc1\x89\xc8(\x80\xf7\x89\xc9\xcdBD\x95_D&\xaa+i\xc2\x9f\x15w\x0eZ\xa5'
+    RAND = b'\xc5p\xaa\xc6\x8c\xdee\x1f\xb1\xe3\x08\x83"I\x8b\xef'
+    SQN  = b'\xc8\x9b\xb7\x1f:A'
+    AMF  = b')}'
+    TOP  = b'\xe5\x9fn\xb1\x0e\xa4\x06\x81?I\x91\xb0\xb9\xe0/\x18\x1e\xdfL~\x17\xb4\x80\xf6m4\xda5\xee\x88\xc9^'
+    
+    tuak = TUAK(TOP)
+    tuak.LEN_MAC = 64
+    tuak.LEN_CK  = 256
+    tuak.LEN_IK  = 128
+    tuak.LEN_RES = 256
+    
+    vectors = [(K, RAND, SQN, AMF), (K[:16], RAND, SQN, AMF), (K, RAND[::-1], SQN, AMF),
+               (K[:16], RAND, SQN[::-1], AMF[::-1]), (K[16:], RAND, SQN, AMF)]
+    vectors = 3*vectors
+    ret = tuak.generate_vectors(vectors) == [tuak.generate_vector(*v) for v in vectors]
+    # GSM triplets, through the C2 and C3 batch conversions
+    tuak.LEN_CK, tuak.LEN_RES = 128, 64
+    triplets = tuak.generate_triplets(vectors[:5] + [(K, RAND, SQN, b'')])
+    ret &= triplets[5] is None and \
+        triplets[:5] == [(v[1], conv_102_C2(q[1]), conv_102_C3(q[2], q[3])) for v, q in \
+                         zip(vectors[:5], tuak.generate_vectors(vectors[:5]))]
+    # ALGONAME is laid out in each state, with a fixed length
+    tuak.ALGONAME = b'TUAK1.0+'
+    try:
+        tuak.generate_vectors(vectors)
+    except CMException:
+        return ret
+    else:
+        return False
+
+
 def testall():
-    return keccak_testsets() and tuak_testsets_6() and tuak_testsets_7()
+    return keccak_testsets() and keccak_testset_impls() and keccak_testset_batch() and \
+        keccak_testset_inplace() and tuak_testsets_6() and tuak_testsets_7() and tuak_testset_auts() and \
+        tuak_testset_auts_invalid() and tuak_testset_vector() and tuak_testset_vectors()
+
+
+def keccak_perf(num=20000):
+    # permutations per second, for each single state implementation and batch lanes width
+    state = bytes(range(200))
+    for impl in keccakp1600_impls():
+        keccakp1600_set_impl(impl)
+        T0 = time()
+        buf = bytearray(state)
+        keccakp1600_inplace(buf, num)
+        print('Keccak-p[1600] %-6s: %10.0f permutations / sec' % (impl, num / (time()-T0)))
+    keccakp1600_set_impl('opt64')
+    # the batch permutation always uses its own SIMD or scalar code, whatever the implementation
+    # set with keccakp1600_set_impl(), and clamps the lanes to the widest available
+    states, max_lanes = 64 * state, keccakp1600_lanes()
+    for lanes in sorted(set(min(lanes, max_lanes) for lanes in (1, 2, 4, 8))):
+        T0 = time()
+        for i in range(num // 64):
+            keccakp1600_batch(states, 1, lanes)
+        print('Keccak-p[1600] batch x%i  : %10.0f permutations / sec'\
+              % (lanes, 64 * (num // 64) / (time()-T0)))
 
 
 def testperf():
@@ -301,6 +457,7 @@ def testperf():
             print('testset failing... exiting')
             return
     print('10000 full TUAK testsets in %.3f seconds' % (time()-T0, ))
+    keccak_perf()
 
 
 def test_TUAK():
@@ -0,0 +1,153 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.4
+# *
+# * Copyright 2020. Benoit Michau. P1Sec.
+# *
+# * This program is free software: you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License version 2 as published
+# * by the Free Software Foundation.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# * GNU General Public License for more details.
+# *
+# * You will find a copy of the terms and conditions of the GNU General Public
+# * License version 2 in the "license.txt" file or
+# * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+# * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+# *
+# *--------------------------------------------------------
+# * File Name : test/test_context.py
+# * Created : 2026-10-19
+# * Authors : Benoit Michau
+# *--------------------------------------------------------
+#*/
+
+########################################################
+# CryptoMobile python toolkit
+#
+# PDCP and NAS security contexts, checked against the EEA / EIA functions
+#######################################################
+
+from time     import time
+from binascii import unhexlify
+
+from CryptoMobile.utils   import CMException
+from CryptoMobile.CM      import EEA1, EIA1, EEA3, EIA3
+from CryptoMobile.context import *
+try:
+    from CryptoMobile.CM import EEA2, EIA2
+except ImportError:
+    _with_aes = False
+else:
+    _with_aes = True
+
+
+K_ENC = unhexlify('d3c5d592327fb11c4035c6680af8c6d1d3c5d592327fb11c4035c6680af8c6d1')
+K_INT = unhexlify('c736c6aab22bffb8c736c6aab22bffb8')
+
+
+def pdcp_testset_algs():
+    # protected PDU = header || EEA(SDU || EIA(header || SDU)), with 32 bytes 5G keys
+    # using their 16 least significant bytes
+    # (the same algorithm for both being protected in a single call)
+    algs = [(1, EEA1, 3, EIA3), (3, EEA3, 1, EIA1), (0, None, 3, EIA3),
+            (1, EEA1, 1, EIA1), (3, EEA3, 3, EIA3)]
+    if _with_aes:
+        algs.extend([(2, EEA2, 2, EIA2), (2, EEA2, None, None)])
+    ret, pdu = True, b'\x8f\xfe' + 60*b'\xa5'
+    for alg_enc, eea, alg_int, eia in algs:
+        ctx = PDCPSecurityContext(alg_enc, alg_int, K_ENC, K_INT, 3, 1, count=0x13800)
+        count = 0x13ffe
+        data = pdu[2:] + eia(K_INT, count, 3, 1, pdu) if eia else pdu[2:]
+        exp = pdu[:2] + (eea(K_ENC[16:], count, 3, 1, data) if eea else data)
+        prot = ctx.protect(None, pdu)
+        ret &= prot == exp and ctx.tx_next == count + 1
+        ret &= PDCPSecurityContext(alg_enc, alg_int, K_ENC, K_INT, 3, 1, count=0x13800).\
+               unprotect(None, prot) == pdu
+    return ret
+
+
+def pdcp_testset_count():
+    # HFN incremented on SN wrap-around, PDU outside of the window or with an invalid
+    # MAC-I discarded
+    tx = PDCPSecurityContext(3, 3, K_ENC, K_INT, 0, 0, sn_len=18, count=(5<<18) + 0x3fffe)
+    rx = PDCPSecurityContext(3, 3, K_ENC, K_INT, 0, 0, sn_len=18, count=(5<<18) + 0x3fffe)
+    prots = []
+    for sn in (0x3fffe, 0x3ffff, 0, 1):
+        pdu = bytes(bytearray([sn>>16, (sn>>8) & 0xff, sn & 0xff])) + b'SDU'
+        prots.append((pdu, tx.protect(sn, pdu)))
+    ret = tx.tx_next == (6<<18) + 2 and tx.get_count(0x3ffff, tx.tx_next) == (5<<18) + 0x3ffff
+    # out of order reception
+    ret &= rx.unprotect(None, prots[2][1]) == prots[2][0] and \
+           rx.unprotect(None, prots[0][1]) == prots[0][0] and \
+           rx.unprotect(None, prots[3][1][:-1] + b'\0') is None and \
+           rx.unprotect(None, prots[3][1]) == prots[3][0] and rx.rx_next == (6<<18) + 2
+    ret &= PDCPSecurityContext(0, None, K_ENC, K_INT, 0, 0).unprotect(3000, b'\x0b\xb8') is None
+    try:
+        PDCPSecurityContext(3, 3, K_ENC, K_INT, 0, 0, sn_len=15)
+    except CMException:
+        return ret
+    else:
+        return False
+
+
+def nas_testset_algs():
+    # 5G: 0x7e || SHT || MAC || SN || EEA(NAS message), MAC over SN || ciphered message,
+    # with the NAS connection identifier as BEARER
+    nas_msg = unhexlify('7e004179000d0102f8392143658709f1')
+    ret = True
+    algs = [(1, EEA1, 3, EIA3), (3, EEA3, 1, EIA1), (1, EEA1, 1, EIA1), (3, EEA3, 3, EIA3)]
+    if _with_aes:
+        algs.append((2, EEA2, 2, EIA2))
+    for alg_enc, eea, alg_int, eia in algs:
+        ctx = NASSecurityContext(alg_enc, alg_int, K_ENC, K_INT, 0, conn_id=1, tx_count=0x1ff)
+        enc = eea(K_ENC[16:], 0x1ff, 1, 0, nas_msg)
+        ret &= ctx.protect(nas_msg) == b'\x7e\x02' + eia(K_INT, 0x1ff, 1, 0, b'\xff' + enc) + b'\xff' + enc
+        # LTE: SHT || PD, BEARER 0, integrity protected only
+        ctx = NASSecurityContext(alg_enc, alg_int, K_ENC, K_INT, 1, lte=True, tx_count=2)
+        ret &= ctx.protect(nas_msg, ciphered=False) == \
+               b'\x17' + eia(K_INT, 2, 0, 1, b'\x02' + nas_msg) + b'\x02' + nas_msg
+    return ret
+
+
+def nas_testset_count():
+    # overflow incremented on SN wrap-around, messages behind rx_count accepted once
+    # within the window
+    tx = NASSecurityContext(3, 3, K_ENC, K_INT, 1, tx_count=0x2fe)
+    sec_msgs = tx.protect_many([b'\x7e\x00\x54' + bytes(bytearray([i])) for i in range(5)])
+    rx = NASSecurityContext(3, 3, K_ENC, K_INT, 1, rx_count=0x2f0, window=4)
+    ret = rx.verify_and_decrypt_many([sec_msgs[i] for i in (1, 0, 0, 3, 2, 4, 1)]) == \
+          [b'\x7e\x00\x54\x01', b'\x7e\x00\x54\x00', None, b'\x7e\x00\x54\x03',
+           b'\x7e\x00\x54\x02', b'\x7e\x00\x54\x04', None]
+    ret &= rx.rx_count == 0x303 and tx.tx_count == 0x303
+    # invalid MAC, not protected message, without window
+    rx = NASSecurityContext(3, 3, K_ENC, K_INT, 1, rx_count=0x2ff)
+    ret &= rx.verify_and_decrypt(sec_msgs[0]) is None and \
+           rx.verify_and_decrypt(sec_msgs[1][:-1] + b'\0') is None and \
+           rx.verify_and_decrypt(b'\x7e\x00\x54\x00\x00\x00\x00\x00') is None
+    return ret and rx.stats == {'ok': 0, 'mac': 2, 'count': 0, 'format': 1}
+
+
+def testall():
+    return pdcp_testset_algs() & pdcp_testset_count() & nas_testset_algs() & nas_testset_count()
+
+
+def testperf():
+    T0 = time()
+    for i in range(1000):
+        if not testall():
+            print('testset failing... exiting')
+            return
+    print('1000 full PDCP and NAS context testsets in %.3f seconds' % (time()-T0, ))
+
+
+def test_context():
+    assert( testall() )
+
+
+if __name__ == '__main__':
+    testperf()
@@ -0,0 +1,330 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.4
+# *
+# * Copyright 2020. Benoit Michau. P1Sec.
+# *
+# * This program is free software: you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License version 2 as published
+# * by the Free Software Foundation.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# * GNU General Public License for more details.
+# *
+# * You will find a copy of the terms and conditions of the GNU General Public
+# * License version 2 in the "license.txt" file or
+# * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+# * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+# *
+# *--------------------------------------------------------
+# * File Name : test/test_conv.py
+# * Created : 2026-10-19
+# * Authors : Benoit Michau
+# *--------------------------------------------------------
+#*/
+
+########################################################
+# CryptoMobile python toolkit
+#
+# conversion functions and Key Derivation Functions
+# as defined in 3GPP TS 33.102, 33.220, 33.401 and 33.501
+#######################################################
+
+import hmac
+from time    import time
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+
+import CryptoMobile.conv as conv
+from CryptoMobile.conv   import *
+from CryptoMobile.keyset import *
+from CryptoMobile.utils  import CMException
+
+
+K16 = bytes(bytearray(range(16)))
+K32 = bytes(bytearray(range(32, 64)))
+SN_NAME = b'5G:mnc001.mcc001.3gppnetwork.org'
+
+
+def ref_KDF(K, S):
+    return hmac.new(K, S, sha256).digest()
+
+
+###
+# KDF: keyed HMAC states and their cache
+###
+
+def kdf_testset_keys():
+    # keys shorter, equal and longer than the SHA-256 block
+    ret = True
+    for K in (b'', K16, K32, 2*K32, 3*K32):
+        for S in (b'', b'\x69\x01\x00\x01\x01\x00\x01', 100*b'\xab'):
+            ret &= KDF(K, S) == ref_KDF(K, S) and \
+                   KDFKey(bytearray(K)).derive(S) == ref_KDF(K, S)
+    return ret
+
+
+def kdf_testset_cache():
+    cache_size = conv.KDF_CACHE_SIZE
+    kdf_cache_clear()
+    conv.KDF_CACHE_SIZE = 2
+    kdf = get_kdf_key(K16)
+    ret = get_kdf_key(bytearray(K16)) is kdf
+    get_kdf_key(K32)
+    get_kdf_key(K16)
+    get_kdf_key(2*K32)
+    # K32 is the least recently used key
+    ret &= len(conv._KDF_CACHE) == 2 and K32 not in conv._KDF_CACHE and \
+           get_kdf_key(K16) is kdf
+    kdf_cache_clear()
+    ret &= not conv._KDF_CACHE
+    conv.KDF_CACHE_SIZE = 0
+    ret &= KDF(K32, b'\x10') == ref_KDF(K32, b'\x10') and not conv._KDF_CACHE
+    conv.KDF_CACHE_SIZE = cache_size
+    return ret
+
+
+def kdf_testsets():
+    return kdf_testset_keys() and kdf_testset_cache()
+
+
+###
+# 2G / 3G batch conversions, against the single ones
+###
+
+def conv_testset_102_batch():
+    XRES = bytes(bytearray(range(7, 247)))
+    CK, IK, Kc = XRES[:160], XRES[80:], XRES[:80]
+    ret = conv_102_C3_batch(CK, IK) == b''.join([conv_102_C3(CK[i:i+16], IK[i:i+16]) \
+                                                 for i in range(0, 160, 16)]) and \
+          conv_102_C4_batch(Kc) == b''.join([conv_102_C4(Kc[i:i+8]) for i in range(0, 80, 8)]) and \
+          conv_102_C5_batch(Kc) == b''.join([conv_102_C5(Kc[i:i+8]) for i in range(0, 80, 8)]) and \
+          conv_102_C2_batch(b'') == b'' and conv_102_C3_batch(CK, IK[16:]) is None
+    for res_len in (4, 6, 8, 15, 16):
+        ret &= conv_102_C2_batch(XRES, res_len) == \
+               b''.join([conv_102_C2(XRES[i:i+res_len]) for i in range(0, 240, res_len)])
+    vectors = [(None, XRES[:8], CK[:16], IK[:16], None), None, (None, XRES[:16], CK[16:32], IK[:16], None),
+               (None, XRES[:32], CK[:16], IK[:16], None), (None, XRES[1:9], IK[:16], CK[:16], None)]
+    return ret and conv_102_C23_vectors(vectors) == \
+        [(conv_102_C2(v[1]), conv_102_C3(v[2], v[3])) if v is not None and len(v[1]) <= 16 else None \
+         for v in vectors]
+
+
+###
+# conversion functions, against their KDF input encoding
+###
+
+def conv_testset_501():
+    return conv_501_A2(K16, K16, SN_NAME, 6*b'\0') == \
+            ref_KDF(2*K16, b'\x6a' + SN_NAME + b'\x00\x20' + 6*b'\0' + b'\x00\x06') and \
+        conv_501_A4(K16, K16, SN_NAME, K16, 8*b'\x01') == \
+            ref_KDF(2*K16, b'\x6b' + SN_NAME + b'\x00\x20' + K16 + b'\x00\x10' + \
+                           8*b'\x01' + b'\x00\x08')[16:] and \
+        conv_501_A8(K32, 2, 1) == ref_KDF(K32, b'\x69\x02\x00\x01\x01\x00\x01') and \
+        conv_501_A9(K32, 1, 1) == ref_KDF(K32, b'\x6e\x00\x00\x00\x01\x00\x04\x01\x00\x01') and \
+        conv_501_A11(K32, 1, 2) == ref_KDF(K32, b'\x70\x00\x01\x00\x02\x00\x00\x02\x00\x03')
+
+
+def conv_testset_templates():
+    ret = KDFTemplate(0x6b, ['s', '16s', 's']).build(SN_NAME, K16, 4*b'\x01') == \
+            b'\x6b' + SN_NAME + b'\x00\x20' + K16 + b'\x00\x10' + 4*b'\x01' + b'\x00\x04' and \
+          KDFTemplate(0x70, ['H', 'T']).build(1, 0x123456) == b'\x70\x00\x01\x00\x02\x12\x34\x56\x00\x03' and \
+          KDFTemplate(0x78, [('B', 2), 'H']).build(1, 3) == b'\x78\x01\x00\x02\x00\x03\x00\x02' and \
+          KDFTemplate(0x10, ['3s', '6s']).derive(2*K16, b'abc', 6*b'\0') == \
+            ref_KDF(2*K16, b'\x10abc\x00\x03' + 6*b'\0' + b'\x00\x06')
+    # variable length arguments, with one packing structure per set of lengths
+    tmpl = KDFTemplate(0x7b, ['r', b'\x00\x02', 'H'])
+    for data in (b'', b'\x01', 300*b'\x02', b'\x01'):
+        ret &= tmpl.build(data, 5) == b'\x7b' + data + b'\x00\x02\x00\x05\x00\x02'
+    ret &= len(tmpl._structs) == 3 and \
+           conv_501_A19(K32, b'\x01', 5) == ref_KDF(K32, b'\x7b\x01\x00\x02\x00\x05\x00\x02') and \
+           conv_501_A18(K32, 1, 3) == ref_KDF(K32, b'\x78\x01\x00\x02\x00\x03\x00\x02') and \
+           conv_401_A3(K32, 5) == ref_KDF(K32, b'\x11\x00\x00\x00\x05\x00\x04')
+    # bytes-like arguments
+    ret &= tmpl.build(bytearray(b'\x01'), 5) == tmpl.build(b'\x01', 5) and \
+           conv_501_A6(memoryview(K32), memoryview(SN_NAME)) == conv_501_A6(K32, SN_NAME) and \
+           conv_401_A2(bytearray(K16), bytearray(K16), memoryview(b'\x00\xf1\x10'),
+                       memoryview(6*b'\0')) == conv_401_A2(K16, K16, b'\x00\xf1\x10', 6*b'\0') and \
+           conv_501_A10(memoryview(K32), bytearray(K32)) == conv_501_A10(K32, K32)
+    try:
+        KDFTemplate(0x10, ['Q'])
+    except CMException:
+        return ret
+    else:
+        return False
+
+
+def conv_testset_ausf_batch():
+    num, res_len = 5, 8
+    CK   = b''.join([bytes(bytearray([i])) * 16 for i in range(num)])
+    IK   = CK[::-1]
+    RAND = bytes(bytearray(range(16*num)))
+    RES  = RAND[:res_len*num][::-1]
+    SQN  = bytes(bytearray(range(6*num)))
+    KAUSF, RES_STAR, HRES_STAR = conv_501_ausf_batch(CK, IK, RAND, RES, SQN, SN_NAME)
+    ret = conv_501_ausf_batch(b'', b'', b'', b'', b'', SN_NAME) == (b'', b'', b'')
+    for i in range(num):
+        ck, ik, rand = CK[16*i:16*i+16], IK[16*i:16*i+16], RAND[16*i:16*i+16]
+        res_star = conv_501_A4(ck, ik, SN_NAME, rand, RES[res_len*i:res_len*(i+1)])
+        ret &= KAUSF[32*i:32*i+32] == conv_501_A2(ck, ik, SN_NAME, SQN[6*i:6*i+6]) and \
+               RES_STAR[16*i:16*i+16] == res_star and \
+               HRES_STAR[16*i:16*i+16] == conv_501_A5(rand, res_star)
+    try:
+        conv_501_ausf_batch(CK, IK, RAND, RES[1:], SQN, SN_NAME)
+    except CMException:
+        return ret
+    else:
+        return False
+
+
+def conv_testset_sor_upu_batch():
+    num  = 10
+    KAUSF = b''.join([bytes(bytearray([i])) + K32[1:] for i in range(num)])
+    CNTS  = [0, 1, 2, 255, 256, 1000, 4096, 30000, 65534, 65535]
+    DATAS = [i*b'\x5a' for i in range(num)]
+    keys  = [KAUSF[32*i:32*i+32] for i in range(num)]
+    MACS  = b''.join([conv_501_A18(k, 1, c)[16:] for k, c in zip(keys, CNTS)])
+    ret = conv_501_A17_batch(KAUSF, b'\x01', CNTS) == \
+            b''.join([conv_501_A17(k, b'\x01', c) for k, c in zip(keys, CNTS)]) and \
+          conv_501_A17_batch(KAUSF, b'\x01', CNTS, DATAS) == \
+            b''.join([conv_501_A17(k, b'\x01', c, d) for k, c, d in zip(keys, CNTS, DATAS)]) and \
+          conv_501_A19_batch(KAUSF, DATAS, CNTS) == \
+            b''.join([conv_501_A19(k, d, c) for k, d, c in zip(keys, DATAS, CNTS)]) and \
+          conv_501_A18_verify_batch(KAUSF, CNTS, MACS) == 0x3ff and \
+          conv_501_A18_verify_batch(KAUSF, CNTS[::-1], MACS) == 0 and \
+          conv_501_A20_verify_batch(KAUSF, CNTS, b''.join([conv_501_A20(k, 1, c) \
+                                                          for k, c in zip(keys, CNTS)])) == 0x3ff
+    # chunks dispatched to a pool, with a corrupted MAC
+    MACS = MACS[:16*3] + b'\0' + MACS[16*3+1:]
+    with ThreadPoolExecutor(2) as pool:
+        ret &= conv_501_A18_verify_batch(KAUSF, CNTS, MACS, pool, 4) == 0x3f7 and \
+               conv_501_A19_batch(KAUSF, DATAS, CNTS, pool, 3) == conv_501_A19_batch(KAUSF, DATAS, CNTS)
+    try:
+        conv_501_A18_verify_batch(KAUSF, CNTS, MACS[1:])
+    except CMException:
+        return ret
+    else:
+        return False
+
+
+###
+# key hierarchies, against the chained conversion functions
+###
+
+def keyset_testset_5g():
+    CK, IK, RAND, RES = K16, K16[::-1], 16*b'\x42', 8*b'\x24'
+    SQN_X_AK, SUPI, ABBA = b'\x01\x02\x03\x04\x05\x06', b'001010123456789', b'\0\0'
+    keys = derive_5g_hierarchy(CK, IK, SN_NAME, SQN_X_AK, SUPI, ABBA, 3, (1, 2, 2, 2, 0, 0),
+                               RAND, RES)
+    # lazy derivation
+    ret = keys._KAMF is None and keys._KgNB is None
+    KAUSF = conv_501_A2(CK, IK, SN_NAME, SQN_X_AK)
+    KAMF  = conv_501_A7(conv_501_A6(KAUSF, SN_NAME), SUPI, ABBA)
+    KGNB  = conv_501_A9(KAMF, 3, 1)
+    ret &= keys.KRRCint == conv_501_A8(KGNB, 4, 2) and keys._KNASenc is None and \
+           keys.derive_all() == {
+            'KAUSF'   : KAUSF,
+            'RESstar' : conv_501_A4(CK, IK, SN_NAME, RAND, RES),
+            'HRESstar': conv_501_A5(RAND, conv_501_A4(CK, IK, SN_NAME, RAND, RES)),
+            'KSEAF'   : conv_501_A6(KAUSF, SN_NAME),
+            'KAMF'    : KAMF,
+            'KNASenc' : conv_501_A8(KAMF, 1, 1),
+            'KNASint' : conv_501_A8(KAMF, 2, 2),
+            'KgNB'    : KGNB,
+            'KRRCenc' : conv_501_A8(KGNB, 3, 2),
+            'KRRCint' : conv_501_A8(KGNB, 4, 2),
+            'KUPenc'  : conv_501_A8(KGNB, 5, 0),
+            'KUPint'  : conv_501_A8(KGNB, 6, 0)}
+    keys = derive_5g_hierarchy(CK, IK, SN_NAME, SQN_X_AK, SUPI, ABBA)
+    ret &= keys.RESstar is None and keys.HRESstar is None and keys.KAMF == KAMF
+    try:
+        derive_5g_hierarchy(CK, IK, SN_NAME, SQN_X_AK, SUPI, ABBA, rand=RAND)
+    except CMException:
+        return ret
+    else:
+        return False
+
+
+def keyset_testset_eps():
+    CK, IK, SN_ID, SQN_X_AK = K16, K16[::-1], b'\x00\xf1\x10', b'\x01\x02\x03\x04\x05\x06'
+    keys = EPSKeySet(CK, IK, SN_ID, SQN_X_AK, ul_nas_cnt=5, eea=2, eia=1)
+    KASME = conv_401_A2(CK, IK, SN_ID, SQN_X_AK)
+    KENB  = conv_401_A3(KASME, 5)
+    ret = keys.KASME == KASME and keys._kenb is None and keys.KeNB == KENB and \
+          keys.KNASenc == conv_401_A7(KASME, 1, 2) and keys.KNASint == conv_401_A7(KASME, 2, 1) and \
+          keys.KRRCenc == conv_401_A7(KENB, 3, 2) and keys.KRRCint == conv_401_A7(KENB, 4, 1) and \
+          keys.KUPenc == conv_401_A7(KENB, 5, 2) and keys.nas_key(1, 0) == conv_401_A7(KASME, 1, 0)
+    # clones share KASME-based derivations, and KeNB-based ones with the same NAS count
+    alg = keys.clone(eea=1)
+    ho  = keys.clone(ul_nas_cnt=6)
+    ret &= alg._kenb is keys._kenb and alg.KUPenc == conv_401_A7(KENB, 5, 1) and \
+           ho._kasme is keys._kasme and ho._kenb is None and \
+           ho.KeNB == conv_401_A3(KASME, 6) and ho.KRRCint == conv_401_A7(ho.KeNB, 4, 1) and \
+           ho.KNASenc == keys.KNASenc and (ho.eea, ho.eia, ho.ul_nas_cnt) == (2, 1, 6)
+    try:
+        keys.clone(ul_nas_cnt=1<<24)
+    except CMException:
+        return ret
+    else:
+        return False
+
+
+def keyset_testset_nh():
+    KAMF, KGNB = K32, K32[::-1]
+    NH = [KGNB]
+    for i in range(12):
+        NH.append(conv_501_A10(KAMF, NH[-1]))
+    chain = NHChain(KAMF, KGNB)
+    ret = (chain.hop, chain.NCC, chain.NH) == (0, 0, KGNB) and \
+          chain.advance() == (1, NH[1]) and chain.lookup(3) == (3, NH[3]) and \
+          chain.lookup(0) == (8, NH[8]) and chain.lookup(1) == (1, NH[1]) and \
+          chain.sync(2) == NH[2] and chain.get(11) == NH[11] and len(chain._chain) == 10 and \
+          chain.sync(1) == NH[9] and (chain.hop, chain.NCC) == (9, 1)
+    # no move for 0 hop or the current NCC, invalid negative number of hops
+    ret &= chain.advance(0) == (1, NH[9]) and chain.sync(1) == NH[9] and chain.hop == 9
+    try:
+        chain.advance(-1)
+    except CMException:
+        ret &= (chain.hop, chain.NH) == (9, NH[9])
+    else:
+        return False
+    chain = NHChain(KAMF, KGNB, eps=True)
+    ret &= chain.advance(2)[1] == conv_401_A4(KAMF, conv_401_A4(KAMF, KGNB))
+    # K_NG-RAN* for a list of neighbour cells
+    pcis, arfcns = [0, 1, 503, 1007], [0, 620000, 16777215, 2]
+    ret &= conv_501_A11_batch(NH[1], pcis, arfcns) == \
+            [conv_501_A11(NH[1], pci, arfcn) for pci, arfcn in zip(pcis, arfcns)] and \
+           conv_501_A12_batch(NH[1], pcis, arfcns) == \
+            [conv_501_A12(NH[1], pci, arfcn) for pci, arfcn in zip(pcis, arfcns)]
+    try:
+        conv_501_A11_batch(NH[1], pcis, arfcns[1:])
+    except CMException:
+        return ret
+    else:
+        return False
+
+
+def testall():
+    return kdf_testsets() and conv_testset_102_batch() and conv_testset_501() and \
+           conv_testset_templates() and conv_testset_ausf_batch() and \
+           conv_testset_sor_upu_batch() and keyset_testset_5g() and keyset_testset_eps() and keyset_testset_nh()
+
+
+def testperf():
+    T0 = time()
+    for i in range(10000):
+        if not testall():
+            print('testset failing... exiting')
+            return
+    print('10000 full conv testsets in %.3f seconds' % (time()-T0, ))
+
+
+def test_conv():
+    assert( testall() )
+
+
+if __name__ == '__main__':
+    testperf()
@@ -0,0 +1,198 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.4
+# *
+# * Copyright 2020. Benoit Michau. P1Sec.
+# *
+# * This program is free software: you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License version 2 as published
+# * by the Free Software Foundation.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# * GNU General Public License for more details.
+# *
+# * You will find a copy of the terms and conditions of the GNU General Public
+# * License version 2 in the "license.txt" file or
+# * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+# * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+# *
+# *--------------------------------------------------------
+# * File Name : test/test_sidf_server.py
+# * Created : 2026-10-19
+# * Authors : Benoit Michau
+# *--------------------------------------------------------
+#*/
+
+########################################################
+# CryptoMobile python toolkit
+#
+# SUCI deconcealment service, on localhost
+#######################################################
+
+import os
+import asyncio
+import tempfile
+from time      import time
+from threading import Event
+from binascii  import unhexlify
+
+from CryptoMobile.utils       import CMException
+from CryptoMobile.ECIES       import ECIES_UE, ECIESKeyRegistry
+from CryptoMobile.sidf_server import *
+
+
+HN_PRIVKEY_A = unhexlify('c53c22208b61860b06c62e5406a7b330c2b577aa5558981510d128247d38bd1d')
+HN_PUBKEY_A  = unhexlify('5a8d38864820197c3394b92613b20b91633cbd897119273bf8e4a6f4eec0a650')
+HN_PRIVKEY_B = unhexlify('F1AB1074477EBCC7F554EA1C5FC368B1616730155E0041AC447D6301975FECDA')
+HN_PUBKEY_B  = unhexlify('0272DA71976234CE833A6907425867B82E074D44EF907DFB4B3E21C1C2256EBCD1')
+
+
+def make_requests(num):
+    # return a list of (scheme_id, key_id, scheme_output) requests, and the expected responses
+    ue_a, ue_b = ECIES_UE(profile='A'), ECIES_UE(profile='B')
+    requests, responses = [], []
+    for i in range(num):
+        msin = unhexlify('%010i' % i)
+        ue, scheme_id, hn_pubkey = (ue_a, 1, HN_PUBKEY_A) if i % 2 else (ue_b, 2, HN_PUBKEY_B)
+        ue.generate_sharedkey(hn_pubkey)
+        requests.append((scheme_id, scheme_id, b''.join(ue.protect(msin))))
+        responses.append((STATUS_OK, msin))
+    # invalid MAC, unknown key id and scheme id, too short scheme output
+    requests.extend([(1, 1, requests[1][2][:-1] + bytes([requests[1][2][-1] ^ 1])),
+                     (1, 2, requests[1][2]),
+                     (3, 1, requests[1][2]), (1, 1, 40*b'\0')])
+    responses.extend([(STATUS_FAILURE, b''), (STATUS_UNKNOWN_KEY, b''),
+                      (STATUS_MALFORMED, b''), (STATUS_MALFORMED, b'')])
+    return requests, responses
+
+
+class FailingRegistry(ECIESKeyRegistry):
+    # raises on its first batch
+    
+    failures = 1
+    
+    def unprotect_batch(self, items, *args):
+        if self.failures:
+            self.failures -= 1
+            raise(ValueError('batch failure'))
+        return ECIESKeyRegistry.unprotect_batch(self, items, *args)
+
+
+class BlockingRegistry(ECIESKeyRegistry):
+    # blocks its batches until released
+    
+    def __init__(self, *args):
+        ECIESKeyRegistry.__init__(self, *args)
+        self.entered, self.released = Event(), Event()
+    
+    def unprotect_batch(self, items, *args):
+        self.entered.set()
+        self.released.wait(10)
+        return ECIESKeyRegistry.unprotect_batch(self, items, *args)
+
+
+async def run_sidf(requests, path=None, connections=2, registry=None, **kwargs):
+    if registry is None:
+        registry = ECIESKeyRegistry([('A', 1, HN_PRIVKEY_A), ('B', 2, HN_PRIVKEY_B)])
+    server = SIDFServer(registry, max_batch=16, **kwargs)
+    if path is not None:
+        await server.start_unix(path)
+        client = SIDFClient(path=path, connections=connections)
+    else:
+        client = SIDFClient(port=await server.start_tcp(), connections=connections)
+    await client.connect()
+    try:
+        # the first request is sent alone, in its own batch
+        res = [await client.deconceal(*requests[0])]
+        res.extend(await client.deconceal_many(requests[1:]))
+        return res, dict(server.stats)
+    finally:
+        await client.close()
+        await server.close()
+
+
+def sidf_testset_unix():
+    requests, responses = make_requests(40)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        res, stats = asyncio.run(run_sidf(requests, os.path.join(tmpdir, 'sidf.sock')))
+    # the first request alone, then the 41 other valid ones in batches of at most 16
+    return res == responses and stats['requests'] == 44 and stats['malformed'] == 2 and \
+           4 <= stats['batches'] <= 42
+
+
+def sidf_testset_tcp():
+    requests, responses = make_requests(6)
+    res, stats = asyncio.run(run_sidf(requests, connections=1))
+    return res == responses
+
+
+def sidf_testset_failure():
+    requests, responses = make_requests(6)
+    registry = FailingRegistry([('A', 1, HN_PRIVKEY_A), ('B', 2, HN_PRIVKEY_B)])
+    res, stats = asyncio.run(run_sidf(requests, connections=1, registry=registry))
+    # the failing batch is answered, and the next ones are still served
+    return res == [(STATUS_FAILURE, b'')] + responses[1:] and stats['errors'] == 1
+
+
+def sidf_testset_pending():
+    # requests beyond max_pending per connection wait for responses to be sent
+    requests, responses = make_requests(40)
+    res, stats = asyncio.run(run_sidf(requests, connections=1, max_pending=3))
+    return res == responses and stats['requests'] == 44 and stats['batches'] >= 14
+
+
+async def run_sidf_close(requests):
+    # close the server while a batch is being processed, before the client
+    registry = BlockingRegistry([('A', 1, HN_PRIVKEY_A), ('B', 2, HN_PRIVKEY_B)])
+    server = SIDFServer(registry)
+    client = SIDFClient(port=await server.start_tcp(), connections=1)
+    await client.connect()
+    loop = asyncio.get_running_loop()
+    try:
+        task = asyncio.ensure_future(client.deconceal(*requests[0]))
+        await loop.run_in_executor(None, registry.entered.wait, 10)
+        await asyncio.wait_for(server.close(), 10)
+        res = [await asyncio.wait_for(task, 10)]
+        # the connection is closed by the server
+        try:
+            await asyncio.wait_for(client.deconceal(*requests[1]), 10)
+        except CMException:
+            res.append(None)
+        return res
+    finally:
+        registry.released.set()
+        await client.close()
+
+
+def sidf_testset_close():
+    # the request being processed is answered, the next one fails on the closed connection
+    requests, responses = make_requests(2)
+    return asyncio.run(run_sidf_close(requests)) == [(STATUS_FAILURE, b''), None]
+
+
+def testall():
+    return sidf_testset_unix() and sidf_testset_tcp() and sidf_testset_failure() and \
+           sidf_testset_pending() and sidf_testset_close()
+
+
+def testperf():
+    requests, responses = make_requests(2000)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        T0 = time()
+        res, stats = asyncio.run(run_sidf(requests, os.path.join(tmpdir, 'sidf.sock'), 8))
+    if res != responses:
+        print('testset failing... exiting')
+        return
+    print('2004 SUCI deconcealed through the SIDF server in %.3f seconds (%i batches)'\
+          % (time()-T0, stats['batches']))
+
+
+def test_sidf_server():
+    assert( testall() )
+
+
+if __name__ == '__main__':
+    testperf()
@@ -0,0 +1,111 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.4
+# *
+# * Copyright 2020. Benoit Michau. P1Sec.
+# *
+# * This program is free software: you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License version 2 as published
+# * by the Free Software Foundation.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# * GNU General Public License for more details.
+# *
+# * You will find a copy of the terms and conditions of the GNU General Public
+# * License version 2 in the "license.txt" file or
+# * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+# * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+# *
+# *--------------------------------------------------------
+# * File Name : test/test_suci_load.py
+# * Created : 2026-10-19
+# * Authors : Benoit Michau
+# *--------------------------------------------------------
+#*/
+
+########################################################
+# CryptoMobile python toolkit
+#
+# SUCI load generator and deconcealment benchmark
+#######################################################
+
+import os
+import json
+import tempfile
+from time import time
+
+from CryptoMobile.utils     import CMException
+from CryptoMobile.suci_load import *
+from CryptoMobile.suci_load import _percentile
+
+
+def suci_load_testset_dist():
+    # zipf distribution skewed toward the lowest subscriber numbers, sequence
+    # reproducible with the seed, whatever the number of workers
+    gen = SUCIGenerator(supi=SUPIDistribution(100, 'zipf', msin_len=9), profiles={'A': 1},
+                        retransmit=0.2, seed=1)
+    recs = list(gen.generate(200, chunk=64))
+    msins = [rec[3] for rec in recs]
+    ret = len(recs) == 200 and msins == [rec[3] for rec in gen.generate(200, workers=2, chunk=64)]
+    ret &= msins.count('000000000') > 20 and all([len(m) == 9 for m in msins])
+    # retransmitted SUCI are copies of previous ones
+    ret &= len(set([rec[2] for rec in recs])) < 180
+    gen = SUCIGenerator(supi=SUPIDistribution(10, 'sequential', first=90), seed=1)
+    ret &= [rec[3] for rec in gen.generate(4)] == ['0000000090', '0000000091', '0000000092', '0000000093']
+    try:
+        SUPIDistribution(11, 'sequential', msin_len=1)
+    except CMException:
+        return ret
+    else:
+        return False
+
+
+def suci_load_testset_bench():
+    gen = SUCIGenerator(supi=SUPIDistribution(50, 'uniform', msin_len=9), profiles={'A': 3, 'B': 1})
+    recs = list(gen.generate(40))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'suci.bin')
+        ret = write_file(path, recs) == 40 and list(read_file(path)) == recs
+        with open(path, 'ab') as fd:
+            fd.write(b'\x01')
+        try:
+            list(read_file(path))
+        except CMException:
+            pass
+        else:
+            ret = False
+    # nearest-rank percentiles
+    vals = list(range(1, 11))
+    ret &= [_percentile(vals, p) for p in (10, 50, 90, 95, 99, 100)] == [1, 5, 9, 10, 10, 10]
+    res = json.loads(json.dumps(run_benchmark(recs, workers=(1, 2), batch=8, pool='thread', chunk=4)))
+    ret &= [(r['profile'], r['workers']) for r in res['results']] == [('A', 1), ('A', 2), ('B', 1), ('B', 2)]
+    return ret and all([r['errors'] == 0 and r['stats']['ok'] == r['suci'] and \
+                        r['latency_ms']['p50'] <= r['latency_ms']['max'] for r in res['results']])
+
+
+def testall():
+    return suci_load_testset_dist() and suci_load_testset_bench()
+
+
+def testperf():
+    T0 = time()
+    recs = list(SUCIGenerator().generate(2000))
+    T1 = time()
+    res = run_benchmark(recs, workers=(1, 2))
+    if any([r['errors'] for r in res['results']]):
+        print('testset failing... exiting')
+        return
+    print('2000 SUCI generated in %.3f seconds, deconcealed at %s SUCI/s' \
+          % (T1-T0, ', '.join(['%s/%i: %.0f' % (r['profile'], r['workers'], r['throughput']) \
+                              for r in res['results']])))
+
+
+def test_suci_load():
+    assert( testall() )
+
+
+if __name__ == '__main__':
+    testperf()